@@ -134,6 +134,76 @@ LOGIN_REDIRECT_URL = "candidate_dashboard"
 LOGOUT_REDIRECT_URL = "login"
 LOGIN_URL = "login"
 
+# Answer writes from the exam views go to this append-only journal first and
+# are drained into results.CandidateAnswer in batches (see results/journal.py).
+# Run `manage.py flush_answer_journal` after a restart to replay leftovers.
+ANSWER_JOURNAL_ENABLED = True
+ANSWER_JOURNAL_PATH = BASE_DIR / "answer_journal.sqlite3"
+ANSWER_JOURNAL_FLUSH_IN_PROCESS = True
+ANSWER_JOURNAL_FLUSH_INTERVAL = 2.0
+ANSWER_JOURNAL_BATCH_SIZE = 5000
+
+# Shift-start admission: candidates of a shift are let in WAVE_SIZE at a time,
+# one wave every WAVE_INTERVAL seconds, with a signed start token valid for
+# TOKEN_TTL seconds. Each worker renders at most MAX_CONCURRENT_RENDERS exam
+# pages at once and answers 503 after waiting RENDER_WAIT seconds for a slot.
+EXAM_ADMISSION_ENABLED = True
+EXAM_ADMISSION_WAVE_SIZE = 10
+EXAM_ADMISSION_WAVE_INTERVAL = 15
+EXAM_ADMISSION_TOKEN_TTL = 120
+EXAM_START_MAX_CONCURRENT_RENDERS = 8
+EXAM_START_RENDER_WAIT = 5
+
+# Exam-session tokens (exams/tokens.py) are accepted for this many seconds
+# past the deadline so the last autosave is not lost.
+EXAM_SESSION_GRACE = 120
+
+# Most typos a long Part D answer may contain and still be accepted
+# (exams/fill_blanks.py); short answers get fewer.
+FILL_BLANK_MAX_EDITS = 2
+
+# results.CandidateResult: pass mark as a percentage of the maximum, where the
+# maximum is both papers' marks plus these practical/viva maxima.
+RESULT_PASS_PERCENTAGE = 40
+RESULT_PRACTICAL_MAX_MARKS = 0
+RESULT_VIVA_MAX_MARKS = 0
+
+# Question uploads are imported by `manage.py run_import_jobs` (questions/jobs.py).
+# By default a worker is started after each upload and exits when the queue is
+# empty; set SPAWN_WORKER to False when the command runs as a service. Jobs
+# not updated for STALE_AFTER seconds are assumed orphaned and re-queued.
+QUESTION_IMPORT_SPAWN_WORKER = True
+QUESTION_IMPORT_STALE_AFTER = 15 * 60
+# Questions per INSERT when importing (questions.services.import_questions_from_dicts)
+QUESTION_IMPORT_BATCH_SIZE = 1000
+
+# Admission rosters, paper snapshot pointers and the exam-session deny-list
+# must be visible to every worker, so these caches are shared on disk
+# rather than per-process memory. Point them at Redis/Memcached when the
+# portal runs on more than one host.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "default",
+    },
+    # Decrypted and parsed question uploads, handed from the upload form to
+    # the import worker (questions/services.py) and dropped once imported
+    "imports": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "imports",
+        # a 100k-row bank is cached as ~50 chunks; culling one would force a re-parse
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    # Exam-session deny-list (exams/tokens.py), one entry per submitted exam.
+    # Culling one would reopen a sealed session, so the limit is far above
+    # any exam day; entries expire with the tokens they block.
+    "exam_sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "exam_sessions",
+        "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+    },
+}
+
 
 
 from mongoengine import connect
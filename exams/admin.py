@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ExamDayAvailability, Shift
+from .models import ExamDayAvailability, ExamSubmission, RegradeAudit, Shift
 
 @admin.register(ExamDayAvailability)
 class ExamDayAvailabilityAdmin(admin.ModelAdmin):
@@ -9,3 +9,16 @@ class ExamDayAvailabilityAdmin(admin.ModelAdmin):
 @admin.register(Shift)
 class ShiftAdmin(admin.ModelAdmin):
     list_display = ['center', 'date', 'start_time', 'capacity']
+
+@admin.register(ExamSubmission)
+class ExamSubmissionAdmin(admin.ModelAdmin):
+    list_display = ['candidate', 'shift', 'submitted_at']
+    list_filter = ['shift']
+    readonly_fields = list_display
+
+@admin.register(RegradeAudit)
+class RegradeAuditAdmin(admin.ModelAdmin):
+    list_display = ['question', 'changed_by', 'old_answer_key', 'new_answer_key', 'old_marks', 'new_marks',
+                    'answers_rescored', 'attempts_changed', 'score_delta', 'created_at']
+    list_filter = ['created_at']
+    readonly_fields = list_display
@@ -0,0 +1,143 @@
+"""
+Work queue for marking Part E (long answer) questions.
+
+Evaluators claim small batches of unmarked answers. A claim is a lease: it
+records who holds the answer and until when, so an abandoned batch returns to
+the queue once it expires. On databases that support it (PostgreSQL) claiming
+uses SELECT ... FOR UPDATE SKIP LOCKED, so concurrent evaluators never wait on
+each other's rows. Elsewhere (SQLite) candidates are picked without locks and
+taken with a conditional UPDATE tagged with a fresh claim token; rows another
+evaluator won in between are simply not ours, and we try the next ones.
+"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from questions.models import Question
+from .models import Answer
+from .signals import scores_changed
+
+SUBJECTIVE_PART = "E"
+_OPTIMISTIC_ATTEMPTS = 4
+
+
+def claim_ttl():
+    return timedelta(seconds=getattr(settings, "EVALUATION_CLAIM_TTL", 15 * 60))
+
+
+def batch_size():
+    return getattr(settings, "EVALUATION_BATCH_SIZE", 10)
+
+
+def _unmarked():
+    return Answer.objects.filter(
+        evaluated_at__isnull=True,
+        question_id__in=Question.objects.filter(part=SUBJECTIVE_PART).values("id"),
+        attempt__submitted_at__isnull=False,
+    )
+
+
+def _claimable(now):
+    return _unmarked().filter(Q(claimed_by__isnull=True) | Q(claim_expires_at__lt=now))
+
+
+def held_by(evaluator):
+    """Unmarked answers the evaluator currently holds a live claim on."""
+    return _unmarked().filter(claimed_by=evaluator, claim_expires_at__gte=timezone.now())
+
+
+def claim_batch(evaluator, size=None):
+    """
+    Claim up to `size` unmarked answers for `evaluator`.
+
+    An evaluator may hold two batches at once, the one being marked and the
+    prefetched next one; beyond that nothing new is claimed. Returns the
+    claimed Answer objects with their questions loaded.
+    """
+    size = size or batch_size()
+    now = timezone.now()
+    wanted = min(size, 2 * size - held_by(evaluator).count())
+    if wanted <= 0:
+        return []
+
+    token = uuid.uuid4()
+    claim = {"claimed_by": evaluator, "claim_token": token, "claim_expires_at": now + claim_ttl()}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            rows = _claimable(now).select_for_update(skip_locked=True, of=("self",)).order_by("id").only("id")
+            ids = [a.id for a in rows[:wanted]]
+            Answer.objects.filter(id__in=ids).update(**claim)
+    else:
+        got = 0
+        for _ in range(_OPTIMISTIC_ATTEMPTS):
+            # look a little past the head of the queue and shuffle, so
+            # evaluators claiming at the same moment rarely pick the same rows
+            window = list(_claimable(now).order_by("id").values_list("id", flat=True)[:wanted * 4])
+            if not window:
+                break
+            picked = random.sample(window, min(wanted - got, len(window)))
+            got += _claimable(now).filter(id__in=picked).update(**claim)
+            if got >= wanted:
+                break
+
+    return list(Answer.objects.filter(claim_token=token).select_related("question").order_by("id"))
+
+
+def release_claims(evaluator, answer_ids=None):
+    """Hand unmarked answers back to the queue; returns how many were released."""
+    held = _unmarked().filter(claimed_by=evaluator)
+    if answer_ids is not None:
+        held = held.filter(id__in=answer_ids)
+    return held.update(claimed_by=None, claim_token=None, claim_expires_at=None)
+
+
+def submit_marks(evaluator, marks):
+    """
+    Record `marks` ({answer_id: score}) for answers the evaluator holds.
+
+    Answers whose claim has passed to someone else, that are already marked
+    or whose score is out of range are rejected. Returns (saved_ids,
+    rejected_ids).
+    """
+    answers = {
+        a.id: a for a in Answer.objects.filter(id__in=list(marks), claimed_by=evaluator, evaluated_at__isnull=True)
+        .select_related("question").only("id", "question", "question__marks")
+    }
+    by_score, rejected = {}, []
+    for answer_id, raw in marks.items():
+        answer = answers.get(answer_id)
+        try:
+            score = Decimal(str(raw)).quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            score = None
+        if answer is None or score is None or not 0 <= score <= answer.question.marks:
+            rejected.append(answer_id)
+            continue
+        by_score.setdefault(score, []).append(answer_id)
+
+    now = timezone.now()
+    saved = []
+    with transaction.atomic():
+        for score, ids in by_score.items():
+            Answer.objects.filter(id__in=ids, claimed_by=evaluator, evaluated_at__isnull=True).update(
+                evaluator_score=score, final_score=score, evaluated_at=now, claim_expires_at=None
+            )
+        if by_score:
+            saved = list(
+                Answer.objects.filter(id__in=list(answers), claimed_by=evaluator, evaluated_at=now)
+                .values_list("id", flat=True)
+            )
+    if saved:
+        scores_changed.send(
+            sender=Answer,
+            attempt_ids=list(Answer.objects.filter(id__in=saved).values_list("attempt_id", flat=True).distinct()),
+        )
+    saved_set = set(saved)
+    rejected += [i for ids in by_score.values() for i in ids if i not in saved_set]
+    return saved, rejected
@@ -0,0 +1,100 @@
+"""
+Part D (fill in the blanks) answer matching.
+
+Accepted answers come from the compiled Question.answer_key (canonical tokens of
+each variant, see questions.answer_keys). Candidate answers are normalized
+the same way, with number words folded to digits, and match a variant if
+the numbers agree exactly and the words are within a small edit distance.
+A matcher is compiled once per question and remembers every distinct answer
+it has judged, so a shift's answers cost one lookup each after the first.
+"""
+from django.conf import settings
+
+from questions import answer_keys
+from questions.answer_keys import VARIANT_SEPARATOR, is_number
+
+
+def canonical_tokens(text):
+    """Tokens of an answer (text or list of blanks), see questions.answer_keys.canonical_tokens."""
+    if text is None:
+        return ()
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(t) for t in text)
+    return answer_keys.canonical_tokens(text)
+
+
+def _split(tokens):
+    numbers = tuple(t for t in tokens if is_number(t))
+    words = " ".join(t for t in tokens if not is_number(t))
+    return numbers, words
+
+
+def allowed_edits(words):
+    """Edit budget for a variant: none for short words, more for long ones."""
+    cap = getattr(settings, "FILL_BLANK_MAX_EDITS", 2)
+    length = len(words.replace(" ", ""))
+    if length <= 3:
+        return 0
+    if length <= 7:
+        return min(1, cap)
+    return cap
+
+
+def within_distance(a, b, limit):
+    """
+    True if a and b are at most `limit` edits apart.
+
+    Insertions, deletions, substitutions and swaps of adjacent letters each
+    count as one edit. Stops as soon as a whole row exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0 or a == b:
+        return a == b
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+class BlankMatcher:
+    """Accepted answers of one Part D question, compiled for repeated matching."""
+
+    def __init__(self, answer_key):
+        self.exact = set()
+        self.fuzzy = []
+        for variant in (answer_key or "").split(VARIANT_SEPARATOR):
+            tokens = canonical_tokens(variant)
+            if not tokens:
+                continue
+            self.exact.add(tokens)
+            numbers, words = _split(tokens)
+            budget = allowed_edits(words)
+            if budget:
+                self.fuzzy.append((numbers, words, budget))
+        self._seen = {}
+
+    def __bool__(self):
+        return bool(self.exact)
+
+    def __call__(self, answer):
+        tokens = canonical_tokens(answer)
+        try:
+            return self._seen[tokens]
+        except KeyError:
+            pass
+        matched = tokens in self.exact
+        if not matched and tokens:
+            numbers, words = _split(tokens)
+            matched = any(
+                numbers == n and within_distance(words, w, budget) for n, w, budget in self.fuzzy
+            )
+        self._seen[tokens] = matched
+        return matched
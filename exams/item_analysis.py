@@ -0,0 +1,130 @@
+"""
+Item analysis of a paper's objective questions.
+
+All answers of the paper are loaded once into an attempts x questions matrix
+of encoded choices (the same encoding the grader uses), and every statistic
+is computed column-wise over that matrix:
+
+* p-value: share of attempts answering correctly (omitted counts as wrong).
+* discrimination: p-value of the top 27% of attempts by total minus that of
+  the bottom 27%.
+* point-biserial: correlation between getting the item right and the score
+  on the rest of the paper.
+* distractors: share of attempts choosing each option, plus omissions.
+"""
+import logging
+
+import numpy as np
+from django.db.models import Q
+
+from questions.models import QuestionStat
+from .grading import load_paper_key
+from .models import Answer, ExamAttempt
+
+logger = logging.getLogger(__name__)
+
+GROUP_FRACTION = 0.27
+MIN_ATTEMPTS = 10
+MAX_OPTIONS = 10
+
+
+def _attempt_ids(paper_id):
+    return list(
+        ExamAttempt.objects.filter(submitted_at__isnull=False)
+        .filter(Q(assignment__primary_paper_id=paper_id) | Q(assignment__common_paper_id=paper_id))
+        .order_by("id").values_list("id", flat=True)
+    )
+
+
+def answer_matrix(key, attempt_ids):
+    """Encoded answers as an attempts x questions int32 matrix (0 = omitted)."""
+    row = {aid: i for i, aid in enumerate(attempt_ids)}
+    given = np.zeros((len(attempt_ids), len(key)), dtype=np.int32)
+    rows = Answer.objects.filter(attempt_id__in=attempt_ids, question_id__in=list(key.column)).values_list(
+        "attempt_id", "question_id", "given"
+    )
+    for attempt_id, question_id, value in rows.iterator(chunk_size=10000):
+        col = key.column[question_id]
+        given[row[attempt_id], col] = key.encoders[col](value)
+    return given
+
+
+def _column_corr(x, y):
+    """Pearson correlation of matching columns of x and y; NaN where undefined."""
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+    denominator = np.sqrt((x * x).sum(axis=0) * (y * y).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, (x * y).sum(axis=0) / denominator, np.nan)
+
+
+def item_statistics(key, given):
+    """Compute every statistic for each column of `given`; returns a dict of arrays."""
+    keys = key.keys.astype(np.int32)
+    correct = (given == keys) & (keys != 0)
+    item_scores = correct * key.marks
+    totals = item_scores.sum(axis=1)
+    n = len(given)
+
+    p_value = correct.mean(axis=0)
+
+    order = np.argsort(totals, kind="stable")
+    group = max(1, int(round(n * GROUP_FRACTION)))
+    discrimination = correct[order[-group:]].mean(axis=0) - correct[order[:group]].mean(axis=0)
+
+    # corrected point-biserial: correlate with the rest score so an item is
+    # not correlated with itself
+    rest = totals[:, None] - item_scores
+    point_biserial = _column_corr(correct.astype(np.float64), rest)
+
+    chosen = np.stack([((given >> k) & 1).mean(axis=0) for k in range(MAX_OPTIONS)], axis=1)
+    omitted = (given == 0).mean(axis=0)
+    return {
+        "p_value": p_value,
+        "discrimination": discrimination,
+        "point_biserial": point_biserial,
+        "chosen": chosen,
+        "omitted": omitted,
+    }
+
+
+def _float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def analyse_paper(paper_id):
+    """
+    Recompute QuestionStat rows for a paper's objective questions.
+
+    Returns the number of questions analysed; papers with fewer than
+    MIN_ATTEMPTS submitted attempts are skipped.
+    """
+    key = load_paper_key(paper_id)
+    attempt_ids = _attempt_ids(paper_id)
+    if not len(key) or len(attempt_ids) < MIN_ATTEMPTS:
+        return 0
+
+    given = answer_matrix(key, attempt_ids)
+    stats = item_statistics(key, given)
+    rows = []
+    for col, question_id in enumerate(key.question_ids.tolist()):
+        choices = key.choices[col] or (("TRUE", "FALSE") if key.parts[col] == "F" else ())
+        distractors = {str(text): round(float(stats["chosen"][col, k]), 4) for k, text in enumerate(choices[:MAX_OPTIONS])}
+        distractors["(omitted)"] = round(float(stats["omitted"][col]), 4)
+        rows.append(QuestionStat(
+            question_id=question_id,
+            paper_id=paper_id,
+            responses=len(attempt_ids),
+            p_value=_float(stats["p_value"][col]),
+            discrimination=_float(stats["discrimination"][col]),
+            point_biserial=_float(stats["point_biserial"][col]),
+            distractors=distractors,
+        ))
+    QuestionStat.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["question", "paper"],
+        update_fields=["responses", "p_value", "discrimination", "point_biserial", "distractors", "computed_at"],
+    )
+    logger.info("Item analysis of paper %s: %s questions over %s attempts", paper_id, len(rows), len(attempt_ids))
+    return len(rows)
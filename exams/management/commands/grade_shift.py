@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+# only submitted attempts: grading one in progress would seal it (EVALUATED)
+GRADABLE_STATUSES = ("SUBMITTED",)
+DEFAULT_CHUNK_SIZE = 1000
+
+# per-process {paper_id: PaperKey} cache, filled lazily by each worker
+_worker_keys = {}
+
+
+def _init_worker():
+    # spawned workers start without Django; forked ones must not share the
+    # parent's database connection
+    django.setup()
+    connections.close_all()
+    _worker_keys.clear()
+
+
+def grade_chunk(attempt_ids):
+    """Grade one chunk of attempts and mark their assignments EVALUATED."""
+    from django.db import transaction
+
+    from exams.grading import grade_attempts
+    from exams.models import ExamAssignment, ExamAttempt
+
+    attempts = list(
+        ExamAttempt.objects.filter(pk__in=attempt_ids, assignment__status__in=GRADABLE_STATUSES)
+        .select_related("assignment")
+    )
+    graded = grade_attempts(attempts, keys=_worker_keys)
+    with transaction.atomic():
+        ExamAssignment.objects.filter(
+            pk__in=[a.assignment_id for a in attempts], status__in=GRADABLE_STATUSES
+        ).update(status="EVALUATED")
+    return graded
+
+
+class Command(BaseCommand):
+    help = "Auto-grade the objective parts of submitted exam attempts in parallel. Re-running resumes: EVALUATED attempts are skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shift", type=int, help="Shift ID")
+        parser.add_argument("--center", type=int, help="Center ID")
+        parser.add_argument("--date", type=str, help="Exam date (YYYY-MM-DD)")
+        parser.add_argument("--paper", type=int, help="Question paper ID (primary or common)")
+        parser.add_argument("--all", action="store_true", help="Grade every pending attempt")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (1 grades in-process)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Attempts per work unit")
+
+    def handle(self, *args, **options):
+        from exams.models import ExamAttempt
+
+        filters = Q(assignment__status__in=GRADABLE_STATUSES)
+        if options["shift"]:
+            filters &= Q(assignment__shift_id=options["shift"])
+        if options["center"]:
+            filters &= Q(assignment__center_id=options["center"])
+        if options["date"]:
+            filters &= Q(assignment__shift__date=options["date"])
+        if options["paper"]:
+            filters &= Q(assignment__primary_paper_id=options["paper"]) | Q(assignment__common_paper_id=options["paper"])
+        if not options["all"] and not any(options[k] for k in ("shift", "center", "date", "paper")):
+            raise CommandError("Give --shift, --center, --date or --paper, or --all to grade everything.")
+
+        attempt_ids = list(ExamAttempt.objects.filter(filters).order_by("id").values_list("id", flat=True))
+        total = len(attempt_ids)
+        if not total:
+            self.stdout.write("Nothing to grade.")
+            return
+
+        size = max(1, options["chunk_size"])
+        chunks = [attempt_ids[i:i + size] for i in range(0, total, size)]
+        workers = max(1, min(options["workers"], len(chunks)))
+        self.stdout.write(f"Grading {total} attempts in {len(chunks)} chunks with {workers} worker(s)...")
+
+        done = 0
+        try:
+            if workers == 1:
+                for chunk in chunks:
+                    done += grade_chunk(chunk)
+                    self._progress(done, total)
+            else:
+                # children must open their own connections
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                    futures = [pool.submit(grade_chunk, chunk) for chunk in chunks]
+                    try:
+                        for future in as_completed(futures):
+                            done += future.result()
+                            self._progress(done, total)
+                    except KeyboardInterrupt:
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        raise
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted after {done}/{total} attempts; run again to resume.")
+
+        self.stdout.write(self.style.SUCCESS(f"Graded {done} attempts."))
+
+    def _progress(self, done, total):
+        self.stdout.write(f"  {done}/{total} ({done * 100 // total}%)")
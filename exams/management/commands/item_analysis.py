@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from exams.item_analysis import analyse_paper
+from questions.models import QuestionPaper
+
+
+class Command(BaseCommand):
+    help = "Compute item-analysis statistics (p-value, discrimination, point-biserial, distractors) per paper."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paper", type=int, action="append", help="Question paper ID (repeatable); default is every paper")
+
+    def handle(self, *args, **options):
+        paper_ids = options["paper"] or list(QuestionPaper.objects.values_list("id", flat=True))
+        for paper_id in paper_ids:
+            analysed = analyse_paper(paper_id)
+            if analysed:
+                self.stdout.write(self.style.SUCCESS(f"Paper {paper_id}: {analysed} questions analysed"))
+            else:
+                self.stdout.write(f"Paper {paper_id}: not enough submitted attempts")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.grading import AUTO_GRADED_PARTS, regrade_question
+from exams.models import Answer
+from questions.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-score answers against their question's current answer key, e.g. after a data migration "
+        "recompiled keys without the post_save regrade."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("question_ids", nargs="*", type=int, help="Question IDs")
+        parser.add_argument("--part", choices=AUTO_GRADED_PARTS, action="append", help="Only this part (repeatable)")
+        parser.add_argument("--all", action="store_true", help="Every auto-graded question with answers")
+
+    def handle(self, *args, **options):
+        if not options["all"] and not options["question_ids"] and not options["part"]:
+            raise CommandError("Give question IDs or --part, or --all to regrade everything.")
+        questions = Question.objects.filter(
+            part__in=options["part"] or AUTO_GRADED_PARTS,
+            pk__in=Answer.objects.values("question_id"),
+        )
+        if options["question_ids"]:
+            questions = questions.filter(pk__in=options["question_ids"])
+
+        changed = 0
+        for question in questions.order_by("id").iterator():
+            audit = regrade_question(question, question.answer_key, question.marks)
+            changed += audit.attempts_changed
+            if audit.attempts_changed:
+                self.stdout.write(f"Question {question.pk}: {audit.attempts_changed} attempts changed")
+        self.stdout.write(self.style.SUCCESS(f"Regraded; {changed} attempt scores changed."))
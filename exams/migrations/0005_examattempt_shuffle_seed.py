@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:33
+
+import exams.models
+from django.db import migrations, models
+
+
+def reseed_existing_attempts(apps, schema_editor):
+    """AddField gives every existing row the same default; give each its own seed."""
+    ExamAttempt = apps.get_model("exams", "ExamAttempt")
+    attempts = list(ExamAttempt.objects.only("id"))
+    for attempt in attempts:
+        attempt.shuffle_seed = exams.models.new_shuffle_seed()
+    ExamAttempt.objects.bulk_update(attempts, ["shuffle_seed"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_rename_categories_examdayavailability_trades'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='shuffle_seed',
+            field=models.PositiveIntegerField(default=exams.models.new_shuffle_seed),
+        ),
+        migrations.RunPython(reseed_existing_attempts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_examattempt_shuffle_seed'),
+        ('questions', '0014_question_answer_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_answer_key', models.CharField(blank=True, max_length=512)),
+                ('new_answer_key', models.CharField(blank=True, max_length=512)),
+                ('old_marks', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('new_marks', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('answers_rescored', models.PositiveIntegerField(default=0)),
+                ('attempts_changed', models.PositiveIntegerField(default=0)),
+                ('score_delta', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'attempt'], name='exams_answer_q_attempt_idx'),
+        ),
+        migrations.AddField(
+            model_name='regradeaudit',
+            name='changed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='regradeaudit',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrades', to='questions.question'),
+        ),
+    ]
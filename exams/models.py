@@ -1,4 +1,5 @@
 # exams/models.py
+from datetime import datetime
 from django.db import models
 from django.conf import settings
 from centers.models import Center
@@ -30,6 +31,12 @@ class Shift(models.Model):
     class Meta:
         unique_together = ("center", "date", "start_time")
 
+    @property
+    def starts_at(self):
+        from django.utils import timezone
+        start = datetime.combine(self.date, self.start_time)
+        return timezone.make_aware(start, timezone.get_current_timezone())
+
     def __str__(self):
         return f"{self.center.comd} {self.date} {self.start_time}"
 
@@ -50,9 +57,33 @@ class ExamAssignment(models.Model):
         unique_together = ("candidate", "shift")
 
 
+class ExamSubmission(models.Model):
+    """
+    Seal of a candidate's exam for a shift, written by the final submission.
+
+    Candidates with an ExamAssignment are also sealed through its status; this
+    row covers everyone, including candidates who sit the exam without one.
+    """
+    candidate = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="exam_submissions")
+    shift = models.ForeignKey(Shift, on_delete=models.PROTECT)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("candidate", "shift")
+
+    def __str__(self):
+        return f"Submission of {self.candidate} on {self.shift}"
+
+
+import secrets
 from django.utils import timezone
 from questions.models import Question
 
+
+def new_shuffle_seed():
+    return secrets.randbits(31)
+
+
 class ExamAttempt(models.Model):
     assignment = models.OneToOneField(ExamAssignment, on_delete=models.CASCADE, related_name="attempt")
     started_at = models.DateTimeField(null=True, blank=True)
@@ -61,12 +92,34 @@ class ExamAttempt(models.Model):
     objective_score = models.DecimalField(max_digits=7, decimal_places=2, default=0)
     practical_marks = models.DecimalField(max_digits=7, decimal_places=2, default=0)
     viva_marks = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    # question/option order is derived from this seed (see questions.shuffle)
+    shuffle_seed = models.PositiveIntegerField(default=new_shuffle_seed)
+
+    def mark_started(self, candidate_id=None):
+        """
+        Record the start time (once) and mint the exam-session token for this
+        attempt. `candidate_id` is the CandidateProfile pk, looked up if omitted.
+        """
+        from .tokens import mint_exam_session
 
-    def mark_started(self):
         if not self.started_at:
             self.started_at = timezone.now()
             self.save(update_fields=["started_at"])
 
+        assignment = self.assignment
+        if candidate_id is None:
+            candidate_id = assignment.candidate.candidate_profile.pk
+        # a paper without a duration has no time limit
+        duration = assignment.primary_paper.duration
+        return mint_exam_session(
+            candidate_id=candidate_id,
+            shift_id=assignment.shift_id,
+            attempt_id=self.pk,
+            paper_ids=[assignment.primary_paper_id, assignment.common_paper_id],
+            seed=self.shuffle_seed,
+            deadline=self.started_at + duration if duration else None,
+        )
+
     def __str__(self):
         return f"Attempt of {self.assignment.candidate} on {self.assignment.shift}"
 
@@ -79,6 +132,38 @@ class Answer(models.Model):
     auto_score = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # objective auto-eval
     evaluator_score = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # subjective
     final_score = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    # Part E marking queue, see exams/evaluation.py
+    claimed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="claimed_answers")
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+    evaluated_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ("attempt", "question")
+        indexes = [
+            # question -> answers, for regrading one question
+            models.Index(fields=["question", "attempt"], name="exams_answer_q_attempt_idx"),
+            # unmarked answers of a part, for the evaluation queue
+            models.Index(fields=["evaluated_at", "question"], name="exams_answer_unmarked_idx"),
+        ]
+
+
+class RegradeAudit(models.Model):
+    """One regrade triggered by a change to a question's key or marks."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="regrades")
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    old_answer_key = models.CharField(max_length=512, blank=True)
+    new_answer_key = models.CharField(max_length=512, blank=True)
+    old_marks = models.DecimalField(max_digits=5, decimal_places=2)
+    new_marks = models.DecimalField(max_digits=5, decimal_places=2)
+    answers_rescored = models.PositiveIntegerField(default=0)
+    attempts_changed = models.PositiveIntegerField(default=0)
+    score_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # sum over all attempts
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Regrade of question {self.question_id} at {self.created_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,115 @@
+import hashlib
+from datetime import timedelta
+from django.utils import timezone
+from .models import ExamAssignment, ExamAttempt, ExamSubmission
+from .tokens import mint_exam_session, revoke_exam_session
+
+OPEN_STATUSES = ("SCHEDULED", "STARTED")
+
+
+def is_exam_sealed(user, shift_id):
+    """True once the candidate's exam for this shift has been submitted."""
+    return (
+        ExamSubmission.objects.filter(candidate=user, shift_id=shift_id).exists()
+        or ExamAssignment.objects.filter(
+            candidate=user, shift_id=shift_id
+        ).exclude(status__in=OPEN_STATUSES).exists()
+    )
+
+
+def seal_exam(user, shift_id, candidate_id=None):
+    """
+    Close the candidate's exam for a shift.
+
+    Answers are already on the server via autosave, so sealing only records the
+    submission, flips an assignment to SUBMITTED and stamps the attempt.
+    Returns True if this call sealed the exam, False if it already was; call it
+    inside the transaction that stores the final answers so that only one of
+    several concurrent submissions stores them.
+    """
+    _, created = ExamSubmission.objects.get_or_create(candidate=user, shift_id=shift_id)
+    if not created:
+        return False
+    sealed = ExamAssignment.objects.filter(
+        candidate=user, shift_id=shift_id, status__in=OPEN_STATUSES
+    ).update(status="SUBMITTED")
+    # tokens are checked without the database, so deny them explicitly
+    if candidate_id is not None:
+        revoke_exam_session(candidate_id, shift_id)
+    if sealed:
+        ExamAttempt.objects.filter(
+            assignment__candidate=user, assignment__shift_id=shift_id, submitted_at__isnull=True
+        ).update(submitted_at=timezone.now())
+    return True
+
+
+def _fallback_seed(candidate_pk, shift_id):
+    digest = hashlib.sha256(f"{candidate_pk}:{shift_id}".encode()).digest()
+    return int.from_bytes(digest[:4], "big") >> 1
+
+
+def shuffle_seed_for(user, shift_id, candidate_pk):
+    """
+    Seed of the candidate's attempt for this shift.
+
+    Candidates who sit the exam without an ExamAttempt fall back to a seed
+    derived from their profile and shift, which is just as stable.
+    """
+    seed = ExamAttempt.objects.filter(
+        assignment__candidate=user, assignment__shift_id=shift_id
+    ).values_list("shuffle_seed", flat=True).first()
+    if seed is None:
+        seed = _fallback_seed(candidate_pk, shift_id)
+    return seed
+
+
+def _admission_deadline(candidate_profile, duration_seconds):
+    from registration.admission import admitted_at
+
+    if not duration_seconds:
+        return None
+    return admitted_at(candidate_profile) + timedelta(seconds=duration_seconds)
+
+
+def exam_deadline(user, candidate_profile, duration_seconds):
+    """
+    When the candidate's exam time runs out, as in their session token, or
+    None without a time limit or before their attempt has started.
+
+    With an ExamAttempt it runs from the attempt's start, otherwise from the
+    candidate's admission.
+    """
+    attempt = ExamAttempt.objects.filter(
+        assignment__candidate=user, assignment__shift_id=candidate_profile.shift_id
+    ).select_related("assignment__primary_paper").first()
+    if attempt is not None:
+        duration = attempt.assignment.primary_paper.duration
+        return attempt.started_at + duration if attempt.started_at and duration else None
+    return _admission_deadline(candidate_profile, duration_seconds)
+
+
+def start_exam_session(user, candidate_profile, paper_ids, duration_seconds):
+    """
+    Start (or resume) the candidate's exam and return a session token.
+
+    With an ExamAttempt the token comes from ExamAttempt.mark_started and the
+    deadline runs from the attempt's start. Candidates without one get a token
+    whose deadline runs from their admission (the opening of their wave, see
+    registration.admission). A paper without a duration has no deadline.
+    """
+    shift = candidate_profile.shift
+    attempt = ExamAttempt.objects.filter(
+        assignment__candidate=user, assignment__shift_id=shift.pk
+    ).select_related("assignment__primary_paper").first()
+    if attempt is not None:
+        ExamAssignment.objects.filter(pk=attempt.assignment_id, status="SCHEDULED").update(status="STARTED")
+        return attempt.mark_started(candidate_id=candidate_profile.pk)
+
+    return mint_exam_session(
+        candidate_id=candidate_profile.pk,
+        shift_id=shift.pk,
+        attempt_id=None,
+        paper_ids=paper_ids,
+        seed=_fallback_seed(candidate_profile.pk, shift.pk),
+        deadline=_admission_deadline(candidate_profile, duration_seconds),
+    )
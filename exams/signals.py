@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from questions.models import Question
+from .models import Answer
+
+# Sent after answer scores were written in bulk (grading, regrading,
+# evaluation), which bypasses Answer.save. Receives `attempt_ids`.
+scores_changed = Signal()
+
+
+@receiver(pre_save, sender=Question)
+def remember_grading_fields(sender, instance, **kwargs):
+    """Keep the stored key and marks so post_save can tell what changed."""
+    instance._previous_grading = None
+    if instance.pk:
+        instance._previous_grading = (
+            Question.objects.filter(pk=instance.pk).values_list("answer_key", "marks").first()
+        )
+
+
+@receiver(post_save, sender=Question)
+def regrade_on_key_change(sender, instance, created, **kwargs):
+    from .grading import AUTO_GRADED_PARTS, regrade_question
+
+    previous = getattr(instance, "_previous_grading", None)
+    if created or previous is None or instance.part not in AUTO_GRADED_PARTS:
+        return
+    old_key, old_marks = previous
+    if old_key == instance.answer_key and old_marks == instance.marks:
+        return
+    if not Answer.objects.filter(question_id=instance.pk).exists():
+        return
+    changed_by = getattr(instance, "_changed_by", None)
+    transaction.on_commit(lambda: regrade_question(instance, old_key, old_marks, changed_by=changed_by))
@@ -1,3 +1,264 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from centers.models import Center
+from questions.answer_keys import compile_answer_key
+from questions.models import PaperQuestion, Question, QuestionPaper, QuestionStat
+from reference.models import Trade
+
+from . import evaluation
+from .evaluation import claim_batch, submit_marks
+from .fill_blanks import BlankMatcher
+from .item_analysis import analyse_paper
+from .models import Answer, ExamAssignment, ExamAttempt, Shift
+
+
+class GradeShiftTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        cls.shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        common = QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        question = Question.objects.create(
+            text="Q", part="A", options={"choices": ["w", "x"]}, correct_answer="x", trade=trade,
+        )
+        PaperQuestion.objects.create(paper=paper, question=question, order=0)
+        cls.question = question
+        cls.attempts = {}
+        for status in ("STARTED", "SUBMITTED"):
+            assignment = ExamAssignment.objects.create(
+                candidate=User.objects.create_user(status.lower(), password=None), center=center,
+                shift=cls.shift, primary_paper=paper, common_paper=common,
+                scheduled_at=timezone.now(), status=status,
+            )
+            attempt = ExamAttempt.objects.create(assignment=assignment)
+            Answer.objects.create(attempt=attempt, question=question, given="x")
+            cls.attempts[status] = attempt
+
+    def test_only_submitted_attempts_are_graded(self):
+        call_command("grade_shift", shift=self.shift.pk, workers=1, stdout=StringIO())
+
+        in_progress = ExamAttempt.objects.select_related("assignment").get(pk=self.attempts["STARTED"].pk)
+        self.assertEqual(in_progress.assignment.status, "STARTED")
+        self.assertEqual(in_progress.objective_score, 0)
+        submitted = ExamAttempt.objects.select_related("assignment").get(pk=self.attempts["SUBMITTED"].pk)
+        self.assertEqual(submitted.assignment.status, "EVALUATED")
+        self.assertGreater(submitted.objective_score, 0)
+
+    def test_key_edit_changes_totals_of_graded_attempts_only(self):
+        call_command("grade_shift", shift=self.shift.pk, workers=1, stdout=StringIO())
+        # the in-progress candidate has since picked the answer the new key accepts
+        Answer.objects.filter(attempt=self.attempts["STARTED"]).update(given="w")
+
+        question = Question.objects.get(pk=self.question.pk)
+        question.correct_answer = "w"
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+
+        graded = ExamAttempt.objects.get(pk=self.attempts["SUBMITTED"].pk)
+        self.assertEqual(graded.objective_score, 0)
+        in_progress = ExamAttempt.objects.get(pk=self.attempts["STARTED"].pk)
+        self.assertEqual(in_progress.objective_score, 0)
+        self.assertEqual(Answer.objects.get(attempt=in_progress).auto_score, 0)
+
+    def test_regrade_questions_rescores_keys_changed_without_signals(self):
+        call_command("grade_shift", shift=self.shift.pk, workers=1, stdout=StringIO())
+        # as a data migration would: bulk write, no post_save regrade
+        Question.objects.filter(pk=self.question.pk).update(answer_key="1")
+
+        call_command("regrade_questions", self.question.pk, stdout=StringIO())
+
+        self.assertEqual(ExamAttempt.objects.get(pk=self.attempts["SUBMITTED"].pk).objective_score, 0)
+
+
+@override_settings(EVALUATION_BATCH_SIZE=3)
+class EvaluationQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        common = QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        question = Question.objects.create(text="Explain", part="E", marks=5, trade=trade)
+        for i in range(12):
+            assignment = ExamAssignment.objects.create(
+                candidate=User.objects.create_user(f"cand{i}", password=None), center=center, shift=shift,
+                primary_paper=paper, common_paper=common, scheduled_at=timezone.now(), status="SUBMITTED",
+            )
+            attempt = ExamAttempt.objects.create(assignment=assignment, submitted_at=timezone.now())
+            Answer.objects.create(attempt=attempt, question=question, text_answer=f"answer {i}")
+        cls.alice = User.objects.create_user("alice", password=None)
+        cls.bob = User.objects.create_user("bob", password=None)
+
+    def ids(self, answers):
+        return {a.id for a in answers}
+
+    def test_claim_is_a_lease_of_distinct_answers(self):
+        mine = claim_batch(self.alice)
+        theirs = claim_batch(self.bob)
+
+        self.assertEqual(len(mine), 3)
+        self.assertEqual(len(theirs), 3)
+        self.assertFalse(self.ids(mine) & self.ids(theirs))
+        self.assertEqual(len({a.claim_token for a in mine}), 1)
+        self.assertTrue(all(a.claimed_by_id == self.alice.pk and a.claim_expires_at > timezone.now() for a in mine))
+
+    def test_rows_won_by_another_evaluator_are_skipped(self):
+        sample = evaluation.random.sample
+        raced = []
+
+        def bob_gets_there_first(population, k):
+            picked = sample(population, k)
+            if not raced:
+                raced.extend(picked)
+                Answer.objects.filter(id__in=picked).update(
+                    claimed_by=self.bob, claim_expires_at=timezone.now() + datetime.timedelta(minutes=5),
+                )
+            return picked
+
+        with mock.patch.object(evaluation.random, "sample", side_effect=bob_gets_there_first):
+            mine = claim_batch(self.alice)
+
+        self.assertEqual(len(mine), 3)
+        self.assertFalse(self.ids(mine) & set(raced))
+        self.assertEqual(Answer.objects.filter(id__in=raced, claimed_by=self.bob).count(), 3)
+
+    def test_skip_locked_path_claims_the_head_of_the_queue(self):
+        with mock.patch.object(connection.features, "has_select_for_update_skip_locked", True):
+            mine = claim_batch(self.alice)
+            theirs = claim_batch(self.bob)
+
+        queue = list(Answer.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual([a.id for a in mine], queue[:3])
+        self.assertEqual([a.id for a in theirs], queue[3:6])
+
+    def test_expired_claims_return_to_the_queue(self):
+        mine = claim_batch(self.alice)
+        Answer.objects.exclude(id__in=self.ids(mine)).update(evaluated_at=timezone.now())
+        Answer.objects.filter(id__in=self.ids(mine)).update(claim_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        theirs = claim_batch(self.bob)
+
+        self.assertEqual(self.ids(theirs), self.ids(mine))
+        saved, rejected = submit_marks(self.alice, {a.id: 2 for a in mine})
+        self.assertEqual(saved, [])
+        self.assertCountEqual(rejected, self.ids(mine))
+
+    def test_at_most_one_batch_is_prefetched(self):
+        first = claim_batch(self.alice)
+        second = claim_batch(self.alice)
+
+        self.assertEqual(len(second), 3)
+        self.assertEqual(claim_batch(self.alice), [])
+        saved, rejected = submit_marks(self.alice, {a.id: 4 for a in first})
+        self.assertEqual((len(saved), rejected), (3, []))
+        self.assertEqual(len(claim_batch(self.alice)), 3)
+
+
+class ItemAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        cls.paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        common = QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        cls.easy, cls.hard = [
+            Question.objects.create(
+                text=text, part="A", options={"choices": ["a", "b", "c", "d"]}, correct_answer="a", trade=trade,
+            )
+            for text in ("easy", "hard")
+        ]
+        for order, question in enumerate((cls.easy, cls.hard)):
+            PaperQuestion.objects.create(paper=cls.paper, question=question, order=order)
+        # candidates 0-4 get both right, 5-6 only the easy one, 7-9 neither;
+        # 7-8 fall for "b" on the easy question and 9 leaves it blank
+        easy = ["a"] * 7 + ["b", "b", None]
+        hard = ["a"] * 5 + ["c"] * 5
+        for i in range(11):
+            assignment = ExamAssignment.objects.create(
+                candidate=User.objects.create_user(f"cand{i}", password=None), center=center, shift=shift,
+                primary_paper=cls.paper, common_paper=common, scheduled_at=timezone.now(), status="SUBMITTED",
+            )
+            # the last candidate is still writing and is left out
+            attempt = ExamAttempt.objects.create(assignment=assignment, submitted_at=timezone.now() if i < 10 else None)
+            for question, given in ((cls.easy, easy[i % 10]), (cls.hard, hard[i % 10])):
+                if given is not None:
+                    Answer.objects.create(attempt=attempt, question=question, given=given)
+
+    def stat(self, question):
+        return QuestionStat.objects.get(question=question, paper=self.paper)
+
+    def test_statistics_of_each_question(self):
+        self.assertEqual(analyse_paper(self.paper.pk), 2)
+
+        easy, hard = self.stat(self.easy), self.stat(self.hard)
+        self.assertEqual((easy.responses, easy.p_value, hard.p_value), (10, 0.7, 0.5))
+        self.assertEqual((easy.discrimination, hard.discrimination), (1.0, 1.0))
+        # both items correlate 0.15 / sqrt(0.21 * 0.25) with the other one
+        self.assertEqual((easy.point_biserial, hard.point_biserial), (0.6547, 0.6547))
+        self.assertEqual(easy.distractors, {"a": 0.7, "b": 0.2, "c": 0.0, "d": 0.0, "(omitted)": 0.1})
+        self.assertEqual(hard.distractors, {"a": 0.5, "b": 0.0, "c": 0.5, "d": 0.0, "(omitted)": 0.0})
+
+    def test_rerun_updates_the_rows(self):
+        analyse_paper(self.paper.pk)
+        Answer.objects.filter(question=self.hard, given="c").update(given="a")
+
+        analyse_paper(self.paper.pk)
+
+        self.assertEqual(QuestionStat.objects.filter(paper=self.paper).count(), 2)
+        hard = self.stat(self.hard)
+        self.assertEqual((hard.p_value, hard.point_biserial), (1.0, None))
+
+    def test_too_few_attempts_are_not_analysed(self):
+        ExamAttempt.objects.filter(assignment__candidate__username__in=["cand0", "cand1"]).update(submitted_at=None)
+
+        self.assertEqual(analyse_paper(self.paper.pk), 0)
+        self.assertFalse(QuestionStat.objects.exists())
+
+
+class BlankMatcherTests(SimpleTestCase):
+    def matcher(self, key):
+        return BlankMatcher(compile_answer_key("D", key))
+
+    def test_decimals_are_not_reordered(self):
+        matcher = self.matcher("3.5")
+        self.assertTrue(matcher("3.50"))
+        self.assertFalse(matcher("5.3"))
+        self.assertFalse(matcher("3 5"))
+
+    def test_thousands_separators_and_number_words(self):
+        matcher = self.matcher("1,000")
+        for answer in ("1000", "1,000", "one thousand"):
+            self.assertTrue(matcher(answer), answer)
+        self.assertFalse(matcher("1"))
+
+    def test_number_word_keys(self):
+        for key, answers in (
+            ("one hundred", ("one hundred", "100")),
+            ("two thousand", ("two thousand", "2000", "2,000")),
+            ("seventy five percent", ("seventy five percent", "75 percent")),
+        ):
+            matcher = self.matcher(key)
+            for answer in answers:
+                self.assertTrue(matcher(answer), (key, answer))
+        self.assertEqual(compile_answer_key("D", "one hundred"), "100")
+        self.assertFalse(self.matcher("one hundred")("hundred"))
+
+    def test_number_words_in_a_row_stay_separate(self):
+        self.assertFalse(self.matcher("3")("one two"))
+        self.assertFalse(self.matcher("11")("nine one one"))
+        self.assertTrue(self.matcher("9 1 1")("nine one one"))
+        self.assertTrue(self.matcher("20 20")("twenty twenty"))
+        self.assertTrue(self.matcher("2500")("two thousand five hundred"))
+        self.assertTrue(self.matcher("75 percent")("seventy five percent"))
@@ -0,0 +1,83 @@
+"""
+Stateless, signed exam-session tokens.
+
+A token is minted when an attempt starts and carries everything the
+high-frequency exam endpoints (autosave, heartbeat) need: the candidate,
+attempt, paper IDs, shuffle seed and deadline. Checking one is a signature
+and clock check plus a single cache lookup against the revocation deny-list,
+so those requests never have to read CandidateProfile, Shift or the papers.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+SESSION_TOKEN_SALT = "exams.exam-session"
+SESSION_TOKEN_HEADER = "HTTP_X_EXAM_SESSION"
+# the deny-list lives in its own cache so that rosters and snapshots in the
+# default cache never push revocations out
+SESSION_CACHE_ALIAS = "exam_sessions"
+
+_REVOKED_KEY = "exams:session_revoked:{}:{}"
+
+
+class InvalidExamSession(Exception):
+    """The token is forged, expired or revoked."""
+
+
+def grace_seconds():
+    # late autosaves are still accepted for a moment after the deadline
+    return getattr(settings, "EXAM_SESSION_GRACE", 120)
+
+
+def mint_exam_session(candidate_id, shift_id, attempt_id, paper_ids, seed, deadline):
+    """Sign a session token; `deadline` is an aware datetime, None for no time limit."""
+    claims = {
+        "c": candidate_id,
+        "sh": shift_id,
+        "a": attempt_id,
+        "p": [pid for pid in paper_ids if pid],
+        "s": seed,
+        "d": int(deadline.timestamp()) if deadline is not None else None,
+    }
+    return signing.dumps(claims, salt=SESSION_TOKEN_SALT, compress=True)
+
+
+def read_exam_session(token, allow_expired=False):
+    """
+    Return the claims of a valid token or raise InvalidExamSession.
+
+    `allow_expired` skips the deadline check, e.g. for a heartbeat that only
+    reports the remaining time.
+    """
+    if not token:
+        raise InvalidExamSession("Missing exam session token.")
+    try:
+        claims = signing.loads(token, salt=SESSION_TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidExamSession("Invalid exam session token.")
+    if not allow_expired and claims["d"] is not None and time.time() > claims["d"] + grace_seconds():
+        raise InvalidExamSession("Exam time is over.")
+    if caches[SESSION_CACHE_ALIAS].get(_REVOKED_KEY.format(claims["c"], claims["sh"])):
+        raise InvalidExamSession("Exam session has been closed.")
+    return claims
+
+
+def remaining_seconds(claims):
+    """Seconds left before the deadline, None if the exam has no time limit."""
+    if claims["d"] is None:
+        return None
+    return max(0, int(claims["d"] - time.time()))
+
+
+def revoke_exam_session(candidate_id, shift_id, deadline=None):
+    """
+    Deny every token of a candidate's exam in this shift, e.g. once sealed.
+
+    The deny-list entry only has to outlive the tokens it blocks.
+    """
+    ttl = getattr(settings, "EXAM_SESSION_REVOKE_TTL", 60 * 60 * 12)
+    if deadline is not None:
+        ttl = max(60, int(deadline.timestamp() - time.time()) + grace_seconds() + 60)
+    caches[SESSION_CACHE_ALIAS].set(_REVOKED_KEY.format(candidate_id, shift_id), True, ttl)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("evaluation/claim/", views.evaluation_claim, name="evaluation_claim"),
+    path("evaluation/submit/", views.evaluation_submit, name="evaluation_submit"),
+    path("evaluation/release/", views.evaluation_release, name="evaluation_release"),
+]
@@ -1,6 +1,13 @@
 # exams/views.py
+import json
+from functools import wraps
+
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_POST
+from accounts.models import User
+from exams.evaluation import claim_batch, release_claims, submit_marks
 from exams.models import ExamAssignment, ExamAttempt
 
 @login_required
@@ -26,3 +33,57 @@ def candidate_dashboard(request):
         "assignments": assignments,
         "results": results,
     })
+
+
+def evaluator_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"ok": False, "error": "Login required."}, status=401)
+        if request.user.role != User.Roles.EVALUATOR and not request.user.is_superuser:
+            return JsonResponse({"ok": False, "error": "Evaluators only."}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _serialize_claim(answer):
+    # candidates stay anonymous to evaluators
+    return {
+        "id": answer.id,
+        "question": {"id": answer.question_id, "text": answer.question.text, "marks": str(answer.question.marks)},
+        "answer": answer.text_answer,
+        "expires_at": answer.claim_expires_at.isoformat(),
+    }
+
+
+@require_POST
+@evaluator_required
+def evaluation_claim(request):
+    """
+    Claim the next batch of Part E answers to mark.
+
+    Call again as soon as a batch arrives to prefetch the following one; an
+    evaluator holds at most two batches.
+    """
+    answers = claim_batch(request.user)
+    return JsonResponse({"ok": True, "answers": [_serialize_claim(a) for a in answers]})
+
+
+@require_POST
+@evaluator_required
+def evaluation_submit(request):
+    """Save marks sent as JSON: {"marks": {"<answer id>": 7.5}}."""
+    try:
+        marks = {int(k): v for k, v in json.loads(request.body)["marks"].items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({"ok": False, "error": "Malformed marks payload."}, status=400)
+    saved, rejected = submit_marks(request.user, marks)
+    return JsonResponse({"ok": True, "saved": saved, "rejected": rejected})
+
+
+@require_POST
+@evaluator_required
+def evaluation_release(request):
+    """Return unmarked claims to the queue, e.g. when the evaluator logs off."""
+    released = release_claims(request.user)
+    return JsonResponse({"ok": True, "released": released})
@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Question, QuestionPaper, PaperQuestion, QuestionUpload
+from django.db.models import Count
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from .models import ImportJob, Question, QuestionPaper, PaperQuestion, QuestionStat, QuestionUpload
 from .forms import QuestionUploadForm
+from .snapshots import invalidate_paper_snapshot
 from django.contrib import messages
 
 class PaperQuestionInline(admin.TabularInline):
@@ -8,14 +13,41 @@ class PaperQuestionInline(admin.TabularInline):
     extra = 1
     autocomplete_fields = ["question"]
 
+class QuestionStatInline(admin.TabularInline):
+    model = QuestionStat
+    extra = 0
+    can_delete = False
+    fields = ("paper", "responses", "p_value", "discrimination", "point_biserial", "distractors", "computed_at")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ("id", "part", "marks", "trade", "is_active", "created_at")
     list_filter = ("part", "trade", "is_active", "created_at")
     search_fields = ("text",)
+    readonly_fields = ("answer_key", "upload")
+    inlines = [QuestionStatInline]
     list_per_page = 50
     ordering = ("-created_at",)
 
+    def save_model(self, request, obj, form, change):
+        # recorded on the regrade audit if the key or marks change
+        obj._changed_by = request.user
+        super().save_model(request, obj, form, change)
+
+@admin.register(QuestionStat)
+class QuestionStatAdmin(admin.ModelAdmin):
+    # sort by p-value or discrimination to find questions to retire
+    list_display = ("question", "paper", "responses", "p_value", "discrimination", "point_biserial", "computed_at")
+    list_filter = ("paper",)
+    list_select_related = ("question", "paper")
+    ordering = ("discrimination",)
+    readonly_fields = ("question", "paper", "responses", "p_value", "discrimination", "point_biserial",
+                       "distractors", "computed_at")
+
 @admin.register(QuestionPaper)
 class QuestionPaperAdmin(admin.ModelAdmin):
     list_display = ("title", "upload", "is_common", "trade", "active_from", "active_to")
@@ -26,38 +58,88 @@ class QuestionPaperAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         if obj.upload:
-            # Auto-link questions that were imported from this upload
-            questions = Question.objects.filter(created_at__gte=obj.upload.uploaded_at)
-            created_count = 0
-            
-            for i, q in enumerate(questions, start=1):
-                paper_question, created = PaperQuestion.objects.get_or_create(
-                    paper=obj,
-                    question=q,
-                    defaults={"order": i}
-                )
-                if created:
-                    created_count += 1
+            # Auto-link questions that were imported from this upload, in file order
+            question_ids = obj.upload.questions.order_by("id").values_list("id", flat=True)
+            linked = set(PaperQuestion.objects.filter(paper=obj).values_list("question_id", flat=True))
+            new_links = [
+                PaperQuestion(paper=obj, question_id=question_id, order=i)
+                for i, question_id in enumerate(question_ids, start=1)
+                if question_id not in linked
+            ]
+            PaperQuestion.objects.bulk_create(new_links)
+            created_count = len(new_links)
+            if new_links:
+                # bulk_create sends no post_save for the snapshot receiver
+                invalidate_paper_snapshot(obj.pk)
             
             if created_count > 0:
                 messages.success(request, f"Linked {created_count} questions to this paper")
 
+class ImportJobInline(admin.StackedInline):
+    model = ImportJob
+    extra = 0
+    can_delete = False
+    fields = ("status", "rows_total", "rows_imported", "rows_skipped", "errors", "worker",
+              "created_at", "started_at", "finished_at")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(QuestionUpload)
 class QuestionUploadAdmin(admin.ModelAdmin):
     form = QuestionUploadForm
-    list_display = ("file", "uploaded_at", "get_questions_count")
+    list_display = ("file", "uploaded_at", "get_import_status", "get_questions_count")
+    list_select_related = ("import_job",)
     search_fields = ("file",)
     readonly_fields = ("uploaded_at",)
+    inlines = [ImportJobInline]
+    change_form_template = "admin/questions/questionupload/change_form.html"
     list_per_page = 20
     ordering = ("-uploaded_at",)
 
+    def _job(self, obj):
+        try:
+            return obj.import_job
+        except ImportJob.DoesNotExist:
+            return None
+
+    def get_import_status(self, obj):
+        job = self._job(obj)
+        return job.get_status_display() if job else "-"
+    get_import_status.short_description = "Import Status"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(questions_count=Count("questions"))
+
     def get_questions_count(self, obj):
         """Show how many questions were imported from this upload"""
-        if obj.uploaded_at:
-            count = Question.objects.filter(created_at__gte=obj.uploaded_at).count()
-            return f"{count} questions"
-        return "0 questions"
+        job = self._job(obj)
+        if job is not None and job.rows_skipped:
+            return f"{obj.questions_count} questions ({job.rows_skipped} skipped)"
+        return f"{obj.questions_count} questions"
     get_questions_count.short_description = "Imported Questions"
+    get_questions_count.admin_order_field = "questions_count"
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:pk>/import-status/', self.admin_site.admin_view(self.import_status_view), name='questions_questionupload_import_status'),
+        ]
+        return custom_urls + urls
+
+    def import_status_view(self, request, pk):
+        """JSON progress of the upload's import job, polled by the change form."""
+        job = get_object_or_404(ImportJob, upload_id=pk)
+        return JsonResponse({
+            "status": job.status,
+            "status_display": job.get_status_display(),
+            "finished": job.is_finished,
+            "rows_total": job.rows_total,
+            "rows_imported": job.rows_imported,
+            "rows_skipped": job.rows_skipped,
+            "errors": job.errors[:20],
+        })
 
     def save_model(self, request, obj, form, change):
         # Ensure password is saved
@@ -68,29 +150,20 @@ class QuestionUploadAdmin(admin.ModelAdmin):
         
         if not change:  # Only for new uploads
             messages.info(request, 
-                "File uploaded successfully. Questions will be imported automatically.")
+                "File uploaded. Questions are imported in the background; "
+                "this page shows the progress.")
 
-    def response_add(self, request, obj, post_url_redirect=None):
-        response = super().response_add(request, obj, post_url_redirect)
-        
-        # Add success message with import status
-        if obj:
-            try:
-                import time
-                time.sleep(1)  # Give signals time to process
-                
-                questions_count = Question.objects.filter(
-                    created_at__gte=obj.uploaded_at
-                ).count()
-                
-                if questions_count > 0:
-                    messages.success(request, 
-                        f"Successfully imported {questions_count} questions from {obj.file.name}")
-                else:
-                    messages.warning(request, 
-                        "Upload completed but no questions were imported. "
-                        "Please check the file format and password.")
-            except Exception as e:
-                messages.error(request, f"Upload completed but there was an error: {e}")
-        
-        return response
\ No newline at end of file
+    def response_post_save_add(self, request, obj):
+        # Open the new upload so its import progress can be followed
+        return HttpResponseRedirect(reverse("admin:questions_questionupload_change", args=[obj.pk]))
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ("upload", "status", "rows_total", "rows_imported", "rows_skipped", "worker", "created_at", "finished_at")
+    list_filter = ("status",)
+    list_select_related = ("upload",)
+    readonly_fields = ("upload", "status", "rows_total", "rows_imported", "rows_skipped", "errors", "worker",
+                       "created_at", "started_at", "finished_at", "updated_at")
+
+    def has_add_permission(self, request):
+        return False
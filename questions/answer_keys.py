@@ -0,0 +1,244 @@
+"""
+Canonical, compiled answer keys.
+
+Question.correct_answer is free-form JSON ("B", "TRUE", option text, lists).
+At import it is compiled once into Question.answer_key so graders compare
+against a fixed representation instead of re-parsing the key per answer:
+
+* Parts A/B/C: bitmask of the correct option indexes, as a decimal string.
+* Part F: 1 for True, 2 for False (the same bitmask over TRUE/FALSE).
+* Part D: accepted variants separated by "|", each its normalized numbers
+  (number words folded to digits) in order followed by the sorted set of its
+  normalized words. Only a list key has several variants; a string key is
+  one variant, commas included.
+* Part E: empty, it is marked by an evaluator.
+"""
+import re
+
+MCQ_PARTS = ("A", "B", "C")
+OBJECTIVE_PARTS = ("A", "B", "C", "F")
+TRUE_MASK = 1
+FALSE_MASK = 2
+VARIANT_SEPARATOR = "|"
+# length of the Question.answer_key column
+MAX_KEY_LENGTH = 512
+
+_LETTERS = "ABCDEFGHIJ"
+_TRUE_WORDS = {"true", "t", "yes", "y", "1"}
+_FALSE_WORDS = {"false", "f", "no", "n", "0"}
+# a number keeps its decimal point and thousands separators ("1,000", "1,00,000")
+_TOKEN = re.compile(r"\d+(?:,\d{2,3})*(?:\.\d+)?(?!\w)|\w+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALES = {"hundred": 100, "thousand": 1000, "lakh": 100000}
+
+
+def _is_number_word(token):
+    return token in _UNITS or token in _TENS or token in _SCALES
+
+
+def fold_numbers(tokens):
+    """
+    Replace runs of number words ("one hundred and five") with digits ("105").
+
+    A unit word right after another unit, or after a tens word unless it
+    completes it ("seventy five"), starts a new number: "nine one one" is
+    "9 1 1", not 11.
+    """
+    out = []
+    value = None
+    current = 0
+    last = None  # kind of the previous number word: "unit", "tens" or "scale"
+    for i, token in enumerate(tokens + [None]):
+        if token in _UNITS or token in _TENS:
+            kind = "unit" if token in _UNITS else "tens"
+            if last == "unit" or (last == "tens" and (kind == "tens" or _UNITS[token] >= 10)):
+                out.append(str(value + current))
+                value, current = None, 0
+            current += _UNITS.get(token) or _TENS.get(token, 0)
+            value = value or 0
+            last = kind
+            continue
+        if token in _SCALES and value is not None:
+            value += max(current, 1) * _SCALES[token]
+            current = 0
+            last = "scale"
+            continue
+        if token == "and" and value is not None and i + 1 < len(tokens) and _is_number_word(tokens[i + 1]):
+            continue
+        if value is not None:
+            out.append(str(value + current))
+            value, current, last = None, 0, None
+        if token is not None:
+            out.append(token)
+    return out
+
+
+class InvalidAnswerKey(ValueError):
+    """The correct answer of a question cannot be compiled."""
+
+
+def _as_list(value, split=False):
+    """A key or answer as a list; with `split`, "A, C" style strings are split too."""
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    if split and isinstance(value, str) and any(sep in value for sep in ",|;"):
+        return [v for v in (p.strip() for p in re.split(r"[,|;]", value)) if v]
+    return [value]
+
+
+def choices_of(options):
+    """Option texts of a question's `options` JSON."""
+    if isinstance(options, dict):
+        return tuple(str(c) for c in options.get("choices") or ())
+    if isinstance(options, list):
+        return tuple(str(c) for c in options)
+    return ()
+
+
+def mcq_mask(value, choices):
+    """
+    Encode an MCQ answer or key as a bitmask of option indexes.
+
+    Accepts option letters ("B"), 1-based numbers, option text or a list of
+    those. A string is first matched whole against the option texts, which
+    may contain commas, and only split on "," "|" ";" if that fails. Returns 0
+    if nothing can be matched.
+    """
+    if value is None:
+        return 0
+    lowered = [str(c).strip().lower() for c in choices or ()]
+    whole = isinstance(value, str) and value.strip().lower() in lowered
+    mask = 0
+    for item in _as_list(value, split=not whole):
+        if isinstance(item, bool):
+            continue
+        if isinstance(item, int):
+            index = item - 1
+        else:
+            text = str(item).strip()
+            low = text.lower()
+            if low in lowered:
+                index = lowered.index(low)
+            elif len(text) == 1 and text.upper() in _LETTERS:
+                index = _LETTERS.index(text.upper())
+            elif text.isdigit():
+                index = int(text) - 1
+            else:
+                continue
+        if 0 <= index < (len(lowered) or len(_LETTERS)):
+            mask |= 1 << index
+    return mask
+
+
+def tf_mask(value):
+    """Encode a True/False answer or key: TRUE_MASK, FALSE_MASK or 0."""
+    if isinstance(value, list):
+        value = value[0] if len(value) == 1 else None
+    if isinstance(value, bool):
+        return TRUE_MASK if value else FALSE_MASK
+    if value is None:
+        return 0
+    low = str(value).strip().lower()
+    if low in _TRUE_WORDS:
+        return TRUE_MASK
+    if low in _FALSE_WORDS:
+        return FALSE_MASK
+    return 0
+
+
+def encode(part, value, choices):
+    """Encode an answer or key of any objective part."""
+    if part == "F":
+        # custom T/F wording falls back to its position: first option is True
+        return tf_mask(value) or (mcq_mask(value, choices[:2]) if choices else 0)
+    return mcq_mask(value, choices)
+
+
+def _canonical_number(token):
+    number = token.replace(",", "")
+    if "." in number:
+        number = number.rstrip("0").rstrip(".")
+    return number.lstrip("0") or "0"
+
+
+def is_number(token):
+    return bool(_NUMBER.fullmatch(token))
+
+
+def normalize_text(value):
+    """
+    Lower-case and drop punctuation, keeping numbers whole: "1,000" becomes
+    "1000" and "3.50" becomes "3.5".
+    """
+    return " ".join(
+        _canonical_number(token) if is_number(token.replace(",", "")) else token
+        for token in _TOKEN.findall(str(value).lower())
+    )
+
+
+def canonical_order(tokens):
+    """Numbers in their original order (3.5 is not 5.3), then the sorted set of words."""
+    numbers = [t for t in tokens if is_number(t)]
+    words = sorted({t for t in tokens if not is_number(t)})
+    return tuple(numbers + words)
+
+
+def canonical_tokens(value):
+    """Tokens of a key or answer with number words as digits, in canonical_order."""
+    return canonical_order(fold_numbers(normalize_text(value).split()))
+
+
+def token_set(value):
+    return " ".join(canonical_tokens(value))
+
+
+def compile_answer_key(part, correct_answer, options=None):
+    """
+    Compile a question's correct answer into its canonical key.
+
+    Raises InvalidAnswerKey if the answer is missing, does not match the
+    question's options or compiles to more than MAX_KEY_LENGTH characters.
+    """
+    part = (part or "A").upper()
+    if part == "E":
+        return ""
+    if correct_answer in (None, "", []):
+        raise InvalidAnswerKey(f"Part {part} question has no correct answer.")
+
+    if part == "D":
+        variants = [token_set(v) for v in _as_list(correct_answer)]  # never split, "1,000" is one answer
+        variants = sorted({v for v in variants if v})
+        if not variants:
+            raise InvalidAnswerKey(f"Fill-in-the-blank answer {correct_answer!r} has no words.")
+        key = VARIANT_SEPARATOR.join(variants)
+        if len(key) > MAX_KEY_LENGTH:
+            raise InvalidAnswerKey(
+                f"Fill-in-the-blank answers are too long: {len(key)} characters compiled, at most {MAX_KEY_LENGTH}."
+            )
+        return key
+
+    choices = choices_of(options)
+    mask = encode(part, correct_answer, choices)
+    if not mask:
+        raise InvalidAnswerKey(f"Answer {correct_answer!r} does not match any option of a part {part} question.")
+    if part in ("A", "F") and mask & (mask - 1):
+        raise InvalidAnswerKey(f"Part {part} question must have exactly one correct answer, got {correct_answer!r}.")
+    return str(mask)
+
+
+def compile_or_blank(part, correct_answer, options=None):
+    """compile_answer_key for existing data: malformed keys become blank."""
+    try:
+        return compile_answer_key(part, correct_answer, options)
+    except InvalidAnswerKey:
+        return ""
@@ -1,6 +1,6 @@
 from django import forms
 from .models import QuestionUpload
-from .services import is_encrypted_dat, decrypt_dat_content, load_questions_from_excel_data
+from .services import forget_parsed_questions, parse_dat_file
 
 class QuestionUploadForm(forms.ModelForm):
     decryption_password = forms.CharField(
@@ -26,50 +26,23 @@ class QuestionUploadForm(forms.ModelForm):
 
         if file and password:
             try:
-                # Read file content into memory
-                file.seek(0)
-                file_content = file.read()
-                file.seek(0)  # Reset file pointer
-
-                # Basic validation - check if it looks like encrypted data
-                if not is_encrypted_dat(file_content):
-                    raise forms.ValidationError(
-                        "File does not appear to be encrypted. Expected encrypted DAT file."
-                    )
-
-                # Test decryption with provided password
+                # Decrypt and parse once, streaming; the import job reuses the cached result
                 try:
-                    decrypted_data = decrypt_dat_content(file_content, password)
-                    
-                    # Verify it's a valid Excel file by checking magic bytes
-                    if not decrypted_data.startswith(b'PK'):
-                        raise forms.ValidationError(
-                            "Decrypted data is not a valid Excel file format."
-                        )
-                    
-                    # Try to parse the Excel data to validate structure
-                    try:
-                        questions = load_questions_from_excel_data(decrypted_data)
-                        if not questions:
-                            raise forms.ValidationError(
-                                "No valid questions found in the Excel file."
-                            )
-                        
-                        # Store for later use in signals
-                        cleaned_data['validated_questions_count'] = len(questions)
-                        
-                    except Exception as e:
-                        raise forms.ValidationError(
-                            f"Error parsing Excel structure: {str(e)}"
-                        )
-                        
+                    cache_key, questions_count = parse_dat_file(file, password)
                 except ValueError as e:
                     raise forms.ValidationError(
-                        f"Decryption failed: {str(e)}. Please check your password."
+                        f"{str(e)}. Please check the file and your password."
                     )
-                
-                # Store file content for later use
-                cleaned_data['file_content'] = file_content
+                finally:
+                    file.seek(0)  # Reset file pointer for saving
+                if not questions_count:
+                    forget_parsed_questions(cache_key)
+                    raise forms.ValidationError(
+                        "No valid questions found in the Excel file."
+                    )
+
+                cleaned_data['validated_questions_count'] = questions_count
+                cleaned_data['parse_cache_key'] = cache_key
                 
             except forms.ValidationError:
                 raise  # Re-raise form validation errors
@@ -87,7 +60,10 @@ class QuestionUploadForm(forms.ModelForm):
         if 'decryption_password' in self.cleaned_data:
             instance.decryption_password = self.cleaned_data['decryption_password']
         
+        # Picked up by the import job queued on save
+        instance._parse_cache_key = self.cleaned_data.get('parse_cache_key', '')
+        
         if commit:
             instance.save()
             
-        return instance
\ No newline at end of file
+        return instance
@@ -0,0 +1,200 @@
+"""
+Background import of uploaded question files.
+
+Saving a QuestionUpload only queues an ImportJob; a worker process
+(`manage.py run_import_jobs`) decrypts, parses and inserts it, recording each
+stage on the job so the admin can poll progress. The queue is the ImportJob
+table itself: workers claim a queued job with a conditional UPDATE, so any
+number of them can run without taking the same job twice. Jobs whose worker
+stopped updating them are re-queued after QUESTION_IMPORT_STALE_AFTER seconds
+and resume after the rows already committed.
+"""
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ImportJob
+from .services import (
+    batched,
+    cached_question_count,
+    dat_key,
+    decrypt_dat_stream,
+    forget_parsed_questions,
+    TradeLookup,
+    import_questions_from_dicts,
+    iter_cached_questions,
+    iter_questions_from_excel_data,
+)
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 2000
+ACTIVE_STATUSES = (ImportJob.Status.DECRYPTING, ImportJob.Status.PARSING, ImportJob.Status.INSERTING)
+
+
+class ImportFailed(Exception):
+    """The upload cannot be imported; the message is shown to the admin."""
+
+
+class JobLost(Exception):
+    """The job was re-queued and claimed by another worker."""
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_import(upload):
+    """Queue an import of `upload` and, after commit, make sure a worker picks it up."""
+    job, _ = ImportJob.objects.get_or_create(
+        upload=upload, defaults={"parse_cache_key": getattr(upload, "_parse_cache_key", "")}
+    )
+    if getattr(settings, "QUESTION_IMPORT_SPAWN_WORKER", True):
+        transaction.on_commit(spawn_worker)
+    return job
+
+
+def spawn_worker():
+    """Start a detached local worker that drains the queue and exits."""
+    try:
+        subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), "run_import_jobs", "--until-empty"],
+            cwd=str(settings.BASE_DIR),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError as e:
+        logger.error("Could not start an import worker, run `manage.py run_import_jobs`: %s", e)
+
+
+def requeue_stale_jobs():
+    stale_after = getattr(settings, "QUESTION_IMPORT_STALE_AFTER", 15 * 60)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return ImportJob.objects.filter(status__in=ACTIVE_STATUSES, updated_at__lt=cutoff).update(
+        status=ImportJob.Status.QUEUED, worker=""
+    )
+
+
+def claim_next_job(worker):
+    """Take the oldest queued job for `worker`, or return None."""
+    for job_id in ImportJob.objects.filter(status=ImportJob.Status.QUEUED).order_by("created_at", "id").values_list("id", flat=True)[:5]:
+        claimed = ImportJob.objects.filter(id=job_id, status=ImportJob.Status.QUEUED).update(
+            # a re-queued job keeps its counts and resumes after them, see run_job
+            status=ImportJob.Status.DECRYPTING, worker=worker, started_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if claimed:
+            return ImportJob.objects.select_related("upload").get(id=job_id)
+    return None
+
+
+def _set_status(job, status, **fields):
+    job.status = status
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=["status", "updated_at", *fields])
+
+
+def _save_progress(job):
+    """Save the job's counts, unless another worker has taken the job over."""
+    saved = ImportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+        rows_total=job.rows_total, rows_imported=job.rows_imported, rows_skipped=job.rows_skipped,
+        errors=job.errors, updated_at=timezone.now(),
+    )
+    if not saved:
+        raise JobLost(f"Import job {job.pk} was re-queued and taken over")
+
+
+def run_job(job):
+    """
+    Decrypt, parse and insert one claimed job, recording every stage.
+
+    Questions are inserted IMPORT_BATCH_SIZE at a time, each batch committed
+    together with the job's counts, so the first rows are committed (and
+    counted on the job) before the rest of the sheet is read. A re-queued job
+    resumes after the rows already counted instead of inserting them again.
+    """
+    upload = job.upload
+    row_errors = []
+    # rows a previous worker committed before the job was re-queued
+    resume_from = job.rows_imported + job.rows_skipped
+    try:
+        with ExitStack() as stack:
+            src = stack.enter_context(upload.file.open("rb"))
+            key = dat_key(src, upload.decryption_password)
+            # Normally the upload form already decrypted and parsed the file
+            total = cached_question_count(job.parse_cache_key)
+            if total is not None:
+                records = chain.from_iterable(iter_cached_questions(job.parse_cache_key, key))
+            else:
+                try:
+                    # the GCM tag is checked here, before any row is inserted
+                    excel_file = stack.enter_context(decrypt_dat_stream(src, key=key))
+                except ValueError as e:
+                    raise ImportFailed(str(e))
+                if excel_file.read(2) != b"PK":
+                    raise ImportFailed("Decrypted data is not a valid Excel file.")
+                excel_file.seek(0)
+                _set_status(job, ImportJob.Status.PARSING)
+                # the upload already passed validation; rows rejected now are skipped
+                records = iter_questions_from_excel_data(excel_file, row_errors)
+
+            trades = TradeLookup()
+            for batch in batched(islice(records, resume_from, None), IMPORT_BATCH_SIZE):
+                if job.status != ImportJob.Status.INSERTING:
+                    _set_status(job, ImportJob.Status.INSERTING, rows_total=total or job.rows_total)
+                with transaction.atomic():
+                    created = import_questions_from_dicts(batch, errors=job.errors, trades=trades, upload=upload)
+                    job.rows_imported += len(created)
+                    job.rows_skipped += len(batch) - len(created)
+                    if total is None:
+                        job.rows_total += len(batch)
+                    _save_progress(job)
+
+        _set_status(
+            job, ImportJob.Status.DONE,
+            rows_total=job.rows_total + len(row_errors),
+            rows_skipped=job.rows_skipped + len(row_errors),
+            errors=job.errors + row_errors,
+            finished_at=timezone.now(),
+        )
+        logger.info("Imported %s questions from %s", job.rows_imported, upload.file.name)
+    except JobLost as e:
+        # the batch was rolled back; the new owner carries on
+        logger.warning("%s, stopping", e)
+        return job
+    except ImportFailed as e:
+        logger.error("Import of %s failed: %s", upload.file.name, e)
+        _set_status(job, ImportJob.Status.FAILED, errors=job.errors + [str(e)], finished_at=timezone.now())
+    except Exception as e:
+        logger.exception("Import of %s failed", upload.file.name)
+        _set_status(job, ImportJob.Status.FAILED, errors=job.errors + [f"Unexpected error: {e}"], finished_at=timezone.now())
+    forget_parsed_questions(job.parse_cache_key)
+    return job
+
+
+def run_worker(until_empty=False, poll_interval=2.0):
+    """Process queued jobs; with `until_empty` return once the queue is drained."""
+    worker = worker_name()
+    processed = 0
+    while True:
+        requeue_stale_jobs()
+        job = claim_next_job(worker)
+        if job is None:
+            if until_empty:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
@@ -2,18 +2,25 @@ import os
 import re
 import json
 import ast
+import glob
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from decimal import Decimal
 from typing import Any, Optional, List, Dict
 
+import django
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connections, transaction
 from docx import Document
 from django.utils.module_loading import import_string
 
-from questions.models import Question
-# your reference models (as used in your Question model)
-from reference.models import Trade, Level, Skill, QF, Category
+from questions.answer_keys import compile_answer_key
+from questions.models import Question, text_hash
+from questions.services import decrypt_dat_stream, drop_duplicate_questions, iter_questions_from_excel_data
+# the only reference model on Question
+from reference.models import Trade
 
 # ---------- helper utilities ----------
 def _field_exists(model, fname):
@@ -23,46 +30,130 @@ def _field_exists(model, fname):
     except Exception:
         return False
 
-def find_or_create_ref(model, raw_value, create_missing=False):
-    """Try to resolve a reference model (Trade/Level/etc) from name or pk.
-       If create_missing=True and model has a 'name' field, it will create.
-    """
-    if raw_value is None:
-        return None
-    raw = str(raw_value).strip()
-    if raw == "" or raw.lower() == "nan":
-        return None
-
-    # try pk if integer
-    try:
-        pk = int(raw)
-        obj = model.objects.filter(pk=pk).first()
-        if obj:
-            return obj
-    except Exception:
-        pass
+def _normalize(value):
+    return " ".join(str(value).split()).casefold()
 
-    # try a few likely fields
-    for field in ("name", "title", "label"):
-        if _field_exists(model, field):
-            q = {f"{field}__iexact": raw}
-            obj = model.objects.filter(**q).first()
-            if obj:
-                return obj
+class RefResolver:
+    """Per-run cache of a reference table (Trade), loaded with one query.
 
-    # create if allowed and model supports 'name'
-    if create_missing and _field_exists(model, "name"):
+    Values resolve by pk or, case-insensitively, by name or code. Unknown
+    names are collected when create_missing is set and created together by
+    create_missing_refs() once every row has been read.
+    """
+    LOOKUP_FIELDS = ("name", "code")
+
+    def __init__(self, model, create_missing=False):
+        self.model = model
+        self.create_missing = create_missing
+        self.fields = [f for f in self.LOOKUP_FIELDS if _field_exists(model, f)]
+        self.pks = set()
+        self.by_key = {}
+        for pk, *values in model.objects.order_by("pk").values_list("pk", *self.fields):
+            self.pks.add(pk)
+            for value in values:
+                self.by_key.setdefault(_normalize(value), pk)
+        self.missing = {}  # normalized name -> name as first written
+
+    def resolve(self, raw_value):
+        """Return (pk, None) for a known entry, (None, key) for one to create later, else (None, None)."""
+        if raw_value is None:
+            return None, None
+        raw = str(raw_value).strip()
+        if raw == "" or raw.lower() == "nan":
+            return None, None
+
+        # try pk if integer
         try:
-            return model.objects.create(name=raw)
-        except Exception:
-            return None
-
-    return None
+            pk = int(raw)
+            if pk in self.pks:
+                return pk, None
+        except ValueError:
+            pass
+
+        key = _normalize(raw)
+        if key in self.by_key:
+            return self.by_key[key], None
+        if self.create_missing and "name" in self.fields:
+            self.missing.setdefault(key, raw)
+            return None, key
+        return None, None
+
+    def _new_ref(self, name, codes):
+        fields = {"name": name[:self.model._meta.get_field("name").max_length]}
+        if "code" in self.fields:
+            # code is required and unique; derive one from the name
+            max_length = self.model._meta.get_field("code").max_length
+            base = re.sub(r"[^A-Z0-9]+", "-", name.upper()).strip("-")[:max_length] or "REF"
+            code, n = base, 1
+            while code.casefold() in codes:
+                n += 1
+                code = f"{base[:max_length - len(str(n)) - 1]}-{n}"
+            codes.add(code.casefold())
+            fields["code"] = code
+        return self.model(**fields)
+
+    def create_missing_refs(self):
+        """Bulk-create the collected missing entries; returns {key: pk}."""
+        if not self.missing:
+            return {}
+        codes = set(self.by_key) if "code" in self.fields else set()
+        objs = self.model.objects.bulk_create(
+            [self._new_ref(name, codes) for name in self.missing.values()]
+        )
+        created = {}
+        for key, obj in zip(self.missing, objs):
+            created[key] = obj.pk
+            self.by_key[key] = obj.pk
+            self.pks.add(obj.pk)
+        self.missing = {}
+        return created
+
+def build_question(text, part, marks, options, correct):
+    """Unsaved, validated Question without a trade; raises on a bad answer key or field value."""
+    try:
+        marks = Decimal(str(marks))
+    except Exception:
+        marks = Decimal("1")
+    obj = Question(
+        text=text,
+        part=part,
+        marks=marks,
+        options=options,
+        correct_answer=correct,
+        # raises InvalidAnswerKey, recorded as a row error
+        answer_key=compile_answer_key(part, correct, options),
+    )
+    obj.clean_fields(exclude=["trade", "answer_key", "text_hash"])
+    obj.text_hash = text_hash(text)
+    return obj
+
+def save_questions(rows, trades, skip_existing=False, per_trade=False):
+    """bulk_create (question, raw trade) pairs from a parser, resolving trades and creating missing ones first.
+
+    Returns (created, duplicates); duplicates are only looked for with skip_existing.
+    """
+    pending = []
+    for obj, raw_trade in rows:
+        obj.trade_id, trade_key = trades.resolve(raw_trade)
+        pending.append((obj, trade_key))
+    new_trades = trades.create_missing_refs()
+    for obj, trade_key in pending:
+        if trade_key is not None:
+            obj.trade_id = new_trades.get(trade_key)
+    questions = [obj for obj, _ in pending]
+    duplicates = []
+    if skip_existing:
+        questions, duplicates = drop_duplicate_questions(questions, per_trade)
+    batch_size = getattr(settings, "QUESTION_IMPORT_BATCH_SIZE", 1000)
+    return len(Question.objects.bulk_create(questions, batch_size=batch_size)), len(duplicates)
 
 def parse_json_like(value: Any):
     """Try to parse JSON-like strings, python literal lists/dicts, or comma-separated lists."""
     if value is None:
         return None
+    # an empty cell in a column pandas read as numbers
+    if isinstance(value, float) and math.isnan(value):
+        return None
     # if already a dict/list/boolean/number
     if isinstance(value, (dict, list, bool, int, float)):
         return value
@@ -118,14 +209,18 @@ def normalize_answer(raw):
     return parsed
 
 # ---------- parsers ----------
-def import_from_excel(path, create_missing=False, skip_existing=False, sheet_name=None):
-    df = pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl")
+# A parser reads one file into (rows, skipped, errors), rows being (unsaved
+# Question, raw trade value) pairs. Parsers do not touch the database, so
+# they can run in worker processes; save_questions() writes their rows.
+def parse_excel(path, sheet_name=None):
+    # sheet_name=None would read every sheet into a dict; default to the first
+    df = pd.read_excel(path, sheet_name=sheet_name if sheet_name is not None else 0, engine="openpyxl")
     required_cols = ["text", "part"]
     for c in required_cols:
         if c not in df.columns:
             raise CommandError(f"Excel must contain column '{c}'. Found columns: {list(df.columns)}")
 
-    created = 0
+    rows = []
     skipped = 0
     errors = []
     for i, row in df.iterrows():
@@ -135,52 +230,22 @@ def import_from_excel(path, create_missing=False, skip_existing=False, sheet_nam
                 skipped += 1
                 continue
 
-            if skip_existing and Question.objects.filter(text__iexact=text).exists():
-                skipped += 1
-                continue
-
             part = str(row.get("part", "")).strip()
-            marks = row.get("marks", 1)
-            # convert marks to Decimal
-            try:
-                marks = Decimal(str(marks))
-            except Exception:
-                marks = Decimal("1")
-
             options = normalize_options(row.get("options", None))
             correct = normalize_answer(row.get("correct_answer", None))
-
-            trade = find_or_create_ref(Trade, row.get("trade", None), create_missing)
-            level = find_or_create_ref(Level, row.get("level", None), create_missing)
-            skill = find_or_create_ref(Skill, row.get("skill", None), create_missing)
-            qf = find_or_create_ref(QF, row.get("qf", None), create_missing)
-            category = find_or_create_ref(Category, row.get("category", None), create_missing)
-
-            Question.objects.create(
-                text=text,
-                part=part,
-                marks=marks,
-                options=options,
-                correct_answer=correct,
-                trade=trade,
-                level=level,
-                skill=skill,
-                qf=qf,
-                category=category,
-            )
-            created += 1
+            rows.append((build_question(text, part, row.get("marks", 1), options, correct), row.get("trade", None)))
         except Exception as e:
             errors.append((i, str(e)))
-    return created, skipped, errors
+    return rows, skipped, errors
 
-def import_from_docx(path, create_missing=False, skip_existing=False):
+def parse_docx(path):
     doc = Document(path)
     # collect paragraphs, remove empties
     paras = [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
 
     items = []
     current = {"text": "", "options": None, "correct_answer": None, "part": None, "marks": None,
-               "trade": None, "level": None, "skill": None, "qf": None, "category": None}
+               "trade": None}
 
     def commit_current():
         if current["text"].strip():
@@ -195,10 +260,6 @@ def import_from_docx(path, create_missing=False, skip_existing=False):
         "part": re.compile(r"^part:\s*", re.I),
         "marks": re.compile(r"^marks?:\s*", re.I),
         "trade": re.compile(r"^trade:\s*", re.I),
-        "level": re.compile(r"^level:\s*", re.I),
-        "skill": re.compile(r"^skill:\s*", re.I),
-        "qf": re.compile(r"^qf:\s*", re.I),
-        "category": re.compile(r"^category:\s*", re.I),
     }
 
     for p in paras:
@@ -242,8 +303,8 @@ def import_from_docx(path, create_missing=False, skip_existing=False):
     # commit last
     commit_current()
 
-    # Now create Questions
-    created = 0
+    # Now build Questions
+    rows = []
     skipped = 0
     errors = []
     for idx, it in enumerate(items):
@@ -251,78 +312,127 @@ def import_from_docx(path, create_missing=False, skip_existing=False):
             text = (it.get("text") or "").strip()
             if not text:
                 continue
-            if skip_existing and Question.objects.filter(text__iexact=text).exists():
-                skipped += 1
-                continue
-
             part = (it.get("part") or "A").strip()
-            marks = it.get("marks") or 1
-            try:
-                marks = Decimal(str(marks))
-            except Exception:
-                marks = Decimal("1")
-
             options = normalize_options(it.get("options"))
             correct = normalize_answer(it.get("correct_answer"))
-
-            trade = find_or_create_ref(Trade, it.get("trade"), create_missing)
-            level = find_or_create_ref(Level, it.get("level"), create_missing)
-            skill = find_or_create_ref(Skill, it.get("skill"), create_missing)
-            qf = find_or_create_ref(QF, it.get("qf"), create_missing)
-            category = find_or_create_ref(Category, it.get("category"), create_missing)
-
-            Question.objects.create(
-                text=text,
-                part=part,
-                marks=marks,
-                options=options,
-                correct_answer=correct,
-                trade=trade,
-                level=level,
-                skill=skill,
-                qf=qf,
-                category=category,
-            )
-            created += 1
+            rows.append((build_question(text, part, it.get("marks") or 1, options, correct), it.get("trade")))
         except Exception as e:
             errors.append((idx, str(e)))
-    return created, skipped, errors
+    return rows, skipped, errors
+
+def parse_dat(path, password):
+    """Encrypted upload format (see questions.services), decrypted as a stream."""
+    if not password:
+        raise CommandError(".dat files need --password")
+    rows = []
+    row_errors = []
+    with open(path, "rb") as src, decrypt_dat_stream(src, password) as excel_file:
+        for q in iter_questions_from_excel_data(excel_file, row_errors):
+            rows.append((build_question(q["text"], q["part"], q["marks"], q["options"], q["correct_answer"]), q["trade"]))
+    # "row N: message"
+    errors = [tuple(e.removeprefix("row ").split(": ", 1)) for e in row_errors]
+    return rows, 0, errors
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".docx", ".dat")
+
+def parse_file(path, sheet_name=None, password=None):
+    """Parse one file of any supported type; a failure of the whole file is returned as its only error."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".dat":
+            rows, skipped, errors = parse_dat(path, password)
+        elif ext in (".xlsx", ".xls"):
+            rows, skipped, errors = parse_excel(path, sheet_name=sheet_name)
+        else:
+            rows, skipped, errors = parse_docx(path)
+    except Exception as e:
+        return path, [], 0, [("file", str(e))]
+    return path, rows, skipped, errors
+
+def _init_worker():
+    # spawned workers start without Django; parsers need the models loaded
+    django.setup()
+
+def find_files(pattern):
+    """Supported files named by a file path, a directory, or a glob pattern."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    elif glob.has_magic(pattern):
+        paths = glob.glob(pattern, recursive=True)
+    else:
+        if not os.path.exists(pattern):
+            raise CommandError("File does not exist: " + pattern)
+        if os.path.splitext(pattern)[1].lower() not in SUPPORTED_EXTENSIONS:
+            raise CommandError("Unsupported file type. Use .xlsx, .docx or .dat")
+        return [pattern]
+    return sorted(p for p in paths if os.path.isfile(p) and os.path.splitext(p)[1].lower() in SUPPORTED_EXTENSIONS)
 
 # ---------- management command ----------
 class Command(BaseCommand):
-    help = "Import questions from an Excel (.xlsx) or Word (.docx) file."
+    help = ("Import questions from Excel (.xlsx), Word (.docx) or encrypted (.dat) files. "
+            "Takes a file, a directory or a glob; files are parsed in parallel and written by this process.")
 
     def add_arguments(self, parser):
-        parser.add_argument("file_path", type=str, help="Path to Excel (.xlsx) or Word (.docx) file")
+        parser.add_argument("file_path", type=str, help="File, directory or glob of .xlsx/.docx/.dat files")
         parser.add_argument("--sheet", type=str, default=None, help="Sheet name (for Excel)")
-        parser.add_argument("--create-missing", action="store_true", help="Create missing Trade/Level/Skill/QF/Category by name")
-        parser.add_argument("--skip-existing", action="store_true", help="Skip rows whose question text already exists in DB")
+        parser.add_argument("--password", type=str, default=None, help="Decryption password (for .dat)")
+        parser.add_argument("--create-missing", action="store_true", help="Create missing trades by name")
+        parser.add_argument("--skip-existing", action="store_true", help="Skip rows whose question text already exists in DB (or earlier in the file)")
+        parser.add_argument("--per-trade", action="store_true", help="With --skip-existing, only count the same text in the same trade as existing")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes (1 parses in-process)")
 
     def handle(self, *args, **options):
-        path = options["file_path"]
-        sheet = options.get("sheet")
-        create_missing = options.get("create_missing", False)
-        skip_existing = options.get("skip_existing", False)
-
-        if not os.path.exists(path):
-            raise CommandError("File does not exist: " + path)
-
-        ext = os.path.splitext(path)[1].lower()
-        with transaction.atomic():
-            if ext in (".xlsx", ".xls"):
-                created, skipped, errors = import_from_excel(path, create_missing=create_missing,
-                                                             skip_existing=skip_existing, sheet_name=sheet)
-            elif ext in (".docx",):
-                created, skipped, errors = import_from_docx(path, create_missing=create_missing,
-                                                            skip_existing=skip_existing)
-            else:
-                raise CommandError("Unsupported file type. Use .xlsx or .docx")
-
-        self.stdout.write(self.style.SUCCESS(f"Created: {created}"))
-        self.stdout.write(self.style.WARNING(f"Skipped: {skipped}"))
+        paths = find_files(options["file_path"])
+        if not paths:
+            raise CommandError("No .xlsx, .docx or .dat files found at " + options["file_path"])
+        parse_options = {"sheet_name": options.get("sheet"), "password": options.get("password")}
+        workers = max(1, min(options["workers"], len(paths)))
+        if len(paths) > 1:
+            self.stdout.write(f"Importing {len(paths)} files with {workers} parser process(es)...")
+
+        self.trades = RefResolver(Trade, options["create_missing"])
+        totals = [0, 0, 0]
+        if workers == 1:
+            for path in paths:
+                self._write(parse_file(path, **parse_options), options, totals)
+        else:
+            # parsing fans out; every write happens here, one file at a time
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(parse_file, path, **parse_options) for path in paths]
+                for future in as_completed(futures):
+                    self._write(future.result(), options, totals)
+
+        if len(paths) > 1:
+            created, skipped, errors = totals
+            self.stdout.write(self.style.SUCCESS(
+                f"Total: {created} created, {skipped} skipped, {errors} errors in {len(paths)} files"
+            ))
+
+    def _write(self, parsed, options, totals):
+        path, rows, skipped, errors = parsed
+        created = 0
+        if rows:
+            try:
+                with transaction.atomic():
+                    created, duplicates = save_questions(
+                        rows, self.trades, options["skip_existing"], options["per_trade"]
+                    )
+                skipped += duplicates
+            except Exception as e:
+                errors = errors + [("file", f"not imported: {e}")]
+                # trades created in the rolled back transaction are gone
+                self.trades = RefResolver(Trade, options["create_missing"])
+        totals[0] += created
+        totals[1] += skipped
+        totals[2] += len(errors)
+
+        self.stdout.write(f"{path}:")
+        self.stdout.write(self.style.SUCCESS(f"  Created: {created}"))
+        self.stdout.write(self.style.WARNING(f"  Skipped: {skipped}"))
         if errors:
-            self.stdout.write(self.style.ERROR(f"Errors ({len(errors)}):"))
+            self.stdout.write(self.style.ERROR(f"  Errors ({len(errors)}):"))
             for idx, err in errors[:20]:
-                self.stdout.write(f" - row/item {idx}: {err}")
+                self.stdout.write(f"   - row/item {idx}: {err}")
             if len(errors) > 20:
-                self.stdout.write(f" ... {len(errors)-20} more errors (see logs).")
+                self.stdout.write(f"   ... {len(errors)-20} more errors (see logs).")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from questions.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued question imports (ImportJob). Started automatically after uploads; can also run as a service."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--until-empty", action="store_true", help="Exit once no job is queued")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between queue polls")
+
+    def handle(self, *args, **options):
+        processed = run_worker(until_empty=options["until_empty"], poll_interval=options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} import jobs"))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:46
+
+import questions.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_remove_question_level_remove_question_qf_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='question',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='questionpaper',
+            options={'ordering': ['-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='questionupload',
+            options={'ordering': ['-uploaded_at']},
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answer_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='part',
+            field=models.CharField(choices=[('A', 'Part A - MCQ (Single Choice)'), ('B', 'Part B - MCQ (Multiple Choice)'), ('C', 'Part C - MCQ (Other format)'), ('D', 'Part D - Fill in the blanks'), ('E', 'Part E - Long answer (100-120 words)'), ('F', 'Part F - True/False')], default='A', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='questionupload',
+            name='file',
+            field=models.FileField(upload_to='uploads/questions/', validators=[questions.models.validate_dat_file]),
+        ),
+    ]
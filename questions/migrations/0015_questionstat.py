@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0014_question_answer_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(blank=True, help_text='Share of candidates answering correctly', null=True)),
+                ('discrimination', models.FloatField(blank=True, help_text='Upper 27% minus lower 27% p-value', null=True)),
+                ('point_biserial', models.FloatField(blank=True, help_text='Correlation with the rest of the paper', null=True)),
+                ('distractors', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='questions.questionpaper')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='questions.question')),
+            ],
+            options={
+                'unique_together': {('question', 'paper')},
+            },
+        ),
+    ]
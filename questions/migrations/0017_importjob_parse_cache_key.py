@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0016_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='parse_cache_key',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:21
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def text_hash(text):
+    """Frozen copy of questions.models.text_hash as of this migration."""
+    normalized = " ".join(str(text or "").split()).casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def hash_existing_texts(apps, schema_editor):
+    Question = apps.get_model("questions", "Question")
+    batch = []
+    for q in Question.objects.only("id", "text").iterator(chunk_size=2000):
+        q.text_hash = text_hash(q.text)
+        batch.append(q)
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ["text_hash"])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ["text_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0017_importjob_parse_cache_key'),
+        ('reference', '0005_delete_level_delete_qf_delete_qualification_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='text_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(hash_existing_texts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['text_hash', 'trade'], name='questions_text_hash_trade_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0018_question_text_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='upload',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='questions', to='questions.questionupload'),
+        ),
+    ]
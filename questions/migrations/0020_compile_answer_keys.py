@@ -0,0 +1,200 @@
+"""
+Compile Question.answer_key for every existing question.
+
+The compiler is a frozen copy of questions.answer_keys as of this migration,
+so later changes to the live compiler do not change what it writes; a later
+change to stored keys needs its own migration.
+
+Keys are written with bulk_update, which skips the Question post_save
+regrade hook. Answers already graded against an older key keep their
+scores: after migrating a database with graded attempts run
+`manage.py regrade_questions --all`.
+"""
+import logging
+import re
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 512
+_LETTERS = "ABCDEFGHIJ"
+_TRUE_WORDS = {"true", "t", "yes", "y", "1"}
+_FALSE_WORDS = {"false", "f", "no", "n", "0"}
+_TOKEN = re.compile(r"\d+(?:,\d{2,3})*(?:\.\d+)?(?!\w)|\w+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALES = {"hundred": 100, "thousand": 1000, "lakh": 100000}
+
+
+def _as_list(value, split=False):
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    if split and isinstance(value, str) and any(sep in value for sep in ",|;"):
+        return [v for v in (p.strip() for p in re.split(r"[,|;]", value)) if v]
+    return [value]
+
+
+def _choices_of(options):
+    if isinstance(options, dict):
+        return tuple(str(c) for c in options.get("choices") or ())
+    if isinstance(options, list):
+        return tuple(str(c) for c in options)
+    return ()
+
+
+def _mcq_mask(value, choices):
+    if value is None:
+        return 0
+    lowered = [str(c).strip().lower() for c in choices or ()]
+    whole = isinstance(value, str) and value.strip().lower() in lowered
+    mask = 0
+    for item in _as_list(value, split=not whole):
+        if isinstance(item, bool):
+            continue
+        if isinstance(item, int):
+            index = item - 1
+        else:
+            text = str(item).strip()
+            low = text.lower()
+            if low in lowered:
+                index = lowered.index(low)
+            elif len(text) == 1 and text.upper() in _LETTERS:
+                index = _LETTERS.index(text.upper())
+            elif text.isdigit():
+                index = int(text) - 1
+            else:
+                continue
+        if 0 <= index < (len(lowered) or len(_LETTERS)):
+            mask |= 1 << index
+    return mask
+
+
+def _tf_mask(value):
+    if isinstance(value, list):
+        value = value[0] if len(value) == 1 else None
+    if isinstance(value, bool):
+        return 1 if value else 2
+    if value is None:
+        return 0
+    low = str(value).strip().lower()
+    if low in _TRUE_WORDS:
+        return 1
+    if low in _FALSE_WORDS:
+        return 2
+    return 0
+
+
+def _is_number(token):
+    return bool(_NUMBER.fullmatch(token))
+
+
+def _canonical_number(token):
+    number = token.replace(",", "")
+    if "." in number:
+        number = number.rstrip("0").rstrip(".")
+    return number.lstrip("0") or "0"
+
+
+def _fold_numbers(tokens):
+    out = []
+    value = None
+    current = 0
+    last = None  # kind of the previous number word: "unit", "tens" or "scale"
+    for i, token in enumerate(tokens + [None]):
+        if token in _UNITS or token in _TENS:
+            kind = "unit" if token in _UNITS else "tens"
+            if last == "unit" or (last == "tens" and (kind == "tens" or _UNITS[token] >= 10)):
+                out.append(str(value + current))
+                value, current = None, 0
+            current += _UNITS.get(token) or _TENS.get(token, 0)
+            value = value or 0
+            last = kind
+            continue
+        if token in _SCALES and value is not None:
+            value += max(current, 1) * _SCALES[token]
+            current = 0
+            last = "scale"
+            continue
+        if (
+            token == "and" and value is not None and i + 1 < len(tokens)
+            and (tokens[i + 1] in _UNITS or tokens[i + 1] in _TENS or tokens[i + 1] in _SCALES)
+        ):
+            continue
+        if value is not None:
+            out.append(str(value + current))
+            value, current, last = None, 0, None
+        if token is not None:
+            out.append(token)
+    return out
+
+
+def _token_set(value):
+    tokens = [
+        _canonical_number(t) if _is_number(t.replace(",", "")) else t
+        for t in _TOKEN.findall(str(value).lower())
+    ]
+    tokens = _fold_numbers(tokens)
+    numbers = [t for t in tokens if _is_number(t)]
+    words = sorted({t for t in tokens if not _is_number(t)})
+    return " ".join(numbers + words)
+
+
+def compile_or_blank(part, correct_answer, options):
+    """The answer key questions.answer_keys.compile_or_blank gave when this migration was written."""
+    part = (part or "A").upper()
+    if part == "E" or correct_answer in (None, "", []):
+        return ""
+    if part == "D":
+        key = "|".join(sorted({v for v in (_token_set(v) for v in _as_list(correct_answer)) if v}))
+        return key if len(key) <= MAX_KEY_LENGTH else ""
+    choices = _choices_of(options)
+    if part == "F":
+        mask = _tf_mask(correct_answer) or (_mcq_mask(correct_answer, choices[:2]) if choices else 0)
+    else:
+        mask = _mcq_mask(correct_answer, choices)
+    if not mask or (part in ("A", "F") and mask & (mask - 1)):
+        return ""
+    return str(mask)
+
+
+def compile_answer_keys(apps, schema_editor):
+    Question = apps.get_model("questions", "Question")
+    changed = 0
+    batch = []
+    rows = Question.objects.only("id", "part", "options", "correct_answer", "answer_key")
+    for q in rows.iterator(chunk_size=2000):
+        key = compile_or_blank(q.part, q.correct_answer, q.options)
+        if key != q.answer_key:
+            q.answer_key = key
+            batch.append(q)
+            changed += 1
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ["answer_key"])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ["answer_key"])
+    if changed:
+        logger.warning(
+            "Answer keys of %s questions changed; run `manage.py regrade_questions --all` "
+            "if any were already graded.", changed,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0019_question_upload'),
+    ]
+
+    operations = [
+        migrations.RunPython(compile_answer_keys, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,20 @@
+import hashlib
+
 from django.db import models
 from django.core.exceptions import ValidationError
 from reference.models import Trade
+from .answer_keys import MAX_KEY_LENGTH, InvalidAnswerKey, compile_answer_key, compile_or_blank
 
 def validate_dat_file(value):
     """Validate that only .dat files are uploaded"""
     if not value.name.lower().endswith(".dat"):
         raise ValidationError("Only .dat files are allowed.")
 
+def text_hash(text):
+    """SHA-256 of question text with case and whitespace normalized, for duplicate checks"""
+    normalized = " ".join(str(text or "").split()).casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
 class Question(models.Model):
     class Part(models.TextChoices):
         A = "A", "Part A - MCQ (Single Choice)"
@@ -21,16 +29,46 @@ class Question(models.Model):
     marks = models.DecimalField(max_digits=5, decimal_places=2, default=1)
     options = models.JSONField(blank=True, null=True)
     correct_answer = models.JSONField(blank=True, null=True)
+    # compiled from correct_answer, see questions.answer_keys
+    answer_key = models.CharField(max_length=MAX_KEY_LENGTH, blank=True, default="", db_index=True, editable=False)
+    # see text_hash(); set in save() and by the bulk importers
+    text_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     trade = models.ForeignKey(Trade, on_delete=models.SET_NULL, null=True, blank=True)
+    # the QuestionUpload this question was imported from, set by the import job
+    upload = models.ForeignKey(
+        "QuestionUpload", on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name="questions"
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # duplicate checks by hash, optionally within a trade; can become a
+            # UniqueConstraint once existing duplicates are cleaned up
+            models.Index(fields=["text_hash", "trade"], name="questions_text_hash_trade_idx"),
+        ]
 
     def __str__(self):
         return f"[{self.get_part_display()}] {self.text[:60]}..."
 
+    def clean(self):
+        super().clean()
+        try:
+            compile_answer_key(self.part, self.correct_answer, self.options)
+        except InvalidAnswerKey as e:
+            raise ValidationError({"correct_answer": str(e)})
+
+    def save(self, *args, **kwargs):
+        self.answer_key = compile_or_blank(self.part, self.correct_answer, self.options)
+        self.text_hash = text_hash(self.text)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"part", "options", "correct_answer"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"answer_key"}
+        if update_fields is not None and "text" in update_fields:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"text_hash"}
+        super().save(*args, **kwargs)
+
 class QuestionUpload(models.Model):
     file = models.FileField(upload_to="uploads/questions/", validators=[validate_dat_file])
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -42,6 +80,39 @@ class QuestionUpload(models.Model):
     def __str__(self):
         return f"{self.file.name} ({self.uploaded_at.strftime('%Y-%m-%d %H:%M')})"
 
+class ImportJob(models.Model):
+    """Background import of one QuestionUpload, see questions/jobs.py."""
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        DECRYPTING = "DECRYPTING", "Decrypting"
+        PARSING = "PARSING", "Parsing"
+        INSERTING = "INSERTING", "Inserting"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    upload = models.OneToOneField(QuestionUpload, on_delete=models.CASCADE, related_name="import_job")
+    status = models.CharField(max_length=12, choices=Status.choices, default=Status.QUEUED, db_index=True)
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    worker = models.CharField(max_length=100, blank=True)  # host:pid of the claiming worker
+    parse_cache_key = models.CharField(max_length=100, blank=True)  # questions parsed at upload, see services.parse_dat_file
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import of {self.upload} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
 class QuestionPaper(models.Model):
     title = models.CharField(max_length=150)
     is_common = models.BooleanField(default=False)
@@ -69,4 +140,21 @@ class PaperQuestion(models.Model):
         ordering = ["order", "id"]
 
     def __str__(self):
-        return f"{self.paper.title} - Q{self.order}"
\ No newline at end of file
+        return f"{self.paper.title} - Q{self.order}"
+
+class QuestionStat(models.Model):
+    """Item-analysis statistics of a question across one paper's attempts."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="stats")
+    paper = models.ForeignKey(QuestionPaper, on_delete=models.CASCADE, related_name="question_stats")
+    responses = models.PositiveIntegerField(default=0)  # attempts analysed
+    p_value = models.FloatField(null=True, blank=True, help_text="Share of candidates answering correctly")
+    discrimination = models.FloatField(null=True, blank=True, help_text="Upper 27% minus lower 27% p-value")
+    point_biserial = models.FloatField(null=True, blank=True, help_text="Correlation with the rest of the paper")
+    distractors = models.JSONField(default=dict, blank=True)  # option text -> share choosing it
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("question", "paper")
+
+    def __str__(self):
+        return f"Stats of question {self.question_id} in paper {self.paper_id}"
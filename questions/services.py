@@ -1,11 +1,24 @@
+import logging
+import os
 import pickle
+import re
+from io import BytesIO
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+
+import openpyxl
+from django.conf import settings
+from django.core.cache import caches
 from django.db import transaction
-from .models import Question
+from .models import Question, text_hash
+from .answer_keys import InvalidAnswerKey, compile_answer_key, compile_or_blank
 from reference.models import Trade
 import hashlib
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 
 # Constants matching your converter
@@ -13,6 +26,21 @@ SALT_SIZE = 16
 IV_SIZE = 12
 PBKDF2_ITERATIONS = 100000
 
+# Uploads are decrypted this many bytes at a time; the plaintext stays in
+# memory up to DECRYPT_SPOOL_SIZE and goes to a temporary file beyond that
+DECRYPT_CHUNK_SIZE = 1024 * 1024
+DECRYPT_SPOOL_SIZE = 8 * 1024 * 1024
+
+# Parsed uploads are shared between the upload form and the import worker
+# through this cache (see parse_dat_file). Entries are encrypted with a key
+# derived from the upload's own key and only live until the worker is due;
+# past that the worker decrypts and parses the file itself.
+PARSE_CACHE_ALIAS = "imports"
+PARSE_CACHE_TIMEOUT = 10 * 60
+PARSE_CHUNK_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
 def derive_key(password: str, salt: bytes) -> bytes:
     """Derive AES-256 key using PBKDF2-HMAC-SHA256 (matches Next.js converter)"""
     kdf = PBKDF2HMAC(
@@ -24,184 +52,431 @@ def derive_key(password: str, salt: bytes) -> bytes:
     )
     return kdf.derive(password.encode())
 
-def is_encrypted_dat(file_data: bytes) -> bool:
-    """Check if file has proper structure for encrypted data"""
-    # Should have at least: salt(16) + iv(12) + some ciphertext
-    return len(file_data) >= (SALT_SIZE + IV_SIZE + 16)
+def dat_key(src, password: str) -> bytes:
+    """AES key of a DAT file object: `password` derived with the salt at its head"""
+    src.seek(0)
+    key = derive_key(password, src.read(SALT_SIZE))
+    src.seek(0)
+    return key
+
+def _stream_size(f) -> int:
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
 
-def decrypt_dat_content(encrypted_data: bytes, password: str) -> bytes:
-    """Decrypt DAT file using AES-GCM (matching your Next.js converter)"""
-    if len(encrypted_data) < (SALT_SIZE + IV_SIZE + 16):
+def decrypt_dat_stream(src, password: str = None, key: bytes = None):
+    """
+    Decrypt an encrypted DAT file object chunk by chunk.
+
+    Layout is salt | iv | ciphertext | tag: salt and IV are read from the
+    head and the tag from the tail, and the ciphertext is decrypted
+    DECRYPT_CHUNK_SIZE bytes at a time into a SpooledTemporaryFile (on disk
+    past DECRYPT_SPOOL_SIZE). The tag is verified before the file is
+    returned, rewound, so nothing unauthenticated reaches the parser. Pass
+    `key` if it was already derived from `password`.
+    """
+    size = _stream_size(src)
+    if size < (SALT_SIZE + IV_SIZE + 16):
         raise ValueError("File too short to be valid encrypted data")
     
-    # Extract salt, iv, and ciphertext
-    salt = encrypted_data[:SALT_SIZE]
-    iv = encrypted_data[SALT_SIZE:SALT_SIZE + IV_SIZE]
-    ciphertext_with_tag = encrypted_data[SALT_SIZE + IV_SIZE:]
+    salt = src.read(SALT_SIZE)
+    iv = src.read(IV_SIZE)
+    src.seek(size - 16)
+    auth_tag = src.read(16)
+    
+    if key is None:
+        key = derive_key(password, salt)
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(iv, auth_tag), backend=default_backend()).decryptor()
+    
+    out = SpooledTemporaryFile(max_size=DECRYPT_SPOOL_SIZE)
+    try:
+        src.seek(SALT_SIZE + IV_SIZE)
+        remaining = size - SALT_SIZE - IV_SIZE - 16
+        while remaining:
+            chunk = src.read(min(DECRYPT_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError("File ended before the end of the ciphertext")
+            out.write(decryptor.update(chunk))
+            remaining -= len(chunk)
+        try:
+            out.write(decryptor.finalize())
+        except Exception as e:
+            # InvalidTag carries no message
+            detail = f": {e}" if str(e) else ""
+            raise ValueError(f"Decryption failed - invalid password or corrupted file{detail}")
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+def parse_cache_key(src, key: bytes) -> str:
+    """Cache key of a DAT file's parsed questions: the file's content and the key it decrypts with"""
+    file_hash = hashlib.sha256()
+    src.seek(0)
+    while chunk := src.read(DECRYPT_CHUNK_SIZE):
+        file_hash.update(chunk)
+    src.seek(0)
+    digest = hashlib.sha256(file_hash.digest() + key).hexdigest()
+    return f"questions:dat-parse:{digest}"
+
+def _chunk_key(cache_key, n):
+    return f"{cache_key}:{n}"
+
+def _cache_cipher(key: bytes):
+    # a different key from the one the DAT file and the cache key come from
+    return AESGCM(hashlib.sha256(b"questions:parse-cache:" + key).digest())
+
+def _seal_chunk(cipher, chunk_key, batch) -> bytes:
+    nonce = os.urandom(IV_SIZE)
+    return nonce + cipher.encrypt(nonce, pickle.dumps(batch), chunk_key.encode())
+
+def _open_chunk(cipher, chunk_key, sealed: bytes):
+    return pickle.loads(cipher.decrypt(sealed[:IV_SIZE], sealed[IV_SIZE:], chunk_key.encode()))
+
+def cache_parsed_questions(cache_key, records, key: bytes):
+    """
+    Store parsed question records under `cache_key`, PARSE_CHUNK_SIZE at a time.
+
+    Each chunk is encrypted (AES-GCM) with a key derived from the upload's
+    `key`, so the plaintext questions never reach the cache. The manifest is
+    written last, so a half-written or failed parse is never read back.
+    Returns the number of records stored.
+    """
+    cache = caches[PARSE_CACHE_ALIAS]
+    cipher = _cache_cipher(key)
+    chunks = count = 0
+    try:
+        for batch in batched(records, PARSE_CHUNK_SIZE):
+            chunk_key = _chunk_key(cache_key, chunks)
+            cache.set(chunk_key, _seal_chunk(cipher, chunk_key, batch), PARSE_CACHE_TIMEOUT)
+            chunks += 1
+            count += len(batch)
+    except Exception:
+        cache.delete_many([_chunk_key(cache_key, n) for n in range(chunks)])
+        raise
+    cache.set(cache_key, {"chunks": chunks, "count": count}, PARSE_CACHE_TIMEOUT)
+    return count
+
+def cached_question_count(cache_key):
+    """Number of records cached by parse_dat_file, or None if they are not all cached"""
+    if not cache_key:
+        return None
+    cache = caches[PARSE_CACHE_ALIAS]
+    manifest = cache.get(cache_key)
+    if manifest is None:
+        return None
+    if not all(cache.has_key(_chunk_key(cache_key, n)) for n in range(manifest["chunks"])):
+        return None
+    return manifest["count"]
+
+def iter_cached_questions(cache_key, key: bytes):
+    """Yield the cached record batches of `cache_key` (check cached_question_count first)"""
+    cache = caches[PARSE_CACHE_ALIAS]
+    cipher = _cache_cipher(key)
+    for n in range(cache.get(cache_key)["chunks"]):
+        chunk_key = _chunk_key(cache_key, n)
+        sealed = cache.get(chunk_key)
+        if sealed is None:
+            raise LookupError(f"Parsed questions chunk {n} expired from the cache")
+        try:
+            yield _open_chunk(cipher, chunk_key, sealed)
+        except InvalidTag:
+            raise LookupError(f"Parsed questions chunk {n} cannot be decrypted")
+
+def forget_parsed_questions(cache_key):
+    if not cache_key:
+        return
+    cache = caches[PARSE_CACHE_ALIAS]
+    manifest = cache.get(cache_key)
+    if manifest:
+        cache.delete_many([_chunk_key(cache_key, n) for n in range(manifest["chunks"])])
+    cache.delete(cache_key)
+
+def parse_dat_file(src, password: str):
+    """
+    Decrypt and parse an uploaded DAT file object, caching the parsed questions.
+
+    Returns (cache_key, question_count). The upload form validates with this
+    and the import job reads the batches back with iter_cached_questions, so
+    the Excel file is parsed once per upload. The file is
+    decrypted and parsed as a stream and rows are streamed into the cache,
+    so memory does not grow with the size of the upload.
+    """
+    if _stream_size(src) < (SALT_SIZE + IV_SIZE + 16):
+        raise ValueError("File does not appear to be encrypted. Expected encrypted DAT file.")
+    key = dat_key(src, password)
+    cache_key = parse_cache_key(src, key)
+    count = cached_question_count(cache_key)
+    if count is None:
+        with decrypt_dat_stream(src, key=key) as excel_file:
+            if not excel_file.read(2) == b'PK':
+                raise ValueError("Decrypted data is not a valid Excel file format.")
+            excel_file.seek(0)
+            count = cache_parsed_questions(cache_key, iter_validated_questions(excel_file), key)
+    src.seek(0)
+    return cache_key, count
+
+def batched(iterable, size):
+    """Lists of up to `size` items from `iterable`"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def convert_to_float(value):
+    """Convert various formats to float"""
+    if value is None:
+        return 1.0
     
-    # Split auth tag (last 16 bytes) from ciphertext
-    if len(ciphertext_with_tag) < 16:
-        raise ValueError("Invalid ciphertext length")
+    # If already a number
+    if isinstance(value, (int, float)):
+        return float(value)
     
-    auth_tag = ciphertext_with_tag[-16:]
-    ciphertext = ciphertext_with_tag[:-16]
+    # Convert string representations
+    value_str = str(value).strip().lower()
     
-    # Derive key
-    key = derive_key(password, salt)
+    # Handle word numbers
+    word_to_num = {
+        'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+        'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
+        'half': 0.5, 'quarter': 0.25
+    }
     
-    # Decrypt using AES-GCM
-    cipher = Cipher(algorithms.AES(key), modes.GCM(iv, auth_tag), backend=default_backend())
-    decryptor = cipher.decryptor()
+    if value_str in word_to_num:
+        return float(word_to_num[value_str])
     
+    # Try direct conversion
     try:
-        decrypted_data = decryptor.update(ciphertext) + decryptor.finalize()
-        return decrypted_data
-    except Exception as e:
-        raise ValueError(f"Decryption failed - invalid password or corrupted file: {str(e)}")
+        return float(value_str)
+    except ValueError:
+        # Extract numbers from string (e.g., "6 marks" -> 6)
+        numbers = re.findall(r'\d+\.?\d*', value_str)
+        if numbers:
+            return float(numbers[0])
+        return 1.0  # Default fallback
+
+def question_from_row(row):
+    """
+    Question record of one sheet row, or None for a blank row.
 
-def load_questions_from_excel_data(excel_data: bytes):
-    """Load questions from decrypted Excel data"""
-    import openpyxl
-    from io import BytesIO
+    Raises InvalidAnswerKey if the row's answer does not fit its part.
+    """
+    if not row or len(row) < 2:  # Need at least part and question_text
+        return None
     
-    def convert_to_float(value):
-        """Convert various formats to float"""
-        if value is None:
-            return 1.0
-        
-        # If already a number
-        if isinstance(value, (int, float)):
-            return float(value)
-        
-        # Convert string representations
-        value_str = str(value).strip().lower()
-        
-        # Handle word numbers
-        word_to_num = {
-            'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-            'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
-            'half': 0.5, 'quarter': 0.25
-        }
+    # Your Excel structure: part | question_text | opt_a | opt_b | opt_c | opt_d | Answers | Max. Marks
+    part = str(row[0] or 'A').strip().upper()
+    question_text = str(row[1] or '').strip()
+    
+    # Skip if no question text
+    if not question_text:
+        return None
+    
+    # Get marks from column H (index 7)
+    marks = convert_to_float(row[7] if len(row) > 7 else 1)
+    
+    # Validate part is valid
+    if part not in ['A', 'B', 'C', 'D', 'E', 'F']:
+        part = 'A'
+    
+    question_data = {
+        'text': question_text,
+        'part': part,
+        'marks': marks,
+        'options': None,
+        'correct_answer': None,
+        'trade': None  # Not present in your Excel
+    }
+    
+    # Build options for MCQ questions (A, B, C)
+    if part in ['A', 'B', 'C'] and len(row) > 5:
+        choices = []
+        # Get opt_a, opt_b, opt_c, opt_d (columns C, D, E, F - indices 2, 3, 4, 5)
+        for i in range(2, 6):  # indices 2, 3, 4, 5
+            if len(row) > i and row[i] and str(row[i]).strip():
+                choices.append(str(row[i]).strip())
         
-        if value_str in word_to_num:
-            return float(word_to_num[value_str])
+        if choices:
+            question_data['options'] = {'choices': choices}
+    
+    # Handle True/False questions
+    elif part == 'F' and len(row) > 5:
+        # For True/False, use TRUE/FALSE from the options
+        choices = []
+        for i in range(2, 4):  # Just first two options for T/F
+            if len(row) > i and row[i] and str(row[i]).strip():
+                choices.append(str(row[i]).strip())
         
-        # Try direct conversion
-        try:
-            return float(value_str)
-        except ValueError:
-            # Extract numbers from string (e.g., "6 marks" -> 6)
-            import re
-            numbers = re.findall(r'\d+\.?\d*', value_str)
-            if numbers:
-                return float(numbers[0])
-            return 1.0  # Default fallback
+        if not choices:
+            choices = ['TRUE', 'FALSE']  # Default T/F options
+        question_data['options'] = {'choices': choices}
     
+    # Get correct answer from column G (index 6)
+    if len(row) > 6 and row[6]:
+        answer = str(row[6]).strip()
+        if answer:
+            question_data['correct_answer'] = answer
+    
+    # Compile the canonical key
+    question_data['answer_key'] = compile_answer_key(
+        part, question_data['correct_answer'], question_data['options']
+    )
+    return question_data
+
+def iter_questions_from_excel_data(excel_data, row_errors: list):
+    """
+    Yield question records from decrypted Excel data (bytes or a file
+    object) as the sheet is read.
+
+    The workbook is opened read-only, so rows are never all in memory. Rows
+    that cannot be imported are skipped and described in `row_errors`.
+    """
+    try:
+        source = BytesIO(excel_data) if isinstance(excel_data, (bytes, bytearray)) else excel_data
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Error parsing Excel data: {str(e)}")
     try:
-        # Load Excel workbook from bytes
-        workbook = openpyxl.load_workbook(BytesIO(excel_data))
-        sheet = workbook.active
-        
-        questions = []
-        
         # Skip header row, process data rows
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-            if not row or len(row) < 2:  # Need at least part and question_text
-                continue
-            
+        for row_num, row in enumerate(workbook.active.iter_rows(min_row=2, values_only=True), start=2):
             try:
-                # Your Excel structure: part | question_text | opt_a | opt_b | opt_c | opt_d | Answers | Max. Marks
-                part = str(row[0] or 'A').strip().upper()
-                question_text = str(row[1] or '').strip()
-                
-                # Skip if no question text
-                if not question_text:
-                    continue
-                
-                # Get marks from column H (index 7)
-                marks = convert_to_float(row[7] if len(row) > 7 else 1)
-                
-                # Validate part is valid
-                if part not in ['A', 'B', 'C', 'D', 'E', 'F']:
-                    part = 'A'
-                
-                question_data = {
-                    'text': question_text,
-                    'part': part,
-                    'marks': marks,
-                    'options': None,
-                    'correct_answer': None,
-                    'trade': None  # Not present in your Excel
-                }
-                
-                # Build options for MCQ questions (A, B, C)
-                if part in ['A', 'B', 'C'] and len(row) > 5:
-                    choices = []
-                    # Get opt_a, opt_b, opt_c, opt_d (columns C, D, E, F - indices 2, 3, 4, 5)
-                    for i in range(2, 6):  # indices 2, 3, 4, 5
-                        if len(row) > i and row[i] and str(row[i]).strip():
-                            choices.append(str(row[i]).strip())
-                    
-                    if choices:
-                        question_data['options'] = {'choices': choices}
-                
-                # Handle True/False questions
-                elif part == 'F' and len(row) > 5:
-                    # For True/False, use TRUE/FALSE from the options
-                    choices = []
-                    for i in range(2, 4):  # Just first two options for T/F
-                        if len(row) > i and row[i] and str(row[i]).strip():
-                            choices.append(str(row[i]).strip())
-                    
-                    if not choices:
-                        choices = ['TRUE', 'FALSE']  # Default T/F options
-                    question_data['options'] = {'choices': choices}
-                
-                # Get correct answer from column G (index 6)
-                if len(row) > 6 and row[6]:
-                    answer = str(row[6]).strip()
-                    if answer:
-                        question_data['correct_answer'] = answer
-                
-                # Add the question
-                questions.append(question_data)
-                print(f"Processed question {row_num}: {question_text[:50]}...")
-                    
+                question_data = question_from_row(row)
+            except InvalidAnswerKey as e:
+                row_errors.append(f"row {row_num}: {e}")
+                continue
             except Exception as e:
-                print(f"Error processing row {row_num}: {e}")
+                logger.warning("Error processing row %s: %s", row_num, e)
                 continue
-        
-        if not questions:
-            raise ValueError("No valid questions found in Excel file")
-        
-        print(f"Successfully parsed {len(questions)} questions from Excel")
-        return questions
-        
-    except Exception as e:
-        raise ValueError(f"Error parsing Excel data: {str(e)}")
+            if question_data is not None:
+                logger.debug("Processed question %s: %s", row_num, question_data['text'][:50])
+                yield question_data
+    finally:
+        workbook.close()
+
+def iter_validated_questions(excel_data):
+    """
+    Like iter_questions_from_excel_data, but a malformed answer key anywhere
+    in the sheet rejects the upload: ValueError is raised once it is read.
+    """
+    key_errors = []
+    count = 0
+    for question_data in iter_questions_from_excel_data(excel_data, key_errors):
+        count += 1
+        yield question_data
+    
+    if key_errors:
+        more = f" (and {len(key_errors) - 5} more)" if len(key_errors) > 5 else ""
+        raise ValueError("Invalid answer keys: " + "; ".join(key_errors[:5]) + more)
+    
+    if not count:
+        raise ValueError("No valid questions found in Excel file")
+    
+    logger.info("Parsed %s questions from Excel", count)
+
+class TradeLookup:
+    """
+    Resolve trade names from the uploaded sheets to Trade ids with one query.
+
+    Matching is case-insensitive: an exact name wins, otherwise the first
+    trade (by id) whose name contains the given one, as `name__icontains`
+    did. Results are remembered, so each distinct name is matched once.
+    """
+
+    def __init__(self):
+        self.trades = [(pk, name.casefold()) for pk, name in Trade.objects.order_by("pk").values_list("pk", "name")]
+        self._ids = {name: pk for pk, name in reversed(self.trades)}
+
+    def __call__(self, name):
+        if not name:
+            return None
+        key = str(name).casefold()
+        if key not in self._ids:
+            self._ids[key] = next((pk for pk, trade in self.trades if key in trade), None)
+        return self._ids[key]
+
+DEDUPE_BATCH = 900
+
+def existing_question_keys(hashes, per_trade=False):
+    """
+    Text hashes of stored questions among `hashes`, as (text_hash, trade_id)
+    pairs if `per_trade`. One indexed IN query per DEDUPE_BATCH hashes.
+    """
+    hashes = list(set(hashes))
+    found = set()
+    for i in range(0, len(hashes), DEDUPE_BATCH):
+        rows = Question.objects.filter(text_hash__in=hashes[i:i + DEDUPE_BATCH])
+        if per_trade:
+            found.update(rows.values_list("text_hash", "trade_id"))
+        else:
+            found.update(rows.values_list("text_hash", flat=True))
+    return found
+
+def drop_duplicate_questions(questions, per_trade=False):
+    """
+    Split unsaved Questions into (new, duplicates): a question is a duplicate
+    if its text is already stored, or repeated earlier in `questions`, in any
+    trade or, with `per_trade`, in the same trade.
+    """
+    def key(obj):
+        return (obj.text_hash, obj.trade_id) if per_trade else obj.text_hash
+
+    seen = existing_question_keys([obj.text_hash for obj in questions], per_trade)
+    new, duplicates = [], []
+    for obj in questions:
+        k = key(obj)
+        if k in seen:
+            duplicates.append(obj)
+        else:
+            seen.add(k)
+            new.append(obj)
+    return new, duplicates
+
+def question_from_dict(q, trades):
+    """Unsaved, validated Question for a record; raises ValidationError or KeyError"""
+    obj = Question(
+        text=q["text"],
+        part=q.get("part", "A"),
+        marks=q.get("marks", 1),
+        options=q.get("options"),
+        correct_answer=q.get("correct_answer"),
+        trade_id=trades(q.get("trade")),
+    )
+    obj.clean_fields(exclude=["trade", "answer_key", "text_hash"])
+    # bulk_create skips Question.save, which normally sets these
+    obj.answer_key = q.get("answer_key") or compile_or_blank(obj.part, obj.correct_answer, obj.options)
+    obj.text_hash = text_hash(obj.text)
+    return obj
 
 @transaction.atomic
-def import_questions_from_dicts(records):
-    """Import questions from list of dictionaries"""
-    created = []
+def import_questions_from_dicts(records, errors=None, batch_size=None, trades=None, skip_existing=False, per_trade=False,
+                                upload=None):
+    """
+    Import questions from list of dictionaries; failed rows are noted in `errors` if given.
+
+    Rows are validated up front and inserted with bulk_create, `batch_size`
+    (QUESTION_IMPORT_BATCH_SIZE) per INSERT. Pass a TradeLookup as `trades`
+    to share it between calls. With `skip_existing`, questions whose text is
+    already stored are skipped (see drop_duplicate_questions). The questions
+    are recorded as coming from `upload`, if given.
+    """
+    trades = trades or TradeLookup()
+    questions = []
     for q in records:
         try:
-            # Find trade if specified
-            trade = None
-            if q.get("trade"):
-                trade = Trade.objects.filter(name__icontains=q["trade"]).first()
-            
-            obj = Question.objects.create(
-                text=q["text"],
-                part=q.get("part", "A"),
-                marks=q.get("marks", 1),
-                options=q.get("options"),
-                correct_answer=q.get("correct_answer"),
-                trade=trade,
-            )
-            created.append(obj)
+            obj = question_from_dict(q, trades)
+            obj.upload = upload
+            questions.append(obj)
         except Exception as e:
-            print(f"Error creating question: {e}")
+            logger.warning("Error creating question: %s", e)
+            if errors is not None:
+                errors.append(f"{str(q.get('text', ''))[:60]}: {e}")
             continue
     
-    return created
\ No newline at end of file
+    if skip_existing:
+        questions, duplicates = drop_duplicate_questions(questions, per_trade)
+        if errors is not None:
+            errors.extend(f"{obj.text[:60]}: already exists" for obj in duplicates)
+    
+    batch_size = batch_size or getattr(settings, "QUESTION_IMPORT_BATCH_SIZE", 1000)
+    return Question.objects.bulk_create(questions, batch_size=batch_size)
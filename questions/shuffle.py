@@ -0,0 +1,87 @@
+"""
+Deterministic per-candidate shuffling of a compiled paper.
+
+Nothing about a shuffle is stored: the question order and the order of each
+MCQ's choices are recomputed from the attempt's integer seed in O(n) whenever
+they are needed, and inverted the same way when answers come back. The shared
+PaperSnapshot is never modified, so one cached copy still serves every
+candidate.
+"""
+import random
+from dataclasses import replace
+
+MCQ_PARTS = ("A", "B", "C")
+
+
+def permutation(n, seed, salt=0):
+    """Fisher-Yates permutation of range(n) derived from (seed, salt)."""
+    order = list(range(n))
+    rng = random.Random((int(seed) << 64) ^ int(salt))
+    for i in range(n - 1, 0, -1):
+        j = rng.randrange(i + 1)
+        order[i], order[j] = order[j], order[i]
+    return order
+
+
+def choice_permutation(question, seed):
+    """Shown position -> canonical choice index for one question."""
+    return permutation(len(question.choices), seed, salt=question.id)
+
+
+def shuffle_paper(snapshot, seed):
+    """
+    Return the candidate's view of a paper: questions and MCQ choices reordered.
+
+    With no seed the snapshot's own order is returned unchanged.
+    """
+    if snapshot is None or seed is None:
+        return snapshot.questions if snapshot else ()
+    shown = []
+    for index in permutation(len(snapshot.questions), seed):
+        question = snapshot.questions[index]
+        if question.part in MCQ_PARTS and question.choices:
+            perm = choice_permutation(question, seed)
+            question = replace(question, choices=tuple(question.choices[i] for i in perm))
+        shown.append(question)
+    return shown
+
+
+def canonical_answers(snapshot, seed, answers):
+    """
+    Map submitted MCQ values (shown choice positions) back to the canonical
+    choice text before they are stored. Other answers pass through unchanged;
+    an out-of-range position is dropped.
+    """
+    if snapshot is None:
+        return answers
+    by_id = {q.id: q for q in snapshot.questions}
+    result = {}
+    for qid, value in answers.items():
+        question = by_id.get(qid)
+        if question is None or question.part not in MCQ_PARTS or not question.choices:
+            result[qid] = value
+            continue
+        try:
+            shown = int(value)
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= shown < len(question.choices):
+            continue
+        perm = choice_permutation(question, seed) if seed is not None else range(len(question.choices))
+        result[qid] = question.choices[perm[shown]]
+    return result
+
+
+def shown_answers(questions, answers):
+    """Turn stored canonical MCQ answers into shown positions for the page."""
+    result = {}
+    for question in questions:
+        if question.id not in answers:
+            continue
+        value = answers[question.id]
+        if question.part in MCQ_PARTS and question.choices:
+            if value not in question.choices:
+                continue
+            value = str(question.choices.index(value))
+        result[question.id] = value
+    return result
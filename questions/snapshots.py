@@ -0,0 +1,189 @@
+"""
+Precompiled, immutable snapshots of question papers.
+
+A snapshot holds everything the exam page needs for one QuestionPaper (its
+ordered PaperQuestion rows, question text, marks and options) and is keyed by
+a SHA-256 of that content. Snapshots are kept in a small in-process LRU and in
+the Django cache, so rendering the exam page never touches the question tables
+once a paper has been compiled.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.core.cache import cache
+
+from .models import PaperQuestion, QuestionPaper
+
+# Pointers (paper id -> content hash) expire so that workers whose local cache
+# missed an invalidation still pick up edits within a bounded time.
+POINTER_TTL = 300
+SNAPSHOT_TTL = 60 * 60 * 24
+LOCAL_CACHE_SIZE = 64
+
+_POINTER_KEY = "questions:paper_snapshot:{}"
+_SNAPSHOT_KEY = "questions:paper_snapshot:h:{}"
+_TRADE_PAPERS_KEY = "questions:trade_papers:{}"
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class QuestionSnapshot:
+    id: int
+    order: int
+    part: str
+    text: str
+    marks: str
+    options: Optional[dict]
+    choices: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class PaperSnapshot:
+    id: int
+    title: str
+    is_common: bool
+    duration_seconds: int
+    questions: Tuple[QuestionSnapshot, ...]
+    content_hash: str
+
+    @property
+    def question_ids(self):
+        return frozenset(q.id for q in self.questions)
+
+
+def _content_hash(payload) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compile_paper(paper: QuestionPaper) -> PaperSnapshot:
+    """Build the snapshot for a paper with a single query over its questions."""
+    rows = (
+        PaperQuestion.objects.filter(paper=paper)
+        .select_related("question")
+        .order_by("order", "id")
+    )
+    questions = []
+    for pq in rows:
+        q = pq.question
+        options = q.options if isinstance(q.options, dict) else None
+        choices = tuple(str(c) for c in (options or {}).get("choices") or ())
+        questions.append(QuestionSnapshot(
+            id=q.id,
+            order=pq.order,
+            part=q.part,
+            text=q.text,
+            marks=str(q.marks),
+            options=options,
+            choices=choices,
+        ))
+
+    duration_seconds = int(paper.duration.total_seconds()) if paper.duration else 0
+    payload = {
+        "id": paper.id,
+        "title": paper.title,
+        "is_common": paper.is_common,
+        "duration": duration_seconds,
+        "questions": [
+            [q.id, q.order, q.part, q.text, q.marks, q.options] for q in questions
+        ],
+    }
+    return PaperSnapshot(
+        id=paper.id,
+        title=paper.title,
+        is_common=paper.is_common,
+        duration_seconds=duration_seconds,
+        questions=tuple(questions),
+        content_hash=_content_hash(payload),
+    )
+
+
+def _remember(snapshot: PaperSnapshot):
+    with _local_lock:
+        _local[snapshot.content_hash] = snapshot
+        _local.move_to_end(snapshot.content_hash)
+        while len(_local) > LOCAL_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def _recall(content_hash: str) -> Optional[PaperSnapshot]:
+    with _local_lock:
+        snapshot = _local.get(content_hash)
+        if snapshot is not None:
+            _local.move_to_end(content_hash)
+        return snapshot
+
+
+def get_paper_snapshot(paper_id) -> Optional[PaperSnapshot]:
+    """Return the current snapshot for a paper, compiling it on a cache miss."""
+    if paper_id is None:
+        return None
+
+    content_hash = cache.get(_POINTER_KEY.format(paper_id))
+    if content_hash:
+        snapshot = _recall(content_hash)
+        if snapshot is None:
+            snapshot = cache.get(_SNAPSHOT_KEY.format(content_hash))
+            if snapshot is not None:
+                _remember(snapshot)
+        if snapshot is not None:
+            return snapshot
+
+    paper = QuestionPaper.objects.filter(pk=paper_id).first()
+    if paper is None:
+        return None
+    snapshot = compile_paper(paper)
+    # Identical content compiles to the same hash, so an existing local copy
+    # is reused and the cache only ever holds one object per version.
+    snapshot = _recall(snapshot.content_hash) or snapshot
+    _remember(snapshot)
+    cache.set(_SNAPSHOT_KEY.format(snapshot.content_hash), snapshot, SNAPSHOT_TTL)
+    cache.set(_POINTER_KEY.format(paper_id), snapshot.content_hash, POINTER_TTL)
+    return snapshot
+
+
+def invalidate_paper_snapshot(paper_id):
+    """Drop the pointer so the next request recompiles the paper."""
+    cache.delete(_POINTER_KEY.format(paper_id))
+
+
+_MISSING_TRADE = "missing"
+
+
+def get_trade_paper_ids(trade_name):
+    """
+    Resolve (primary_paper_id, common_paper_id) for a candidate's trade name.
+
+    Returns None when the trade name does not exist. A candidate without a
+    trade gets the papers that have no trade, as before.
+    """
+    key = _TRADE_PAPERS_KEY.format(hashlib.md5((trade_name or "").encode("utf-8")).hexdigest())
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached == _MISSING_TRADE else cached
+
+    from reference.models import Trade
+
+    trade = None
+    if trade_name:
+        trade = Trade.objects.filter(name=trade_name).first()
+        if trade is None:
+            cache.set(key, _MISSING_TRADE, POINTER_TTL)
+            return None
+
+    primary = QuestionPaper.objects.filter(trade=trade, is_common=False).values_list("id", flat=True).first()
+    common = QuestionPaper.objects.filter(trade=trade, is_common=True).values_list("id", flat=True).first()
+    ids = (primary, common)
+    cache.set(key, ids, POINTER_TTL)
+    return ids
+
+
+def invalidate_trade_papers(trade_name=None):
+    key = _TRADE_PAPERS_KEY.format(hashlib.md5((trade_name or "").encode("utf-8")).hexdigest())
+    cache.delete(key)
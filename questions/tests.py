@@ -1,3 +1,386 @@
-from django.test import TestCase
+import io
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from reference.models import Trade
+
+from . import jobs, services, snapshots
+from .answer_keys import MAX_KEY_LENGTH, InvalidAnswerKey, compile_answer_key, mcq_mask
+from .models import ImportJob, PaperQuestion, Question, QuestionPaper, QuestionUpload
+from .services import (
+    PARSE_CACHE_ALIAS, TradeLookup, cache_parsed_questions, cached_question_count, dat_key, derive_key,
+    forget_parsed_questions, import_questions_from_dicts, iter_cached_questions, parse_cache_key, parse_dat_file,
+)
+
+
+class AnswerKeyTests(SimpleTestCase):
+    def test_option_text_with_commas_matches_whole(self):
+        options = {"choices": ["Rome", "Paris, France", "Delhi"]}
+        self.assertEqual(compile_answer_key("A", "Paris, France", options), "2")
+        self.assertEqual(mcq_mask("Paris, France", options["choices"]), 2)
+
+    def test_letter_lists_are_still_split(self):
+        self.assertEqual(compile_answer_key("B", "A, C", {"choices": ["w", "x", "y"]}), "5")
+
+    def test_fill_blank_string_is_one_variant(self):
+        self.assertNotIn("|", compile_answer_key("D", "1,000"))
+        self.assertEqual(compile_answer_key("D", ["Delhi", "New Delhi"]), "delhi|delhi new")
+
+    def test_fill_blank_numbers_stay_whole_and_in_order(self):
+        self.assertEqual(compile_answer_key("D", "3.5"), "3.5")
+        self.assertEqual(compile_answer_key("D", "1,000 rupees"), "1000 rupees")
+        self.assertEqual(compile_answer_key("D", "5 to 3"), "5 3 to")
+
+    def test_fill_blank_number_words_are_folded_one_number_at_a_time(self):
+        self.assertEqual(compile_answer_key("D", "nine one one"), "9 1 1")
+        self.assertEqual(compile_answer_key("D", "one two"), "1 2")
+        self.assertEqual(compile_answer_key("D", "one hundred and twenty five"), "125")
+
+    def test_fill_blank_key_longer_than_column_is_rejected(self):
+        variants = [f"variant {i} " + "word" * 20 for i in range(10)]
+        self.assertGreater(sum(map(len, variants)), MAX_KEY_LENGTH)
+        with self.assertRaises(InvalidAnswerKey):
+            compile_answer_key("D", variants)
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    PARSE_CACHE_ALIAS: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "imports-test"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ParseCacheTests(SimpleTestCase):
+    def test_cached_questions_are_encrypted(self):
+        key, records = os.urandom(32), [{"text": "What is the secret answer?"}]
+        cache_parsed_questions("test-parse", records, key)
+
+        stored = caches[PARSE_CACHE_ALIAS].get("test-parse:0")
+        self.assertNotIn(b"secret answer", stored)
+        self.assertNotIn(b"secret answer", pickle.dumps(stored))
+        self.assertEqual(list(iter_cached_questions("test-parse", key)), [records])
+        with self.assertRaises(LookupError):
+            list(iter_cached_questions("test-parse", os.urandom(32)))
+
+        forget_parsed_questions("test-parse")
+        self.assertIsNone(cached_question_count("test-parse"))
+
+
+class ImportFromDictsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store_clerk = Trade.objects.create(name="Store Clerk", code="SCL")
+        cls.clerk = Trade.objects.create(name="Clerk", code="CLK")
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        records = [
+            {"text": "Exact trade", "part": "A", "options": {"choices": ["w", "x"]}, "correct_answer": "x",
+             "trade": "CLERK"},
+            {"text": "Partial trade", "part": "F", "correct_answer": "true", "trade": "store"},
+            {"text": "Unknown trade", "part": "E", "trade": "Cook"},
+            {"text": "Bad part", "part": "Z"},
+            {"text": "Bad marks", "marks": "many"},
+            {"part": "A"},
+        ]
+        errors = []
+
+        # the trade list and one INSERT, inside the import's savepoint
+        with self.assertNumQueries(4), self.assertLogs("questions.services", "WARNING"):
+            created = import_questions_from_dicts(records, errors=errors, trades=TradeLookup())
+
+        self.assertEqual([q.text for q in created], ["Exact trade", "Partial trade", "Unknown trade"])
+        self.assertEqual([q.trade_id for q in created], [self.clerk.pk, self.store_clerk.pk, None])
+        self.assertEqual(created[0].answer_key, "2")
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith("Bad part: "))
+        self.assertTrue(errors[1].startswith("Bad marks: "))
+        self.assertTrue(errors[2].startswith(": "))
+        self.assertEqual(Question.objects.count(), 3)
+
+    def test_repeated_texts_are_skipped_when_asked(self):
+        import_questions_from_dicts([{"text": "Seen before"}])
+        errors = []
+
+        created = import_questions_from_dicts(
+            [{"text": "Seen before"}, {"text": "New"}, {"text": "New"}], errors=errors, skip_existing=True,
+        )
+
+        self.assertEqual([q.text for q in created], ["New"])
+        self.assertEqual(errors, ["Seen before: already exists", "New: already exists"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaperSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.paper = QuestionPaper.objects.create(title="P1", duration=timedelta(hours=1))
+        self.questions = [
+            Question.objects.create(text=f"Q{i}", part="A", options={"choices": ["w", "x"]}, correct_answer="x")
+            for i in range(3)
+        ]
+        for i, question in enumerate(reversed(self.questions)):
+            PaperQuestion.objects.create(paper=self.paper, question=question, order=i)
+
+    def test_snapshot_is_compiled_once_and_shared(self):
+        snapshot = snapshots.get_paper_snapshot(self.paper.pk)
+
+        self.assertEqual([q.text for q in snapshot.questions], ["Q2", "Q1", "Q0"])
+        self.assertEqual((snapshot.duration_seconds, snapshot.questions[0].choices), (3600, ("w", "x")))
+        with self.assertNumQueries(0):
+            self.assertIs(snapshots.get_paper_snapshot(self.paper.pk), snapshot)
+
+    def test_edits_compile_a_new_version(self):
+        before = snapshots.get_paper_snapshot(self.paper.pk)
+
+        self.questions[0].text = "Q0 reworded"
+        self.questions[0].save()
+        edited = snapshots.get_paper_snapshot(self.paper.pk)
+        self.assertNotEqual(edited.content_hash, before.content_hash)
+        self.assertEqual(edited.questions[-1].text, "Q0 reworded")
+
+        PaperQuestion.objects.filter(paper=self.paper, question=self.questions[1]).delete()
+        self.assertEqual(len(snapshots.get_paper_snapshot(self.paper.pk).questions), 2)
+
+    def test_expired_pointer_with_unchanged_content_reuses_the_snapshot(self):
+        snapshot = snapshots.get_paper_snapshot(self.paper.pk)
+
+        snapshots.invalidate_paper_snapshot(self.paper.pk)
+
+        self.assertIs(snapshots.get_paper_snapshot(self.paper.pk), snapshot)
+
+
+def make_dat(rows, password="pw"):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["part", "question_text", "opt_a", "opt_b", "opt_c", "opt_d", "Answers", "Max. Marks"])
+    for i in range(rows):
+        sheet.append(["A", f"Question {i}", "w", "x", "y", "z", "x", 1])
+    excel = io.BytesIO()
+    workbook.save(excel)
+    salt, iv = os.urandom(16), os.urandom(12)
+    return salt + iv + AESGCM(derive_key(password, salt)).encrypt(iv, excel.getvalue(), None)
+
+
+def use_temp_media(test):
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    override = override_settings(MEDIA_ROOT=media)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+def tampered(data):
+    """`data` with the last byte of its GCM tag flipped"""
+    return data[:-1] + bytes([data[-1] ^ 1])
+
+
+def make_upload(rows, password="pw", name="bank.dat", content=None):
+    upload = QuestionUpload(decryption_password=password)
+    upload.file.save(name, ContentFile(content or make_dat(rows)), save=False)
+    upload.save()
+    return upload
+
+
+class ImportJobQueueTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+
+    def test_new_upload_queues_one_job_and_starts_a_worker_after_commit(self):
+        with mock.patch.object(jobs, "spawn_worker") as spawn_worker:
+            with self.captureOnCommitCallbacks(execute=True):
+                upload = make_upload(3)
+                self.assertFalse(spawn_worker.called)
+            upload.save()
+
+        spawn_worker.assert_called_once_with()
+        job = ImportJob.objects.get()
+        self.assertEqual((job.upload, job.status), (upload, ImportJob.Status.QUEUED))
+
+    @override_settings(QUESTION_IMPORT_SPAWN_WORKER=False)
+    def test_workers_claim_the_oldest_job_once(self):
+        first, second = make_upload(1, name="a.dat"), make_upload(1, name="b.dat")
+
+        job = jobs.claim_next_job("w1")
+        self.assertEqual((job.upload, job.status, job.worker), (first, ImportJob.Status.DECRYPTING, "w1"))
+        self.assertEqual(jobs.claim_next_job("w2").upload, second)
+        self.assertIsNone(jobs.claim_next_job("w3"))
+
+    @override_settings(QUESTION_IMPORT_SPAWN_WORKER=False)
+    def test_undecryptable_upload_fails_and_is_not_retried(self):
+        upload = make_upload(3)
+        QuestionUpload.objects.filter(pk=upload.pk).update(decryption_password="wrong")
+
+        with self.assertLogs("questions.jobs", "ERROR"):
+            self.assertEqual(jobs.run_worker(until_empty=True), 1)
+
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.Status.FAILED)
+        self.assertTrue(job.errors)
+        self.assertIsNotNone(job.finished_at)
+        ImportJob.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+        self.assertIsNone(jobs.claim_next_job("w2"))
+        self.assertFalse(Question.objects.exists())
+
+    def test_worker_that_cannot_start_is_logged(self):
+        with mock.patch.object(jobs.subprocess, "Popen", side_effect=OSError("no fork")), \
+                self.assertLogs("questions.jobs", "ERROR"):
+            jobs.spawn_worker()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, QUESTION_IMPORT_SPAWN_WORKER=False)
+class TamperedUploadTests(TestCase):
+    def test_tampered_tag_is_rejected_before_parsing(self):
+        src = io.BytesIO(tampered(make_dat(200)))
+
+        with mock.patch.object(services, "DECRYPT_CHUNK_SIZE", 256), \
+                mock.patch.object(services, "iter_validated_questions") as parse:
+            with self.assertRaisesMessage(ValueError, "Decryption failed"):
+                parse_dat_file(src, "pw")
+
+        parse.assert_not_called()
+        self.assertIsNone(cached_question_count(parse_cache_key(src, dat_key(src, "pw"))))
+
+    def test_tampered_upload_imports_nothing(self):
+        use_temp_media(self)
+        make_upload(200, content=tampered(make_dat(200)))
+
+        with mock.patch.object(jobs, "import_questions_from_dicts") as insert, \
+                self.assertLogs("questions.jobs", "ERROR"):
+            job = jobs.run_job(jobs.claim_next_job("w1"))
+
+        insert.assert_not_called()
+        self.assertEqual(job.status, ImportJob.Status.FAILED)
+        self.assertIn("Decryption failed", job.errors[0])
+        self.assertEqual((job.rows_total, job.rows_imported), (0, 0))
+        self.assertFalse(Question.objects.exists())
+
+
+@override_settings(QUESTION_IMPORT_SPAWN_WORKER=False)
+class ImportJobResumeTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+
+    def test_requeued_job_resumes_after_committed_rows(self):
+        upload = make_upload(35)
+
+        real_import, calls = jobs.import_questions_from_dicts, []
+
+        def crash_on_third_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise KeyboardInterrupt  # the worker dies mid-import
+            return real_import(*args, **kwargs)
+
+        with mock.patch.object(jobs, "IMPORT_BATCH_SIZE", 10), \
+                mock.patch.object(jobs, "import_questions_from_dicts", crash_on_third_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                jobs.run_job(jobs.claim_next_job("first"))
+        self.assertEqual(Question.objects.filter(upload=upload).count(), 20)
+
+        ImportJob.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        with mock.patch.object(jobs, "IMPORT_BATCH_SIZE", 10):
+            job = jobs.run_job(jobs.claim_next_job("second"))
+
+        self.assertEqual(job.status, ImportJob.Status.DONE)
+        self.assertEqual((job.rows_total, job.rows_imported, job.rows_skipped), (35, 35, 0))
+        self.assertEqual(Question.objects.filter(upload=upload).count(), 35)
+
+    def test_taken_over_job_stops_without_inserting(self):
+        upload = make_upload(5)
+        job = jobs.claim_next_job("first")
+        ImportJob.objects.filter(pk=job.pk).update(worker="second")
+
+        with self.assertLogs("questions.jobs", "WARNING"):
+            job = jobs.run_job(job)
+        self.assertEqual(Question.objects.filter(upload=upload).count(), 0)
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).worker, "second")
+
+
+class ImportQuestionsCommandTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+
+    def write_sheet(self, name, rows):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["text", "part", "options", "correct_answer", "trade", "marks"])
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(os.path.join(self.folder, name))
+
+    def test_parallel_import_of_several_files(self):
+        clerk = Trade.objects.create(name="Clerk", code="CLK")
+        self.write_sheet("a.xlsx", [
+            ["Capital of France?", "A", "Paris,Rome", "Paris", "clerk", 2],
+            ["Welding gas?", "A", "Argon,Neon", "Argon", "Welder", 1],
+            ["Broken key", "A", "w,x", "q", "Welder", 1],
+        ])
+        self.write_sheet("b.xlsx", [
+            ["Arc colour?", "F", None, "true", " Welder ", 1],
+            ["Pay scale?", "E", None, None, str(clerk.pk), 5],
+        ])
+        out = io.StringIO()
+
+        call_command("import_questions", self.folder, workers=2, create_missing=True, stdout=out)
+
+        self.assertEqual(Question.objects.count(), 4)
+        self.assertEqual(sorted(Trade.objects.values_list("name", flat=True)), ["Clerk", "Welder"])
+        welder = Trade.objects.get(name="Welder")
+        self.assertEqual(
+            dict(Question.objects.values_list("text", "trade_id")),
+            {"Capital of France?": clerk.pk, "Welding gas?": welder.pk, "Arc colour?": welder.pk,
+             "Pay scale?": clerk.pk},
+        )
+        self.assertIn("Total: 4 created, 0 skipped, 1 errors in 2 files", out.getvalue())
+
+
+@override_settings(QUESTION_IMPORT_SPAWN_WORKER=False)
+class UploadAdminTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.client.force_login(User.objects.create_superuser("admin", password=None))
+        self.upload = make_upload(3)
+        self.job = jobs.run_job(jobs.claim_next_job("w1"))
+        ImportJob.objects.filter(pk=self.job.pk).update(rows_skipped=1)
+        make_upload(0, name="empty.dat")
+
+    def test_changelist_counts_imported_questions(self):
+        response = self.client.get(reverse("admin:questions_questionupload_changelist"))
+
+        self.assertContains(response, "3 questions (1 skipped)")
+        self.assertContains(response, "0 questions")
+        self.assertContains(response, "Done")
+
+    def test_paper_links_the_questions_of_its_upload_once(self):
+        data = {
+            "title": "Paper", "upload": self.upload.pk,
+            "paperquestion_set-TOTAL_FORMS": 0, "paperquestion_set-INITIAL_FORMS": 0,
+        }
+        response = self.client.post(reverse("admin:questions_questionpaper_add"), data, follow=True)
+        self.assertContains(response, "Linked 3 questions to this paper")
+        paper = QuestionPaper.objects.get()
+        imported = list(self.upload.questions.order_by("id").values_list("id", flat=True))
+        self.assertEqual(list(paper.paperquestion_set.values_list("question_id", "order")),
+                         [(q, i) for i, q in enumerate(imported, start=1)])
+
+        response = self.client.post(
+            reverse("admin:questions_questionpaper_change", args=[paper.pk]), {**data, "title": "Renamed"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(PaperQuestion.objects.filter(paper=paper).count(), 3)
@@ -0,0 +1,142 @@
+"""
+Admission control for the shift-start stampede.
+
+Every candidate of a shift becomes eligible at the same instant. Instead of
+letting all of them render the exam at once, candidates are admitted in paced
+waves: a candidate's position in their shift decides which wave they belong
+to, and each wave opens EXAM_ADMISSION_WAVE_INTERVAL seconds after the
+previous one. An admitted candidate receives a short-lived signed start token
+that the exam page requires. On top of that every worker caps how many exam
+pages it renders concurrently.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CandidateProfile
+
+START_TOKEN_SALT = "registration.exam-start"
+START_TOKEN_COOKIE = "exam_start"
+
+_SHIFT_ROSTER_KEY = "registration:admission:shift:{}"
+_ROSTER_TTL = 300
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def wave_size():
+    return _setting("EXAM_ADMISSION_WAVE_SIZE", 10)
+
+
+def wave_interval():
+    return _setting("EXAM_ADMISSION_WAVE_INTERVAL", 15)
+
+
+def token_ttl():
+    return _setting("EXAM_ADMISSION_TOKEN_TTL", 120)
+
+
+def shift_roster(shift_id):
+    """Sorted candidate profile ids of a shift, cached for the whole shift start."""
+    key = _SHIFT_ROSTER_KEY.format(shift_id)
+    roster = cache.get(key)
+    if roster is None:
+        roster = tuple(
+            CandidateProfile.objects.filter(shift_id=shift_id).order_by("id").values_list("id", flat=True)
+        )
+        cache.set(key, roster, _ROSTER_TTL)
+    return roster
+
+
+def _queue_position(profile):
+    roster = shift_roster(profile.shift_id)
+    position = bisect_left(roster, profile.pk)
+    if position >= len(roster) or roster[position] != profile.pk:
+        # registered after the roster was cached; queue at the back
+        position = len(roster)
+    return position
+
+
+def _wave_opens_at(profile, position):
+    return profile.shift.starts_at + timedelta(seconds=(position // wave_size()) * wave_interval())
+
+
+def admitted_at(profile):
+    """When the candidate may start: the opening of their wave, or the shift start without pacing."""
+    if not _setting("EXAM_ADMISSION_ENABLED", True):
+        return profile.shift.starts_at
+    return _wave_opens_at(profile, _queue_position(profile))
+
+
+def admission_status(profile):
+    """
+    Where a candidate stands in the admission queue of their shift.
+
+    Returns a dict with the queue position, wave number, whether the candidate
+    is admitted now and how many seconds to wait otherwise.
+    """
+    if not profile.shift:
+        return {"admitted": False, "position": None, "wave": None, "retry_after": None}
+
+    position = _queue_position(profile)
+    wave = position // wave_size()
+    opens_at = _wave_opens_at(profile, position)
+    wait = (opens_at - timezone.now()).total_seconds()
+    return {
+        "admitted": wait <= 0,
+        "position": position + 1,
+        "wave": wave + 1,
+        "retry_after": max(0, int(wait) + 1) if wait > 0 else 0,
+    }
+
+
+def issue_start_token(profile):
+    return signing.dumps({"c": profile.pk, "s": profile.shift_id}, salt=START_TOKEN_SALT, compress=True)
+
+
+def check_start_token(token, profile):
+    """True if `token` is a fresh start token issued to this candidate and shift."""
+    if not token:
+        return False
+    try:
+        data = signing.loads(token, salt=START_TOKEN_SALT, max_age=token_ttl())
+    except signing.BadSignature:
+        return False
+    return data.get("c") == profile.pk and data.get("s") == profile.shift_id
+
+
+_render_slots = None
+_render_slots_lock = threading.Lock()
+
+
+def _slots():
+    global _render_slots
+    with _render_slots_lock:
+        if _render_slots is None:
+            _render_slots = threading.BoundedSemaphore(_setting("EXAM_START_MAX_CONCURRENT_RENDERS", 8))
+        return _render_slots
+
+
+@contextmanager
+def exam_render_slot():
+    """
+    Hold one of this worker's exam-render slots.
+
+    Yields False if no slot frees up within EXAM_START_RENDER_WAIT seconds so
+    the caller can answer 503 instead of queueing unboundedly.
+    """
+    slots = _slots()
+    acquired = slots.acquire(timeout=_setting("EXAM_START_RENDER_WAIT", 5))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            slots.release()
@@ -1,3 +1,342 @@
-from django.test import TestCase
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from centers.models import Center
+from exams.models import Shift
+from exams.tokens import SESSION_CACHE_ALIAS
+from questions.models import PaperQuestion, Question, QuestionPaper
+from reference.models import Trade
+from results.models import CandidateAnswer
+from results.services import save_candidate_answers, upsert_answers
+
+from . import admission
+from .admission import admission_status, exam_render_slot
+from .models import CandidateProfile
+
+logger = logging.getLogger(__name__)
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "exam_sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "exam-sessions-test"},
+}
+
+
+def clear_caches():
+    for alias in LOCMEM_CACHES:
+        caches[alias].clear()
+
+
+def exam_clock(shift, minutes=10):
+    """Pin the clock `minutes` into the shift, the fixtures' shift dates being in the past."""
+    return mock.patch.object(timezone, "now", return_value=shift.starts_at + datetime.timedelta(minutes=minutes))
+
+
+def make_candidate(shift, username, trade="Clerk"):
+    user = User.objects.create_user(username, password=None)
+    profile = CandidateProfile.objects.create(
+        user=user, army_no=username, rank="r", trade=trade, name="n", dob="2000-01-01",
+        doe="2020-01-01", father_name="f", qualification="q", state="s", district="d", shift=shift,
+    )
+    return user, profile
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ANSWER_JOURNAL_ENABLED=False)
+class ExamSubmissionQueryTests(TestCase):
+    QUESTIONS = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        cls.shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        cls.paper = QuestionPaper.objects.create(title="P1", trade=trade, duration=datetime.timedelta(hours=1))
+        QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        cls.questions = []
+        for i in range(cls.QUESTIONS):
+            question = Question.objects.create(
+                text=f"Q {i}", part="D", correct_answer=f"answer {i}", trade=trade,
+            )
+            PaperQuestion.objects.create(paper=cls.paper, question=question, order=i)
+            cls.questions.append(question)
+
+    def submit(self, username, answered):
+        user, profile = make_candidate(self.shift, username)
+        self.client.force_login(user)
+        data = {"paper_id": self.paper.id}
+        data.update({f"question_{q.id}": f"answer {i}" for i, q in enumerate(self.questions[:answered])})
+        data["question_999999"] = "not on this paper"
+        with exam_clock(self.shift), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("exam_interface"), data)
+        self.assertRedirects(response, reverse("exam_success"), fetch_redirect_response=False)
+        self.assertEqual(CandidateAnswer.objects.filter(candidate=profile).count(), answered)
+        return len(queries)
+
+    def test_submission_query_count_does_not_grow_with_answers(self):
+        self.submit("warmup", 1)  # fill the paper snapshot cache
+        few = self.submit("few", 10)
+        full = self.submit("full", self.QUESTIONS)
+        logger.info("exam submission: %s queries for %s answers, %s for 10", full, self.QUESTIONS, few)
+        self.assertEqual(few, full)
+
+    def test_save_candidate_answers_is_a_fixed_number_of_queries(self):
+        user, profile = make_candidate(self.shift, "direct")
+        answers = {q.id: "x" for q in self.questions}
+        answers[999999] = "not on this paper"
+        # one lookup of the paper's question ids, then one upsert batch in a savepoint
+        with self.assertNumQueries(4):
+            saved = save_candidate_answers(profile.pk, self.paper.id, answers)
+        self.assertEqual(saved, self.QUESTIONS)
+
+    def test_upsert_sends_one_statement_per_batch(self):
+        user, profile = make_candidate(self.shift, "batched")
+        rows = [(profile.pk, self.paper.id, q.id, "x", 1) for q in self.questions]
+        # savepoint, release and one multi-row INSERT per 30 rows
+        with mock.patch.object(connection.ops, "bulk_batch_size", return_value=30):
+            with self.assertNumQueries(2 + 4):
+                upsert_answers(rows)
+        self.assertEqual(CandidateAnswer.objects.filter(candidate=profile).count(), self.QUESTIONS)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ANSWER_JOURNAL_ENABLED=False)
+class ExamSealTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        cls.paper = QuestionPaper.objects.create(title="P1", trade=trade, duration=datetime.timedelta(hours=1))
+        QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        cls.question = Question.objects.create(text="Capital?", part="D", correct_answer="Delhi", trade=trade)
+        PaperQuestion.objects.create(paper=cls.paper, question=cls.question, order=0)
+        cls.user, cls.profile = make_candidate(shift, "cand")
+
+    def setUp(self):
+        # snapshots and the deny-list would otherwise leak between tests
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client.force_login(self.user)
+
+    def autosave(self, answer, seq=1):
+        return self.client.post(
+            reverse("exam_autosave"),
+            json.dumps({"paper_id": self.paper.id, "seq": seq, "answers": {str(self.question.id): answer}}),
+            content_type="application/json",
+        )
+
+    def stored(self):
+        return list(CandidateAnswer.objects.filter(candidate=self.profile).values_list("answer", flat=True))
+
+    def test_autosave_rejects_non_string_answers(self):
+        for value in ({"a": 1}, ["a"], 3, None):
+            self.assertEqual(self.autosave(value).status_code, 400)
+        self.assertEqual(self.stored(), [])
+
+    def test_submission_without_assignment_seals_the_exam(self):
+        submit = {"paper_id": self.paper.id, f"question_{self.question.id}": "Delhi"}
+        with exam_clock(self.profile.shift):
+            self.client.post(reverse("exam_interface"), submit)
+        self.assertEqual(self.stored(), ["Delhi"])
+
+        self.assertEqual(self.autosave("Mumbai", seq=2 ** 61).status_code, 409)
+        submit[f"question_{self.question.id}"] = "Chennai"
+        self.client.post(reverse("exam_interface"), submit)
+        self.assertEqual(self.stored(), ["Delhi"])
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False)
+    def test_reload_after_submission_shows_success(self):
+        self.client.post(reverse("exam_interface"), {"paper_id": self.paper.id})
+        response = self.client.get(reverse("exam_interface"))
+        self.assertRedirects(response, reverse("exam_success"), fetch_redirect_response=False)
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False)
+    def test_reload_after_submission_without_deny_list_entry(self):
+        self.client.post(reverse("exam_interface"), {"paper_id": self.paper.id})
+        caches[SESSION_CACHE_ALIAS].clear()
+        response = self.client.get(reverse("exam_interface"))
+        self.assertRedirects(response, reverse("exam_success"), fetch_redirect_response=False)
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False, EXAM_SESSION_GRACE=0)
+    def test_autosave_without_token_is_refused_after_the_deadline(self):
+        with exam_clock(self.profile.shift):
+            self.assertEqual(self.autosave("Delhi").status_code, 200)
+        with exam_clock(self.profile.shift, minutes=120):
+            self.assertEqual(self.autosave("Mumbai", seq=2).status_code, 403)
+        self.assertEqual(self.stored(), ["Delhi"])
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False, EXAM_SESSION_GRACE=0)
+    def test_late_form_submission_only_seals(self):
+        with exam_clock(self.profile.shift):
+            self.autosave("Delhi")
+        late = {"paper_id": self.paper.id, f"question_{self.question.id}": "Mumbai"}
+        with exam_clock(self.profile.shift, minutes=120):
+            response = self.client.post(reverse("exam_interface"), late)
+        self.assertRedirects(response, reverse("exam_success"), fetch_redirect_response=False)
+        self.assertEqual(self.stored(), ["Delhi"])
+        self.assertEqual(self.autosave("Chennai", seq=2 ** 61).status_code, 409)
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False)
+    def test_page_after_time_is_up_seals_instead_of_rendering(self):
+        # the fixture shift lies in the past, so the hour is long over
+        response = self.client.get(reverse("exam_interface"))
+        self.assertRedirects(response, reverse("exam_success"), fetch_redirect_response=False)
+        self.assertEqual(self.autosave("Chennai", seq=2 ** 61).status_code, 409)
+
+    @override_settings(EXAM_ADMISSION_ENABLED=False)
+    def test_paper_without_duration_has_no_deadline(self):
+        self.paper.duration = None
+        self.paper.save()
+        response = self.client.get(reverse("exam_interface"))
+        self.assertEqual(response.context["duration_seconds"], None)
+
+        saved = self.client.post(
+            reverse("exam_autosave"),
+            json.dumps({"paper_id": self.paper.id, "seq": 1, "answers": {str(self.question.id): "Delhi"}}),
+            content_type="application/json",
+            HTTP_X_EXAM_SESSION=response.context["exam_session"],
+        )
+        self.assertEqual(saved.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ANSWER_JOURNAL_ENABLED=False, EXAM_ADMISSION_ENABLED=False)
+class ShuffledExamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        # no duration, so the exam is still open at the real clock
+        cls.paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        cls.questions = []
+        for i in range(8):
+            question = Question.objects.create(
+                text=f"Q {i}", part="A", options={"choices": [f"{i}a", f"{i}b", f"{i}c", f"{i}d"]},
+                correct_answer=f"{i}a", trade=trade,
+            )
+            PaperQuestion.objects.create(paper=cls.paper, question=question, order=i)
+            cls.questions.append(question)
+        cls.user, cls.profile = make_candidate(shift, "cand")
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client.force_login(self.user)
+
+    def test_reload_restores_answers_in_the_candidates_order(self):
+        page = self.client.get(reverse("exam_interface")).context
+        shown = page["questions"]
+        self.assertCountEqual([q.id for q in shown], [q.id for q in self.questions])
+        picked = {q.id: str(i % 4) for i, q in enumerate(shown[:3])}
+
+        saved = self.client.post(
+            reverse("exam_autosave"),
+            json.dumps({"paper_id": self.paper.id, "seq": 1, "answers": picked}),
+            content_type="application/json",
+            HTTP_X_EXAM_SESSION=page["exam_session"],
+        )
+        self.assertEqual(saved.status_code, 200)
+
+        # stored as the choice text, whatever position it was shown at
+        stored = dict(CandidateAnswer.objects.filter(candidate=self.profile).values_list("question_id", "answer"))
+        self.assertEqual(stored, {q.id: q.choices[int(picked[q.id])] for q in shown[:3]})
+
+        reloaded = self.client.get(reverse("exam_interface")).context
+        self.assertEqual([q.id for q in reloaded["questions"]], [q.id for q in shown])
+        self.assertEqual([q.choices for q in reloaded["questions"]], [q.choices for q in shown])
+        self.assertEqual(reloaded["saved_answers"], picked)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, EXAM_ADMISSION_WAVE_SIZE=10, EXAM_ADMISSION_WAVE_INTERVAL=15,
+    EXAM_START_MAX_CONCURRENT_RENDERS=4, EXAM_START_RENDER_WAIT=0.05,
+)
+class AdmissionLoadSimulationTests(TestCase):
+    """Drive a whole shift start through the admission queue and the render cap."""
+    CANDIDATES = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        center = Center.objects.create(comd="N", exam_Center="X")
+        cls.shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        cls.profiles = [make_candidate(cls.shift, f"cand{i}")[1] for i in range(cls.CANDIDATES)]
+
+    def setUp(self):
+        admission._render_slots = None
+        self.addCleanup(setattr, admission, "_render_slots", None)
+
+    def test_shift_start_is_spread_over_waves(self):
+        """Every candidate polls from the shift start; count admissions per second."""
+        starts_at = self.shift.starts_at
+        admitted_at, next_poll, polls = {}, {p.pk: 0 for p in self.profiles}, 0
+        second = 0
+        while len(admitted_at) < self.CANDIDATES:
+            with mock.patch.object(timezone, "now", return_value=starts_at + datetime.timedelta(seconds=second)):
+                for profile in self.profiles:
+                    if profile.pk in admitted_at or next_poll[profile.pk] > second:
+                        continue
+                    status = admission_status(profile)
+                    polls += 1
+                    if status["admitted"]:
+                        admitted_at[profile.pk] = second
+                    else:
+                        next_poll[profile.pk] = second + status["retry_after"]
+            second += 1
+
+        per_second = Counter(admitted_at.values())
+        waves = -(-self.CANDIDATES // 10)
+        logger.info(
+            "shift start: %s candidates, peak %s starts/s (unpaced: %s), last start after %ss, %s polls",
+            self.CANDIDATES, max(per_second.values()), self.CANDIDATES, max(admitted_at.values()), polls,
+        )
+        self.assertEqual(max(per_second.values()), 10)
+        self.assertEqual(len(per_second), waves)
+        # the exam deadline of a late wave runs from its admission, not the shift start
+        last = self.profiles[-1]
+        self.assertEqual(admission.admitted_at(last), starts_at + datetime.timedelta(seconds=(waves - 1) * 15))
+        # retry_after rounds up, so a wave may be picked up a second late
+        self.assertLessEqual(max(admitted_at.values()), (waves - 1) * 15 + 1)
+        # waiting candidates poll once per wave at most, not in a busy loop
+        self.assertLessEqual(polls, 2 * self.CANDIDATES)
+
+    def test_concurrent_renders_are_capped(self):
+        """A burst of exam page renders never exceeds the per-worker cap."""
+        lock, active, peak, outcomes = threading.Lock(), [0], [0], Counter()
+
+        def render():
+            with exam_render_slot() as acquired:
+                outcomes["rendered" if acquired else "busy"] += 1
+                if not acquired:
+                    return
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=render) for _ in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        logger.info(
+            "render burst: peak %s concurrent, %s rendered, %s told to retry",
+            peak[0], outcomes["rendered"], outcomes["busy"],
+        )
+        self.assertLessEqual(peak[0], 4)
+        self.assertEqual(outcomes["rendered"] + outcomes["busy"], 40)
+        self.assertGreater(outcomes["busy"], 0)
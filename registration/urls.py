@@ -9,6 +9,9 @@ urlpatterns = [
     path("logout/", auth_views.LogoutView.as_view(next_page="registration/login.html"), name="logout"),
     path("dashboard/", views.candidate_dashboard, name="candidate_dashboard"),
     path("exam_interface/", views.exam_interface, name="exam_interface"),  # New URL pattern
+    path("exam_interface/admission/", views.exam_admission, name="exam_admission"),
+    path("exam_interface/autosave/", views.exam_autosave, name="exam_autosave"),
+    path("exam_interface/heartbeat/", views.exam_heartbeat, name="exam_heartbeat"),
     path("export-candidate/<int:candidate_id>/", views.export_answers_pdf, name="export_candidate_pdf"),
     path("exam_success/", views.exam_success, name="exam_success"),
 ]
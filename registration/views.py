@@ -1,18 +1,35 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import CandidateProfile
-from reference.models import Trade
 from .forms import CandidateRegistrationForm
+from .admission import (
+    START_TOKEN_COOKIE, admission_status, check_start_token, exam_render_slot,
+    issue_start_token, token_ttl,
+)
+from django.conf import settings
 from django.contrib import messages
-from questions.models import QuestionPaper, Question
+from django.db import transaction
+from django.utils import timezone
+from questions.shuffle import canonical_answers, shown_answers, shuffle_paper
+from questions.snapshots import get_paper_snapshot, get_trade_paper_ids
 from results.models import CandidateAnswer
-from django.http import FileResponse, Http404
-import os, tempfile
+from results.services import answer_seq, parse_answer_keys, pending_answers, record_answers
+from django.http import FileResponse, Http404, JsonResponse
+from django.views.decorators.http import require_POST
+import json, os, tempfile
+from datetime import timedelta
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
 from reportlab.lib.pdfencrypt import StandardEncryption
 from exams.models import Shift   # ✅ Added import for Shift
+from exams.services import exam_deadline, is_exam_sealed, seal_exam, shuffle_seed_for, start_exam_session
+from exams.tokens import (
+    InvalidExamSession, SESSION_TOKEN_HEADER, grace_seconds, read_exam_session, remaining_seconds,
+)
+
+# CandidateAnswer.seq is a signed 64-bit column
+MAX_AUTOSAVE_SEQ = 2 ** 62
 
 
 @login_required
@@ -47,47 +64,219 @@ def register_candidate(request):
 
 @login_required
 def exam_interface(request):
-    candidate_profile = get_object_or_404(CandidateProfile, user=request.user)
+    candidate_profile = get_object_or_404(
+        CandidateProfile.objects.select_related("shift"), user=request.user
+    )
 
     if not candidate_profile.can_start_exam:
-        return render(request, "registration/exam_not_started.html", {
-            "message": "You cannot start the exam yet."
-        })
-
-    trade_obj = None
-    if candidate_profile.trade:
-        print(candidate_profile.trade)
-        trade_obj = get_object_or_404(Trade, name=candidate_profile.trade)
+        return _exam_waiting(request, candidate_profile, "You cannot start the exam yet.")
 
-    part_a = QuestionPaper.objects.filter(trade=trade_obj, is_common=False).first()
-    part_b = QuestionPaper.objects.filter(trade=trade_obj, is_common=True).first()
-    current_paper = part_a or part_b
-    duration_seconds = int(current_paper.duration.total_seconds()) if current_paper and current_paper.duration else 0
+    # Trade -> paper ids and the papers themselves come from the snapshot cache
+    paper_ids = get_trade_paper_ids(candidate_profile.trade)
+    if paper_ids is None:
+        raise Http404("No Trade matches the given query.")
 
     if request.method == "POST":
-        paper_id = request.POST.get("paper_id")
-        paper = QuestionPaper.objects.get(id=paper_id)
-        for key, value in request.POST.items():
-            if key.startswith("question_"):
-                qid = key.split("_")[1]
-                question = Question.objects.get(id=qid)
-                CandidateAnswer.objects.update_or_create(
-                    candidate=candidate_profile,
-                    paper=paper,
-                    question=question,
-                    defaults={"answer": value}
+        try:
+            paper_id = int(request.POST.get("paper_id"))
+        except (TypeError, ValueError):
+            raise Http404("Invalid paper.")
+        # only the candidate's own papers can be answered
+        if paper_id not in paper_ids:
+            raise Http404("Invalid paper.")
+        # with autosave the answers are usually on the server already and the
+        # form only seals the exam; a full form is still accepted as a fallback,
+        # stored only by the submission that seals the exam
+        # past the deadline (and grace) the form only seals; its edits are dropped
+        late = _past_deadline(request.user, candidate_profile, paper_ids)
+        with transaction.atomic():
+            if seal_exam(request.user, candidate_profile.shift_id, candidate_profile.pk) and not late:
+                answers = canonical_answers(
+                    get_paper_snapshot(paper_id),
+                    shuffle_seed_for(request.user, candidate_profile.shift_id, candidate_profile.pk),
+                    parse_answer_keys(request.POST),
                 )
+                record_answers(candidate_profile.pk, paper_id, answers)
         # redirect to success page instead of reloading exam
         return redirect("exam_success")
 
+    # shift start is paced in waves; a start token means the candidate's wave
+    # was already open, otherwise check the queue before rendering
+    new_token = None
+    if settings.EXAM_ADMISSION_ENABLED and not check_start_token(
+        request.COOKIES.get(START_TOKEN_COOKIE), candidate_profile
+    ):
+        if not admission_status(candidate_profile)["admitted"]:
+            return _exam_waiting(request, candidate_profile, "Please wait, you will be admitted shortly.")
+        new_token = issue_start_token(candidate_profile)
+
+    with exam_render_slot() as acquired:
+        if not acquired:
+            response = _exam_waiting(request, candidate_profile, "The exam server is busy, retrying shortly.")
+            response.status_code = 503
+            response["Retry-After"] = "5"
+            return response
+        response = _render_exam(request, candidate_profile, paper_ids)
+
+    if new_token:
+        response.set_cookie(START_TOKEN_COOKIE, new_token, max_age=token_ttl(), httponly=True, samesite="Lax")
+    return response
+
+
+def _past_deadline(user, candidate_profile, paper_ids):
+    """True once the candidate's exam time and the grace period are over."""
+    current_paper = get_paper_snapshot(paper_ids[0]) or get_paper_snapshot(paper_ids[1])
+    deadline = exam_deadline(user, candidate_profile, current_paper.duration_seconds if current_paper else 0)
+    return deadline is not None and timezone.now() > deadline + timedelta(seconds=grace_seconds())
+
+
+def _exam_waiting(request, candidate_profile, message):
+    return render(request, "registration/exam_waiting.html", {
+        "candidate": candidate_profile,
+        "message": message,
+        "status": admission_status(candidate_profile),
+    })
+
+
+def _render_exam(request, candidate_profile, paper_ids):
+    part_a = get_paper_snapshot(paper_ids[0])
+    part_b = get_paper_snapshot(paper_ids[1])
+    current_paper = part_a or part_b
+    duration_seconds = current_paper.duration_seconds if current_paper else 0
+
+    # the deny-list is only a cache, so a page load checks the seal itself
+    if is_exam_sealed(request.user, candidate_profile.shift_id):
+        return redirect("exam_success")
+
+    # the session token carries seed and deadline for autosave and heartbeat
+    exam_session = start_exam_session(request.user, candidate_profile, paper_ids, duration_seconds)
+    try:
+        claims = read_exam_session(exam_session, allow_expired=True)
+    except InvalidExamSession:
+        # the session is revoked once the exam is submitted
+        return redirect("exam_success")
+
+    # time is up: the page would have no timer, so seal what was autosaved
+    if remaining_seconds(claims) == 0:
+        with transaction.atomic():
+            seal_exam(request.user, candidate_profile.shift_id, candidate_profile.pk)
+        return redirect("exam_success")
+
+    # this candidate's question and option order, recomputed from the seed
+    questions = shuffle_paper(part_a, claims["s"])
+
+    # restore autosaved answers, e.g. after a browser crash, including the ones
+    # still waiting in the answer journal
+    paper_id = current_paper.id if current_paper else None
+    saved = CandidateAnswer.objects.filter(
+        candidate=candidate_profile, paper_id=paper_id
+    ).values_list("question_id", "answer", "seq")
+    latest = {qid: (answer, seq) for qid, answer, seq in saved}
+    if paper_id is not None:
+        for qid, (answer, seq) in pending_answers(candidate_profile.pk, paper_id).items():
+            if qid not in latest or seq > latest[qid][1]:
+                latest[qid] = (answer, seq)
+    saved_answers = {qid: answer for qid, (answer, seq) in latest.items()}
+    # autosave continues from the clock, above anything sent before the reload
+    autosave_seq = max([answer_seq(), *(seq + 1 for answer, seq in latest.values())])
+
     return render(request, "registration/exam_interface.html", {
         "candidate": candidate_profile,
         "part_a": part_a,
         "part_b": part_b,
-        "duration_seconds": duration_seconds,
+        "questions": questions,
+        "duration_seconds": remaining_seconds(claims),
+        "saved_answers": shown_answers(questions, saved_answers),
+        "autosave_seq": autosave_seq,
+        "exam_session": exam_session,
     })
 
 
+@login_required
+def exam_admission(request):
+    """
+    Poll the shift-start queue. Once the candidate's wave is open the response
+    carries a short-lived start token (also set as a cookie) for the exam page.
+    """
+    candidate_profile = get_object_or_404(
+        CandidateProfile.objects.select_related("shift"), user=request.user
+    )
+    status = admission_status(candidate_profile)
+    if not candidate_profile.can_start_exam:
+        status["admitted"] = False
+    response = JsonResponse(status)
+    if status["admitted"]:
+        response.set_cookie(
+            START_TOKEN_COOKIE, issue_start_token(candidate_profile),
+            max_age=token_ttl(), httponly=True, samesite="Lax",
+        )
+    return response
+
+
+@require_POST
+def exam_autosave(request):
+    """
+    Accept changed answers as JSON: {"paper_id": 1, "seq": 7, "answers": {"12": "B"}}.
+    Answers are strings as the form would post them.
+
+    `seq` must grow with every batch the browser sends (the page starts it from
+    the server clock, see answer_seq); stale or replayed batches are
+    acknowledged but not applied. Requests carrying an exam-session
+    token (X-Exam-Session header) are authorised and time-checked from the
+    token alone; otherwise the logged-in candidate and their deadline are
+    checked in the database.
+    """
+    try:
+        payload = json.loads(request.body)
+        paper_id = int(payload["paper_id"])
+        seq = int(payload["seq"])
+        if not 0 <= seq < MAX_AUTOSAVE_SEQ:
+            raise ValueError(seq)
+        answers = {int(qid): value for qid, value in (payload.get("answers") or {}).items()}
+        if not all(isinstance(value, str) for value in answers.values()):
+            raise TypeError("answers must be strings")
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({"ok": False, "error": "Malformed autosave payload."}, status=400)
+
+    token = request.META.get(SESSION_TOKEN_HEADER)
+    if token:
+        try:
+            claims = read_exam_session(token)
+        except InvalidExamSession as e:
+            return JsonResponse({"ok": False, "error": str(e)}, status=403)
+        if paper_id not in claims["p"]:
+            return JsonResponse({"ok": False, "error": "Exam is not open."}, status=403)
+        candidate_id, seed = claims["c"], claims["s"]
+    else:
+        if not request.user.is_authenticated:
+            return JsonResponse({"ok": False, "error": "Login required."}, status=401)
+        candidate_profile = get_object_or_404(
+            CandidateProfile.objects.select_related("shift"), user=request.user
+        )
+        paper_ids = get_trade_paper_ids(candidate_profile.trade)
+        if not candidate_profile.can_start_exam or not paper_ids or paper_id not in paper_ids:
+            return JsonResponse({"ok": False, "error": "Exam is not open."}, status=403)
+        if is_exam_sealed(request.user, candidate_profile.shift_id):
+            return JsonResponse({"ok": False, "error": "Exam already submitted."}, status=409)
+        if _past_deadline(request.user, candidate_profile, paper_ids):
+            return JsonResponse({"ok": False, "error": "Exam time is over."}, status=403)
+        candidate_id = candidate_profile.pk
+        seed = shuffle_seed_for(request.user, candidate_profile.shift_id, candidate_profile.pk)
+
+    answers = canonical_answers(get_paper_snapshot(paper_id), seed, answers)
+    saved = record_answers(candidate_id, paper_id, answers, seq)
+    return JsonResponse({"ok": True, "seq": seq, "saved": saved})
+
+
+def exam_heartbeat(request):
+    """Report the seconds left on the exam, checked from the session token only."""
+    try:
+        claims = read_exam_session(request.META.get(SESSION_TOKEN_HEADER), allow_expired=True)
+    except InvalidExamSession as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=403)
+    return JsonResponse({"ok": True, "remaining": remaining_seconds(claims)})
+
+
 @login_required
 def exam_success(request):
     return render(request, "registration/exam_success.html")
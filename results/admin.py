@@ -1,4 +1,13 @@
 # results/admin.py
 from django.contrib import admin
-from .models import CandidateAnswer
+from .models import CandidateAnswer, CandidateResult
 admin.site.register(CandidateAnswer)
+
+
+@admin.register(CandidateResult)
+class CandidateResultAdmin(admin.ModelAdmin):
+    list_display = ("attempt", "candidate", "trade", "center", "exam_date", "written_total",
+                    "practical_marks", "viva_marks", "grand_total", "percentage", "passed")
+    list_filter = ("passed", "trade", "center", "exam_date")
+    list_select_related = ("attempt", "candidate", "trade", "center")
+    search_fields = ("candidate__army_no", "candidate__name")
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ResultsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'results'
+
+    def ready(self):
+        import results.signals  # noqa: F401
+        from .journal import replay_on_startup
+
+        replay_on_startup()
@@ -0,0 +1,286 @@
+"""
+Write-behind journal for candidate answers.
+
+At the end of a shift every candidate submits within the same minute and the
+main SQLite database serialises all of those writes on its single writer
+lock. Answer writes from the exam views are therefore appended to a separate
+WAL-mode SQLite file first (committed with synchronous=FULL, i.e. fsynced
+before the candidate gets an acknowledgement) and a flusher drains the
+journal into CandidateAnswer in large batches.
+
+Entries are only deleted from the journal after the batch has been committed
+to the main database, so anything left over after a crash is replayed by the
+next drain; server processes start their flusher at startup for that (see
+replay_on_startup). Applying an entry twice is harmless because of the
+per-answer sequence numbers (see results.services.upsert_answers). An entry
+the database rejects outright (say its question was deleted) is isolated by
+halving the failing batch and moved to the answer_journal_dead table, so it
+cannot hold back the entries behind it. Every process runs a flusher, but
+only one drains at a time: a drain holds an exclusive lock on a side file
+(`<journal>-drain.lock`) from its first read to its last delete.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DataError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    candidate_id INTEGER NOT NULL,
+    paper_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    answer TEXT,
+    seq INTEGER,
+    written_at REAL NOT NULL
+)
+"""
+_DEAD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_journal_dead (
+    id INTEGER PRIMARY KEY,
+    candidate_id INTEGER NOT NULL,
+    paper_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    answer TEXT,
+    seq INTEGER,
+    error TEXT NOT NULL,
+    failed_at REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS answer_journal_candidate ON answer_journal (candidate_id, paper_id)"
+# entries journalled before final submissions carried a seq
+_SEQ = "COALESCE(seq, CAST(written_at * 1000 AS INTEGER))"
+
+
+class AnswerJournal:
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(_SCHEMA)
+            conn.execute(_DEAD_SCHEMA)
+            conn.execute(_INDEX)
+            self._local.conn = conn
+        return conn
+
+    def append(self, candidate_id, paper_id, answers, seq=None):
+        """
+        Durably record answers ({question_id: value}) for one candidate/paper.
+
+        `seq` orders writes to the same answer (see results.services.answer_seq).
+        Returns once the entries are on disk.
+        """
+        if not answers:
+            return 0
+        now = time.time()
+        rows = [
+            (candidate_id, paper_id, qid, value, seq, now)
+            for qid, value in answers.items()
+        ]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO answer_journal (candidate_id, paper_id, question_id, answer, seq, written_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def pending_count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM answer_journal").fetchone()[0]
+
+    def dead_letter_count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM answer_journal_dead").fetchone()[0]
+
+    def pending_answers(self, candidate_id, paper_id):
+        """Newest not yet drained answer per question: {question_id: (answer, seq)}."""
+        rows = self._connection().execute(
+            f"SELECT question_id, answer, {_SEQ} FROM answer_journal "
+            "WHERE candidate_id = ? AND paper_id = ? ORDER BY id",
+            (candidate_id, paper_id),
+        ).fetchall()
+        pending = {}
+        for question_id, answer, seq in rows:
+            if question_id not in pending or seq >= pending[question_id][1]:
+                pending[question_id] = (answer, seq)
+        return pending
+
+    def _drain_lock(self):
+        """Exclusive drain lock, or None if another process is draining."""
+        lock = sqlite3.connect(self.path + "-drain.lock", timeout=0, isolation_level=None)
+        try:
+            lock.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            lock.close()
+            return None
+        return lock
+
+    def drain(self, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+        """
+        Move journal entries into CandidateAnswer, oldest first.
+
+        Returns the number of entries drained (dead-lettered ones included),
+        0 if another drain is running. Entries are deleted only after the main
+        database has committed them or they were moved to answer_journal_dead.
+        """
+        lock = self._drain_lock()
+        if lock is None:
+            return 0
+        try:
+            conn = self._connection()
+            drained = 0
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                rows = conn.execute(
+                    f"SELECT id, candidate_id, paper_id, question_id, answer, {_SEQ} "
+                    "FROM answer_journal ORDER BY id LIMIT ?",
+                    (batch_size,),
+                ).fetchall()
+                if not rows:
+                    break
+                rejected = _apply_isolating(rows)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if rejected:
+                        now = time.time()
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO answer_journal_dead "
+                            "(id, candidate_id, paper_id, question_id, answer, seq, error, failed_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(*row, error, now) for row, error in rejected],
+                        )
+                    conn.execute("DELETE FROM answer_journal WHERE id <= ?", (rows[-1][0],))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                drained += len(rows)
+                batches += 1
+            return drained
+        finally:
+            lock.execute("ROLLBACK")
+            lock.close()
+
+
+def _apply_isolating(rows):
+    """
+    Apply journal rows, halving a batch the database rejects until the
+    offending entries are found. Returns [(row, error)] of the rejected ones;
+    any other error (e.g. the database is down) propagates and the whole
+    batch is retried by the next drain.
+    """
+    from .services import apply_journal_entries
+
+    try:
+        apply_journal_entries([row[1:] for row in rows])
+        return []
+    except (IntegrityError, DataError) as e:
+        if len(rows) == 1:
+            logger.error("Answer journal entry %s rejected, moved to answer_journal_dead: %s", rows[0], e)
+            return [(rows[0], str(e))]
+    middle = len(rows) // 2
+    return _apply_isolating(rows[:middle]) + _apply_isolating(rows[middle:])
+
+
+_journal = None
+_journal_lock = threading.RLock()
+_flusher = None
+
+
+def journal_enabled():
+    return getattr(settings, "ANSWER_JOURNAL_ENABLED", False)
+
+
+def get_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = AnswerJournal(settings.ANSWER_JOURNAL_PATH)
+        return _journal
+
+
+def _flush_forever(journal, interval, batch_size, stop):
+    from django.db import close_old_connections, connections
+
+    while not stop.is_set():
+        try:
+            close_old_connections()
+            journal.drain(batch_size=batch_size)
+        except Exception:
+            logger.exception("Answer journal flush failed; will retry")
+        stop.wait(interval)
+    connections.close_all()
+
+
+def ensure_flusher():
+    """Start this process's background flusher thread if it is not running."""
+    global _flusher
+    if not getattr(settings, "ANSWER_JOURNAL_FLUSH_IN_PROCESS", True):
+        return
+    with _journal_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        stop = threading.Event()
+        _flusher = threading.Thread(
+            target=_flush_forever,
+            args=(
+                get_journal(),
+                getattr(settings, "ANSWER_JOURNAL_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL),
+                getattr(settings, "ANSWER_JOURNAL_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+                stop,
+            ),
+            name="answer-journal-flusher",
+            daemon=True,
+        )
+        _flusher.stop = stop
+        _flusher.start()
+
+
+def stop_flusher():
+    """Stop this process's flusher after its current drain, e.g. in tests."""
+    global _flusher
+    with _journal_lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop.set()
+        flusher.join()
+
+
+def _is_management_command():
+    # manage.py migrate/test/shell must not drain; runserver serves requests
+    program = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if program not in ("manage.py", "django-admin", "django-admin.py"):
+        return False
+    return sys.argv[1:2] != ["runserver"]
+
+
+def replay_on_startup():
+    """
+    Start the flusher when a server process starts, so entries left in the
+    journal by a crashed process are replayed without waiting for the next
+    autosave. Management commands are skipped; `flush_answer_journal` replays
+    by hand.
+    """
+    if journal_enabled() and not _is_management_command():
+        ensure_flusher()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from results.journal import DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL, get_journal
+
+
+class Command(BaseCommand):
+    help = "Drain the write-behind answer journal into CandidateAnswer (replays leftovers after a restart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Entries per bulk upsert")
+        parser.add_argument("--loop", action="store_true", help="Keep draining until interrupted")
+        parser.add_argument("--interval", type=float, default=DEFAULT_FLUSH_INTERVAL, help="Seconds between drains with --loop")
+
+    def handle(self, *args, **options):
+        journal = get_journal()
+        pending = journal.pending_count()
+        if pending:
+            self.stdout.write(f"Replaying {pending} journal entries...")
+
+        dead = journal.dead_letter_count()
+        if dead:
+            self.stdout.write(self.style.WARNING(f"{dead} rejected entries are kept in answer_journal_dead"))
+
+        while True:
+            drained = journal.drain(batch_size=options["batch_size"])
+            if drained:
+                self.stdout.write(self.style.SUCCESS(f"Drained {drained} entries"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
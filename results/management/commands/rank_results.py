@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from results.models import CandidateResult
+from results.ranking import SCOPES, compute_ranks
+
+
+class Command(BaseCommand):
+    help = "Compute dense ranks and percentiles of candidate results per trade, and per trade at each center and on each exam date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scope", choices=sorted(SCOPES), action="append",
+                            help="Only rank this scope (repeatable); default is all of them")
+        parser.add_argument("--date", type=str,
+                            help="Only re-rank the date scope for this exam date (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        queryset = CandidateResult.objects.all()
+        scopes = options["scope"]
+        if options["date"]:
+            # trade and center groups span several days; ranking them over one
+            # day's results would overwrite their ranks with partial ones
+            if scopes and set(scopes) - {"date"}:
+                raise CommandError("--date only ranks the date scope.")
+            scopes = ["date"]
+            queryset = queryset.filter(exam_date=options["date"])
+        for scope, ranked in compute_ranks(scopes, queryset).items():
+            self.stdout.write(self.style.SUCCESS(f"{scope}: ranked {ranked} results"))
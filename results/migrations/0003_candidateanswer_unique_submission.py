@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:29
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def drop_duplicate_answers(apps, schema_editor):
+    """Keep only the latest answer for each (candidate, paper, question)."""
+    CandidateAnswer = apps.get_model("results", "CandidateAnswer")
+    keep = (
+        CandidateAnswer.objects.values("candidate", "paper", "question")
+        .annotate(keep_id=Max("id"))
+        .values_list("keep_id", flat=True)
+    )
+    CandidateAnswer.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_remove_question_level_remove_question_qf_and_more'),
+        ('registration', '0006_remove_candidateprofile_enrolment_no'),
+        ('results', '0002_candidateanswer_delete_candidateresult'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_answers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='candidateanswer',
+            unique_together={('candidate', 'paper', 'question')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0003_candidateanswer_unique_submission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidateanswer',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('centers', '0002_remove_center_code_remove_center_name_center_comd_and_more'),
+        ('exams', '0007_answer_evaluation_claims'),
+        ('reference', '0005_delete_level_delete_qf_delete_qualification_and_more'),
+        ('registration', '0006_remove_candidateprofile_enrolment_no'),
+        ('results', '0004_candidateanswer_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exam_date', models.DateField(blank=True, null=True)),
+                ('part_a', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('part_b', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('part_c', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('part_d', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('part_e', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('part_f', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('written_total', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('practical_marks', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('viva_marks', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('max_marks', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('passed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='exams.examattempt')),
+                ('candidate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='registration.candidateprofile')),
+                ('center', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='centers.center')),
+                ('trade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='reference.trade')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trade', 'exam_date'], name='results_can_trade_i_079ee0_idx'), models.Index(fields=['center', 'exam_date'], name='results_can_center__5e3f13_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('centers', '0002_remove_center_code_remove_center_name_center_comd_and_more'),
+        ('exams', '0007_answer_evaluation_claims'),
+        ('reference', '0005_delete_level_delete_qf_delete_qualification_and_more'),
+        ('registration', '0006_remove_candidateprofile_enrolment_no'),
+        ('results', '0005_candidateresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidateresult',
+            name='center_percentile',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidateresult',
+            name='center_rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidateresult',
+            name='date_percentile',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidateresult',
+            name='date_rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidateresult',
+            name='trade_percentile',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidateresult',
+            name='trade_rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='candidateresult',
+            index=models.Index(fields=['trade', '-grand_total'], name='results_trade_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidateresult',
+            index=models.Index(fields=['center', '-grand_total'], name='results_center_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidateresult',
+            index=models.Index(fields=['exam_date', '-grand_total'], name='results_date_total_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0006_candidateresult_ranks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='candidateanswer',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('centers', '0002_remove_center_code_remove_center_name_center_comd_and_more'),
+        ('exams', '0008_examsubmission'),
+        ('reference', '0005_delete_level_delete_qf_delete_qualification_and_more'),
+        ('registration', '0006_remove_candidateprofile_enrolment_no'),
+        ('results', '0007_candidateanswer_seq_bigint'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='candidateresult',
+            name='results_center_total_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='candidateresult',
+            name='results_date_total_idx',
+        ),
+        migrations.AddIndex(
+            model_name='candidateresult',
+            index=models.Index(fields=['trade', 'center', '-grand_total'], name='results_center_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidateresult',
+            index=models.Index(fields=['trade', 'exam_date', '-grand_total'], name='results_date_total_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 # results/models.py
 from django.db import models
+from centers.models import Center
+from exams.models import ExamAttempt
 from questions.models import Question, QuestionPaper
+from reference.models import Trade
 from registration.models import CandidateProfile   # assuming you have this
 
 class CandidateAnswer(models.Model):
@@ -8,7 +11,62 @@ class CandidateAnswer(models.Model):
     paper = models.ForeignKey(QuestionPaper, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.TextField(blank=True, null=True)
+    seq = models.PositiveBigIntegerField(default=0)  # sequence of the stored answer, see results.services.answer_seq
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        unique_together = ("candidate", "paper", "question")
+
     def __str__(self):
         return f"{self.candidate.army_no} - {self.paper.title} - {self.question.id}"
+
+
+class CandidateResult(models.Model):
+    """
+    Materialised result of one exam attempt.
+
+    Kept current by results.services.refresh_results whenever answer scores or
+    practical/viva marks change, so listings and exports never aggregate
+    Answer rows at read time.
+    """
+    attempt = models.OneToOneField(ExamAttempt, on_delete=models.CASCADE, related_name="result")
+    candidate = models.ForeignKey(CandidateProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name="results")
+    trade = models.ForeignKey(Trade, on_delete=models.SET_NULL, null=True, blank=True)
+    center = models.ForeignKey(Center, on_delete=models.SET_NULL, null=True, blank=True)
+    exam_date = models.DateField(null=True, blank=True)
+
+    part_a = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    part_b = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    part_c = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    part_d = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    part_e = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    part_f = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    written_total = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    practical_marks = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    viva_marks = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    max_marks = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    passed = models.BooleanField(default=False)
+    # dense rank and percentile within the trade, and within the trade at the
+    # center and on the exam date, written by results.ranking.compute_ranks
+    trade_rank = models.PositiveIntegerField(null=True, blank=True)
+    trade_percentile = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    center_rank = models.PositiveIntegerField(null=True, blank=True)
+    center_percentile = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    date_rank = models.PositiveIntegerField(null=True, blank=True)
+    date_percentile = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trade", "exam_date"]),
+            models.Index(fields=["center", "exam_date"]),
+            # ranking streams each scope in this order
+            models.Index(fields=["trade", "-grand_total"], name="results_trade_total_idx"),
+            models.Index(fields=["trade", "center", "-grand_total"], name="results_center_total_idx"),
+            models.Index(fields=["trade", "exam_date", "-grand_total"], name="results_date_total_idx"),
+        ]
+
+    def __str__(self):
+        return f"Result of attempt {self.attempt_id}: {self.grand_total}/{self.max_marks}"
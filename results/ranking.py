@@ -0,0 +1,106 @@
+"""
+Dense ranks and percentiles of CandidateResult within a trade, and within
+the trade at a center and on an exam date.
+
+Papers and max_marks differ by trade, so totals are only ever compared
+within one trade: the center and date scopes group by (trade, center) and
+(trade, exam date).
+
+Each scope is one pass over its results streamed from the database, already
+ordered by group and descending total, so memory stays flat however large
+the cohort. Group sizes come from a single COUNT ... GROUP BY beforehand,
+which is all a one-pass percentile needs: a candidate's percentile is the
+share of their group scoring at most their total.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import CandidateResult
+
+logger = logging.getLogger(__name__)
+
+# scope name -> grouping fields; fills <scope>_rank and <scope>_percentile
+SCOPES = {
+    "trade": ("trade_id",),
+    "center": ("trade_id", "center_id"),
+    "date": ("trade_id", "exam_date"),
+}
+RANK_FIELDS = tuple(f"{scope}_{kind}" for scope in SCOPES for kind in ("rank", "percentile"))
+STREAM_CHUNK = 5000
+ID_BATCH = 900  # stays under SQLite's bound-parameter limit
+_HUNDRED = Decimal("100")
+
+
+def _write(rank_field, percentile_field, ties):
+    """One UPDATE per tie group: every tied result shares rank and percentile."""
+    with transaction.atomic():
+        for (rank, percentile), ids in ties:
+            for start in range(0, len(ids), ID_BATCH):
+                CandidateResult.objects.filter(id__in=ids[start:start + ID_BATCH]).update(
+                    **{rank_field: rank, percentile_field: percentile}
+                )
+
+
+def rank_scope(scope, queryset=None):
+    """Rank one scope; returns the number of results ranked."""
+    fields = SCOPES[scope]
+    rank_field, percentile_field = f"{scope}_rank", f"{scope}_percentile"
+    queryset = (queryset if queryset is not None else CandidateResult.objects.all()).filter(
+        **{f"{field}__isnull": False for field in fields}
+    )
+    sizes = {
+        tuple(row[:-1]): row[-1]
+        for row in queryset.order_by().values_list(*fields).annotate(n=Count("id"))
+    }
+
+    rows = queryset.order_by(*fields, "-grand_total", "id").values_list("id", "grand_total", *fields)
+    group = total = object()
+    rank = above = seen = 0
+    tie_ids = []
+    pending, pending_rows = [], 0
+    ranked = 0
+
+    def close_tie():
+        nonlocal pending_rows
+        if tie_ids:
+            n = sizes[group]
+            percentile = (Decimal(n - above) * _HUNDRED / n).quantize(Decimal("0.01"))
+            pending.append(((rank, percentile), list(tie_ids)))
+            pending_rows += len(tie_ids)
+
+    for result_id, grand_total, *key in rows.iterator(chunk_size=STREAM_CHUNK):
+        key = tuple(key)
+        if key != group:
+            close_tie()
+            group, total = key, grand_total
+            rank, above, seen = 1, 0, 0
+            tie_ids = []
+        elif grand_total != total:
+            close_tie()
+            total = grand_total
+            rank += 1
+            above = seen
+            tie_ids = []
+        tie_ids.append(result_id)
+        seen += 1
+        ranked += 1
+        if pending_rows >= STREAM_CHUNK:
+            _write(rank_field, percentile_field, pending)
+            pending, pending_rows = [], 0
+    close_tie()
+    _write(rank_field, percentile_field, pending)
+    logger.info("Ranked %s results by %s in %s groups", ranked, scope, len(sizes))
+    return ranked
+
+
+def compute_ranks(scopes=None, queryset=None):
+    """
+    Rank every scope (or the given ones).
+
+    `queryset` narrows the results considered, e.g. to one exam date; groups
+    must be complete within it for percentiles to be meaningful.
+    """
+    return {scope: rank_scope(scope, queryset) for scope in (scopes or SCOPES)}
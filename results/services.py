@@ -0,0 +1,243 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from exams.models import Answer, ExamAttempt
+from questions.models import PaperQuestion
+from questions.snapshots import get_paper_snapshot
+from registration.models import CandidateProfile
+from .journal import ensure_flusher, get_journal, journal_enabled
+from .models import CandidateAnswer, CandidateResult
+from .ranking import RANK_FIELDS
+
+RESULT_BATCH = 500
+UPSERT_FIELDS = ("candidate", "paper", "question", "answer", "seq", "submitted_at")
+PARTS = ("A", "B", "C", "D", "E", "F")
+
+
+def parse_answer_keys(data):
+    """Pick `question_<id>` entries out of POST-like data as {question_id: value}."""
+    answers = {}
+    for key, value in data.items():
+        if not key.startswith("question_"):
+            continue
+        try:
+            answers[int(key.split("_", 1)[1])] = value
+        except ValueError:
+            continue
+    return answers
+
+
+def answer_seq():
+    """
+    Sequence number for an answer write: milliseconds since the epoch.
+
+    The exam page starts its autosave counter here and adds one per batch, so
+    a reloaded page always continues above everything it sent before, and a
+    final submission (stamped when it arrives) wins over earlier autosaves.
+    """
+    return int(time.time() * 1000)
+
+
+def record_answers(candidate_id, paper_id, answers, seq=None):
+    """
+    Entry point for answer writes from the exam views.
+
+    With the answer journal enabled the answers are checked against the cached
+    paper snapshot, appended to the journal and acknowledged once fsynced; the
+    flusher moves them into CandidateAnswer later. Otherwise they are written
+    directly. `seq` is the autosave sequence, None for a final submission.
+    """
+    if seq is None:
+        seq = answer_seq()
+    if journal_enabled():
+        snapshot = get_paper_snapshot(paper_id)
+        valid_ids = snapshot.question_ids if snapshot else frozenset()
+        answers = {qid: value for qid, value in answers.items() if qid in valid_ids}
+        written = get_journal().append(candidate_id, paper_id, answers, seq)
+        ensure_flusher()
+        return written
+    return apply_answer_delta(candidate_id, paper_id, answers, seq)
+
+
+def upsert_answers(rows):
+    """
+    Write (candidate_id, paper_id, question_id, answer, seq) rows to CandidateAnswer.
+
+    One multi-row INSERT ... ON CONFLICT DO UPDATE per batch of rows, batches
+    sized by the backend's parameter limit. A stored answer is only replaced
+    by one with a higher seq, and the comparison is made by the database
+    inside the statement, so concurrent writers and replays can never put an
+    older answer back. Returns the number of distinct answers sent.
+    """
+    # a statement may not touch the same row twice: keep the highest seq
+    latest = {}
+    for candidate_id, paper_id, question_id, answer, seq in rows:
+        key = (candidate_id, paper_id, question_id)
+        if key not in latest or seq >= latest[key][1]:
+            latest[key] = (answer, seq)
+    if not latest:
+        return 0
+    table = connection.ops.quote_name(CandidateAnswer._meta.db_table)
+    fields = [CandidateAnswer._meta.get_field(name) for name in UPSERT_FIELDS]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    params = [(*key, answer, seq, now) for key, (answer, seq) in latest.items()]
+    batch_size = max(1, connection.ops.bulk_batch_size(fields, params))
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    placeholder = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(params), batch_size):
+            batch = params[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"VALUES {', '.join([placeholder] * len(batch))} "
+                "ON CONFLICT (candidate_id, paper_id, question_id) "
+                f"DO UPDATE SET answer = excluded.answer, seq = excluded.seq WHERE excluded.seq > {table}.seq",
+                [value for row in batch for value in row],
+            )
+    return len(params)
+
+
+def _valid_question_ids(paper_id, question_ids):
+    return set(
+        PaperQuestion.objects.filter(paper_id=paper_id, question_id__in=list(question_ids))
+        .values_list("question_id", flat=True)
+    )
+
+
+def save_candidate_answers(candidate_id, paper_id, answers):
+    """
+    Store a candidate's final answers for one paper in a fixed number of queries.
+
+    Question IDs that do not belong to the paper are dropped after a single
+    lookup; the rest are upserted with a fresh seq, so they replace every
+    earlier autosave. Returns the number of answers saved.
+    """
+    return apply_answer_delta(candidate_id, paper_id, answers, answer_seq())
+
+
+def apply_answer_delta(candidate_id, paper_id, answers, seq):
+    """
+    Apply an autosave batch of changed answers.
+
+    Each stored answer remembers the sequence number that wrote it and is only
+    replaced by a higher one (see upsert_answers), so replaying or reordering
+    batches is harmless. Returns the number of answers sent for writing.
+    """
+    if not answers:
+        return 0
+    valid_ids = _valid_question_ids(paper_id, answers)
+    return upsert_answers([
+        (candidate_id, paper_id, qid, value, seq)
+        for qid, value in answers.items()
+        if qid in valid_ids
+    ])
+
+
+def apply_journal_entries(entries):
+    """
+    Write drained journal entries into CandidateAnswer.
+
+    `entries` are (candidate_id, paper_id, question_id, answer, seq) tuples in
+    journal order. Only the highest seq per answer is kept, and it replaces the
+    stored answer only if that has a lower seq.
+    """
+    return upsert_answers(entries)
+
+
+def pending_answers(candidate_id, paper_id):
+    """Journalled answers not yet in CandidateAnswer, {question_id: (answer, seq)}."""
+    if not journal_enabled():
+        return {}
+    return get_journal().pending_answers(candidate_id, paper_id)
+
+
+def _paper_max_marks(paper_ids):
+    rows = (
+        PaperQuestion.objects.filter(paper_id__in=paper_ids)
+        .values("paper_id").annotate(total=Sum("question__marks"))
+        .values_list("paper_id", "total")
+    )
+    return {paper_id: total or Decimal("0") for paper_id, total in rows}
+
+
+def _oral_marks(profile_value, attempt_value):
+    # marks entered on the profile win; the attempt's default 0 means "not entered"
+    return profile_value if profile_value is not None else attempt_value
+
+
+def refresh_results(attempt_ids):
+    """
+    Recompute CandidateResult rows for the given attempts.
+
+    Costs a few queries per batch of RESULT_BATCH attempts regardless of how
+    many answers they have: one aggregate over Answer by attempt and part, one
+    for the attempts themselves and one for paper maxima, then a bulk upsert.
+    """
+    attempt_ids = list(dict.fromkeys(attempt_ids))
+    pass_percentage = Decimal(str(getattr(settings, "RESULT_PASS_PERCENTAGE", 40)))
+    oral_max = Decimal(str(getattr(settings, "RESULT_PRACTICAL_MAX_MARKS", 0))) + Decimal(
+        str(getattr(settings, "RESULT_VIVA_MAX_MARKS", 0))
+    )
+    for start in range(0, len(attempt_ids), RESULT_BATCH):
+        batch = attempt_ids[start:start + RESULT_BATCH]
+        attempts = list(
+            ExamAttempt.objects.filter(pk__in=batch).select_related("assignment__shift", "assignment__primary_paper")
+        )
+        if not attempts:
+            continue
+        profiles = {
+            p.user_id: p for p in CandidateProfile.objects.filter(
+                user_id__in=[a.assignment.candidate_id for a in attempts]
+            ).only("id", "user_id", "viva_marks", "practical_marks")
+        }
+        parts = {}
+        for attempt_id, part, total in (
+            Answer.objects.filter(attempt_id__in=batch)
+            .values("attempt_id", "question__part").annotate(total=Sum("final_score"))
+            .values_list("attempt_id", "question__part", "total")
+        ):
+            parts[(attempt_id, part)] = total or Decimal("0")
+        paper_max = _paper_max_marks(
+            {pid for a in attempts for pid in (a.assignment.primary_paper_id, a.assignment.common_paper_id)}
+        )
+        results = []
+        for attempt in attempts:
+            assignment = attempt.assignment
+            profile = profiles.get(assignment.candidate_id)
+            subtotals = {p: parts.get((attempt.pk, p), Decimal("0")) for p in PARTS}
+            written = sum(subtotals.values(), Decimal("0"))
+            practical = _oral_marks(profile and profile.practical_marks, attempt.practical_marks)
+            viva = _oral_marks(profile and profile.viva_marks, attempt.viva_marks)
+            grand_total = written + practical + viva
+            max_marks = paper_max.get(assignment.primary_paper_id, Decimal("0")) + paper_max.get(
+                assignment.common_paper_id, Decimal("0")
+            ) + oral_max
+            percentage = (grand_total * 100 / max_marks).quantize(Decimal("0.01")) if max_marks else Decimal("0")
+            results.append(CandidateResult(
+                attempt=attempt,
+                candidate=profile,
+                trade_id=assignment.primary_paper.trade_id,
+                center_id=assignment.center_id,
+                exam_date=assignment.shift.date,
+                part_a=subtotals["A"], part_b=subtotals["B"], part_c=subtotals["C"],
+                part_d=subtotals["D"], part_e=subtotals["E"], part_f=subtotals["F"],
+                written_total=written,
+                practical_marks=practical,
+                viva_marks=viva,
+                grand_total=grand_total,
+                max_marks=max_marks,
+                percentage=min(percentage, Decimal("999.99")),
+                passed=bool(max_marks) and percentage >= pass_percentage,
+            ))
+        CandidateResult.objects.bulk_create(
+            results,
+            update_conflicts=True,
+            unique_fields=["attempt"],
+            # ranks belong to the ranking job (results/ranking.py)
+            update_fields=[f.name for f in CandidateResult._meta.concrete_fields
+                           if f.name not in ("id", "attempt") + RANK_FIELDS],
+        )
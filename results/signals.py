@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from exams.models import Answer, ExamAttempt
+from exams.signals import scores_changed
+from registration.models import CandidateProfile
+from .services import refresh_results
+
+_RESULT_FIELDS = {"objective_score", "practical_marks", "viva_marks"}
+
+
+@receiver(scores_changed)
+def refresh_after_bulk_scoring(sender, attempt_ids, **kwargs):
+    refresh_results(attempt_ids)
+
+
+@receiver(post_save, sender=Answer)
+def refresh_after_answer_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: refresh_results([instance.attempt_id]))
+
+
+@receiver(post_save, sender=ExamAttempt)
+def refresh_after_attempt_marks(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not _RESULT_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: refresh_results([instance.pk]))
+
+
+@receiver(post_save, sender=CandidateProfile)
+def refresh_after_profile_marks(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {"practical_marks", "viva_marks"} & set(update_fields)):
+        return
+    attempt_ids = list(
+        ExamAttempt.objects.filter(assignment__candidate_id=instance.user_id).values_list("id", flat=True)
+    )
+    if attempt_ids:
+        transaction.on_commit(lambda: refresh_results(attempt_ids))
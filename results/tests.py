@@ -1,3 +1,336 @@
-from django.test import TestCase
+import datetime
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from centers.models import Center
+from exams.models import Answer, ExamAssignment, ExamAttempt, Shift
+from questions.models import PaperQuestion, Question, QuestionPaper
+from reference.models import Trade
+from registration.models import CandidateProfile
+
+from . import journal as journal_module
+from .journal import AnswerJournal
+from .models import CandidateAnswer, CandidateResult
+from .ranking import compute_ranks
+from .services import answer_seq, apply_answer_delta
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerJournalTests(TestCase):
+    QUESTIONS = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        user = User.objects.create_user("cand", password="x")
+        cls.candidate = CandidateProfile.objects.create(
+            user=user, army_no="A1", rank="r", trade="Clerk", name="n", dob="2000-01-01",
+            doe="2020-01-01", father_name="f", qualification="q", state="s", district="d", shift=shift,
+        )
+        cls.paper = QuestionPaper.objects.create(title="P1", trade=trade, duration=datetime.timedelta(hours=1))
+        cls.question_ids = []
+        for i in range(cls.QUESTIONS):
+            question = Question.objects.create(
+                text=f"Q {i}", part="A", options={"choices": ["w", "x", "y", "z"]}, correct_answer="x", trade=trade,
+            )
+            PaperQuestion.objects.create(paper=cls.paper, question=question, order=i)
+            cls.question_ids.append(question.id)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "journal.sqlite3")
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def stored(self):
+        return dict(
+            CandidateAnswer.objects.filter(candidate=self.candidate, paper=self.paper)
+            .values_list("question_id", "answer")
+        )
+
+    def test_undrained_entries_are_replayed_after_a_crash(self):
+        qid = self.question_ids[0]
+        crashed = AnswerJournal(self.path)
+        crashed.append(self.candidate.pk, self.paper.pk, {qid: "B"}, seq=1)
+        crashed._connection().close()  # the process dies before its flusher runs
+
+        restarted = AnswerJournal(self.path)
+        self.assertEqual(restarted.pending_count(), 1)
+        self.assertEqual(restarted.drain(), 1)
+        self.assertEqual(self.stored(), {qid: "B"})
+        self.assertEqual(restarted.pending_count(), 0)
+
+    def test_failed_apply_keeps_entries(self):
+        qid = self.question_ids[0]
+        journal = AnswerJournal(self.path)
+        journal.append(self.candidate.pk, self.paper.pk, {qid: "B"}, seq=1)
+
+        with mock.patch("results.services.apply_journal_entries", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                journal.drain()
+        self.assertEqual(journal.pending_count(), 1)
+        self.assertEqual(self.stored(), {})
+
+        self.assertEqual(journal.drain(), 1)
+        self.assertEqual(self.stored(), {qid: "B"})
+
+    def test_drain_never_replaces_a_newer_answer(self):
+        qid = self.question_ids[0]
+        apply_answer_delta(self.candidate.pk, self.paper.pk, {qid: "Y"}, 6)
+        journal = AnswerJournal(self.path)
+        journal.append(self.candidate.pk, self.paper.pk, {qid: "X"}, seq=5)
+
+        journal.drain()
+        self.assertEqual(self.stored(), {qid: "Y"})
+
+    def test_only_one_drain_at_a_time(self):
+        qid = self.question_ids[0]
+        journal = AnswerJournal(self.path)
+        journal.append(self.candidate.pk, self.paper.pk, {qid: "B"}, seq=1)
+
+        lock = AnswerJournal(self.path)._drain_lock()  # another process is draining
+        try:
+            self.assertEqual(journal.drain(), 0)
+            self.assertEqual(journal.pending_count(), 1)
+        finally:
+            lock.execute("ROLLBACK")
+            lock.close()
+        self.assertEqual(journal.drain(), 1)
+
+    def test_pending_answers_keep_the_newest_seq(self):
+        first, second = self.question_ids[:2]
+        journal = AnswerJournal(self.path)
+        journal.append(self.candidate.pk, self.paper.pk, {first: "A", second: "C"}, seq=10)
+        journal.append(self.candidate.pk, self.paper.pk, {first: "B"}, seq=12)
+        journal.append(self.candidate.pk, self.paper.pk, {first: "D"}, seq=11)  # late duplicate
+
+        self.assertEqual(
+            journal.pending_answers(self.candidate.pk, self.paper.pk),
+            {first: ("B", 12), second: ("C", 10)},
+        )
+
+    def test_reloaded_page_continues_above_earlier_seqs(self):
+        before_reload = answer_seq()
+        time.sleep(0.002)
+        self.assertGreater(answer_seq(), before_reload)
+
+    def test_journal_throughput(self):
+        """Autosave batches are acknowledged quickly and drained in bulk."""
+        journal = AnswerJournal(self.path)
+        batches = 200
+        start = time.perf_counter()
+        for seq in range(1, batches + 1):
+            journal.append(
+                self.candidate.pk, self.paper.pk,
+                {qid: "ABCD"[seq % 4] for qid in self.question_ids[:5]}, seq=seq,
+            )
+        appended = time.perf_counter() - start
+
+        start = time.perf_counter()
+        drained = journal.drain()
+        flushed = time.perf_counter() - start
+
+        self.assertEqual(drained, batches * 5)
+        self.assertEqual(self.stored(), {qid: "ABCD"[batches % 4] for qid in self.question_ids[:5]})
+        logger.info(
+            "answer journal: %.0f fsynced batches/s, %.0f entries/s drained", batches / appended, drained / flushed
+        )
+        self.assertLess(appended + flushed, 30)
+
+
+class AnswerJournalRecoveryTests(TransactionTestCase):
+    """Needs real commits: foreign keys are checked and the flusher runs in its own thread."""
+
+    def setUp(self):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        self.candidate = CandidateProfile.objects.create(
+            user=User.objects.create_user("cand", password="x"), army_no="A1", rank="r", trade="Clerk", name="n",
+            dob="2000-01-01", doe="2020-01-01", father_name="f", qualification="q", state="s", district="d",
+            shift=shift,
+        )
+        self.paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        self.question_ids = []
+        for i in range(3):
+            question = Question.objects.create(
+                text=f"Q {i}", part="A", options={"choices": ["w", "x"]}, correct_answer="x", trade=trade,
+            )
+            PaperQuestion.objects.create(paper=self.paper, question=question, order=i)
+            self.question_ids.append(question.id)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        self.path = os.path.join(tmpdir, "journal.sqlite3")
+
+    def stored(self):
+        return dict(
+            CandidateAnswer.objects.filter(candidate=self.candidate, paper=self.paper)
+            .values_list("question_id", "answer")
+        )
+
+    def test_rejected_entry_is_dead_lettered_and_the_rest_applied(self):
+        first, second, third = self.question_ids
+        journal = AnswerJournal(self.path)
+        journal.append(self.candidate.pk, self.paper.pk, {first: "A"}, seq=1)
+        journal.append(self.candidate.pk, self.paper.pk, {999999: "B"}, seq=1)  # question deleted since
+        journal.append(self.candidate.pk, self.paper.pk, {second: "C", third: "D"}, seq=1)
+
+        with self.assertLogs("results.journal", "ERROR"):
+            self.assertEqual(journal.drain(), 4)
+        self.assertEqual(self.stored(), {first: "A", second: "C", third: "D"})
+        self.assertEqual(journal.pending_count(), 0)
+        self.assertEqual(journal.dead_letter_count(), 1)
+
+        journal.append(self.candidate.pk, self.paper.pk, {first: "B"}, seq=2)
+        self.assertEqual(journal.drain(), 1)
+        self.assertEqual(self.stored()[first], "B")
+
+    def test_server_start_replays_a_crashed_journal(self):
+        qid = self.question_ids[0]
+        crashed = AnswerJournal(self.path)
+        crashed.append(self.candidate.pk, self.paper.pk, {qid: "B"}, seq=1)
+        crashed._connection().close()  # the worker dies before its flusher runs
+
+        self.addCleanup(setattr, journal_module, "_journal", None)
+        self.addCleanup(journal_module.stop_flusher)
+        journal_module._journal = None
+        with override_settings(
+            ANSWER_JOURNAL_ENABLED=True, ANSWER_JOURNAL_PATH=self.path, ANSWER_JOURNAL_FLUSH_INTERVAL=0.05,
+        ), mock.patch.object(sys, "argv", ["gunicorn", "config.wsgi"]):
+            apps.get_app_config("results").ready()  # a new worker starts, no autosave arrives
+            deadline = time.monotonic() + 10
+            while not self.stored() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            journal_module.stop_flusher()
+
+        self.assertEqual(self.stored(), {qid: "B"})
+        self.assertEqual(AnswerJournal(self.path).pending_count(), 0)
+
+    def test_management_commands_do_not_start_the_flusher(self):
+        with override_settings(ANSWER_JOURNAL_ENABLED=True, ANSWER_JOURNAL_PATH=self.path), \
+                mock.patch.object(sys, "argv", ["manage.py", "migrate"]), \
+                mock.patch.object(journal_module, "ensure_flusher") as ensure:
+            journal_module.replay_on_startup()
+        ensure.assert_not_called()
+
+
+class RankingTests(TestCase):
+    def test_center_and_date_ranks_stay_within_the_trade(self):
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        results = {}
+        # a 50-mark paper and a 200-mark paper at the same center on the same day
+        for trade_name, totals in (("Clerk", (40, 30)), ("Cook", (150, 100))):
+            trade = Trade.objects.create(name=trade_name, code=trade_name[:3].upper())
+            paper = QuestionPaper.objects.create(title=trade_name, trade=trade)
+            for total in totals:
+                assignment = ExamAssignment.objects.create(
+                    candidate=User.objects.create_user(f"{trade_name}{total}", password=None), center=center,
+                    shift=shift, primary_paper=paper, common_paper=paper, scheduled_at=timezone.now(),
+                )
+                results[trade_name, total] = CandidateResult.objects.create(
+                    attempt=ExamAttempt.objects.create(assignment=assignment), trade=trade, center=center,
+                    exam_date=shift.date, grand_total=Decimal(total),
+                )
+
+        compute_ranks()
+
+        for (trade_name, total), result in results.items():
+            result.refresh_from_db()
+            expected = 1 if total in (40, 150) else 2
+            self.assertEqual((result.trade_rank, result.center_rank, result.date_rank), (expected,) * 3)
+            self.assertEqual(result.center_percentile, Decimal("100.00") if expected == 1 else Decimal("50.00"))
+
+    def test_rank_results_by_date_keeps_trade_ranks(self):
+        center = Center.objects.create(comd="N", exam_Center="X")
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        paper = QuestionPaper.objects.create(title="Clerk", trade=trade)
+        results = []
+        for day, total in ((1, 40), (2, 30)):
+            shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, day), start_time=datetime.time(9, 0))
+            assignment = ExamAssignment.objects.create(
+                candidate=User.objects.create_user(f"c{day}", password=None), center=center,
+                shift=shift, primary_paper=paper, common_paper=paper, scheduled_at=timezone.now(),
+            )
+            results.append(CandidateResult.objects.create(
+                attempt=ExamAttempt.objects.create(assignment=assignment), trade=trade, center=center,
+                exam_date=shift.date, grand_total=Decimal(total),
+            ))
+        compute_ranks()
+
+        call_command("rank_results", date="2025-01-02", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("rank_results", date="2025-01-02", scope=["trade"], stdout=StringIO())
+
+        second_day = results[1]
+        second_day.refresh_from_db()
+        self.assertEqual((second_day.trade_rank, second_day.center_rank, second_day.date_rank), (2, 2, 1))
+
+
+@override_settings(RESULT_PRACTICAL_MAX_MARKS=0, RESULT_VIVA_MAX_MARKS=0)
+class ResultRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trade = Trade.objects.create(name="Clerk", code="CLK")
+        center = Center.objects.create(comd="N", exam_Center="X")
+        shift = Shift.objects.create(center=center, date=datetime.date(2025, 1, 1), start_time=datetime.time(9, 0))
+        paper = QuestionPaper.objects.create(title="P1", trade=trade)
+        common = QuestionPaper.objects.create(title="C1", trade=trade, is_common=True)
+        cls.mcq = Question.objects.create(
+            text="Q", part="A", marks=2, options={"choices": ["w", "x"]}, correct_answer="x", trade=trade,
+        )
+        cls.essay = Question.objects.create(text="Explain", part="E", marks=5, trade=trade)
+        for order, question in enumerate((cls.mcq, cls.essay)):
+            PaperQuestion.objects.create(paper=paper, question=question, order=order)
+        assignment = ExamAssignment.objects.create(
+            candidate=User.objects.create_user("cand", password=None), center=center, shift=shift,
+            primary_paper=paper, common_paper=common, scheduled_at=timezone.now(), status="EVALUATED",
+        )
+        cls.attempt = ExamAttempt.objects.create(assignment=assignment, submitted_at=timezone.now())
+
+    def result(self):
+        return CandidateResult.objects.get(attempt=self.attempt)
+
+    def test_answer_score_change_updates_the_result(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(attempt=self.attempt, question=self.mcq, given="x", auto_score=2, final_score=2)
+        self.assertEqual((self.result().part_a, self.result().written_total), (Decimal("2"), Decimal("2")))
+
+        essay = Answer(attempt=self.attempt, question=self.essay, text_answer="...")
+        with self.captureOnCommitCallbacks(execute=True):
+            essay.save()
+        essay.final_score = Decimal("4")
+        with self.captureOnCommitCallbacks(execute=True):
+            essay.save()
+
+        result = self.result()
+        self.assertEqual((result.part_a, result.part_e), (Decimal("2"), Decimal("4")))
+        self.assertEqual(result.written_total, Decimal("6"))
+        self.assertEqual((result.max_marks, result.percentage), (Decimal("7"), Decimal("85.71")))
+
+    def test_bulk_regrade_updates_the_result(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(attempt=self.attempt, question=self.mcq, given="x", auto_score=2, final_score=2)
+
+        question = Question.objects.get(pk=self.mcq.pk)
+        question.correct_answer = "w"
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+
+        result = self.result()
+        self.assertEqual((result.part_a, result.written_total, result.grand_total), (0, 0, 0))